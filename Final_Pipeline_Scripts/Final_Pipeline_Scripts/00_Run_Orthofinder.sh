@@ -8,6 +8,14 @@
 #	_PIPE_RUN_NICKNAME
 #	_PIPE_CYP_NAME_PROTEIN_ID
 #	_PIPE_ALL_DATA
+# And optionally:
+#	_PIPE_STEP00_TRANSFER_MODE (copy, hardlink, or reflink; default copy)
+#	_PIPE_STEP00_REDUCE_ISOFORMS (yes or no; default no)
+#	_PIPE_STEP00_ORTHOFINDER_MODE (full or orthogroups; default full)
+#	_PIPE_STEP00_SEARCH (blast_nucl or diamond; default blast_nucl)
+#	_PIPE_STEP00_SEARCH_CACHE (yes or no; default no)
+#	_PIPE_STEP00_SUPERSET_ORTHOGROUPS (Orthogroups.tsv of a larger cohort; default none)
+#	_PIPE_STEP00_HOG_NODE (species tree node of the HOG table to use, e.g., N0; default none)
 
 # Look for the checkpoint. Exit with success if we find it, exit without error.
 if [ -f "${_PIPE_FINAL_OUTPUT_DIR}/Checkpoints/00_Run_Orthofinder.done" ]
@@ -27,19 +35,88 @@ set -euo pipefail
 
 # Path to ParseOrthogroupsFromResults.py, to isolate orthogroups of interest based on having a CYP.
 PARSE_ORTHOGROUPS_PY="${_PIPE_SCRIPTS_FROM_GITHUB}/Final_Pipeline_Scripts/ParseOrthogroupsFromResults.py"
+# Path to Orthogroup_Index.py, to build the indexed lookup table of the Orthogroups.tsv file
+OG_INDEX_PY="${_PIPE_SCRIPTS_FROM_GITHUB}/Final_Pipeline_Scripts/Orthogroup_Index.py"
+# Path to CDS_Store.py, to pack the cohort CDS FASTA files into one memory-mapped sequence store
+CDS_STORE_PY="${_PIPE_SCRIPTS_FROM_GITHUB}/Final_Pipeline_Scripts/CDS_Store.py"
+# Path to Reduce_Isoforms.py, to keep only the longest CDS of each gene for Orthofinder
+REDUCE_ISOFORMS_PY="${_PIPE_SCRIPTS_FROM_GITHUB}/Final_Pipeline_Scripts/Reduce_Isoforms.py"
+# Path to Translate_Cohort_CDS.py, to translate the CDS files for the protein DIAMOND search
+TRANSLATE_COHORT_PY="${_PIPE_SCRIPTS_FROM_GITHUB}/Final_Pipeline_Scripts/Translate_Cohort_CDS.py"
+# Path to Orthofinder_Search_Cache.py, to reuse the Orthofinder searches of species pairs from earlier runs
+SEARCH_CACHE_PY="${_PIPE_SCRIPTS_FROM_GITHUB}/Final_Pipeline_Scripts/Orthofinder_Search_Cache.py"
+# Path to Project_Orthogroups.py, to reuse the Orthogroups.tsv of a larger cohort for a smaller one
+PROJECT_ORTHOGROUPS_PY="${_PIPE_SCRIPTS_FROM_GITHUB}/Final_Pipeline_Scripts/Project_Orthogroups.py"
 
 # Use the mktemp comand to return a directory path in the system temp space
 cd "${_PIPE_SCRATCH_DIR}"
 TEMP_DIR_NAME=$(mktemp -d)
 cd "${TEMP_DIR_NAME}"
 
+# Pack the CDS FASTA files of the cohort into a single sequence store, which
+# the later steps read sequences from. The store is shared by every run of the
+# same cohort, and it is only rebuilt when one of the CDS FASTA files changes.
+# Record the path to the store so that the later steps can find it.
+python "${CDS_STORE_PY}" "${_PIPE_ALL_DATA}/CDS_Stores" $(cat "${_PIPE_FINAL_OUTPUT_DIR}/Species_list.txt") > "${_PIPE_FINAL_OUTPUT_DIR}/CDS_Store_Path.txt"
+
+# If _PIPE_STEP00_SUPERSET_ORTHOGROUPS is the Orthogroups.tsv of a larger cohort
+# (e.g., Orthogroups_16_<date>.tsv in _PIPE_ALL_DATA), do not run Orthofinder.
+# Keep only the columns of this cohort's species instead, and build the target
+# orthogroup FASTA files and the CYP -> orthogroup CSV from the projected table
+# and the CDS store.
+if [ -n "${_PIPE_STEP00_SUPERSET_ORTHOGROUPS:-}" ]
+then
+	echo "$(date +'%F %T'): Projecting ${_PIPE_STEP00_SUPERSET_ORTHOGROUPS} onto the cohort"
+	python "${PROJECT_ORTHOGROUPS_PY}" \
+		"${_PIPE_STEP00_SUPERSET_ORTHOGROUPS}" \
+		"${_PIPE_ALL_DATA}/Orthogroups_${_PIPE_RUN_NICKNAME}.tsv" \
+		$(cat "${_PIPE_FINAL_OUTPUT_DIR}/Species_list.txt")
+	python "${OG_INDEX_PY}" "${_PIPE_ALL_DATA}/Orthogroups_${_PIPE_RUN_NICKNAME}.tsv"
+	python "${PARSE_ORTHOGROUPS_PY}" "${_PIPE_CYP_NAME_PROTEIN_ID}" "${_PIPE_ALL_DATA}/Orthogroups_${_PIPE_RUN_NICKNAME}.tsv" "$(cat "${_PIPE_FINAL_OUTPUT_DIR}/CDS_Store_Path.txt")" "${_PIPE_FINAL_OUTPUT_DIR}/Step_00_Orthofinder_TargetOGs" "build" > "${_PIPE_ALL_DATA}/CYPnames_Trans_Prot_with_OGs_${_PIPE_RUN_NICKNAME}.csv"
+	cd
+	rm -rf "${TEMP_DIR_NAME}"
+	touch "${_PIPE_FINAL_OUTPUT_DIR}/Checkpoints/00_Run_Orthofinder.done"
+	exit 0
+fi
+
 # Read the species_list.txt file that was built from the _PIPE_COHORT_MEMBERS array
 # varaible to link in the appropriate CDS FASTA files for Orthofinder.
+# If _PIPE_STEP00_REDUCE_ISOFORMS is "yes", write copies of the CDS FASTA files
+# that only have the longest CDS of each gene (and the human CYPs of interest)
+# instead, so that Orthofinder does not search every isoform against every other.
+# The isoform -> kept sequence mapping is written to Isoform_Map.tsv.
 mkdir -p ./orthofinder_cds_in
-for species_fasta in $(cat "${_PIPE_FINAL_OUTPUT_DIR}/Species_list.txt")
-do
-	ln -s "${species_fasta}" "${TEMP_DIR_NAME}/orthofinder_cds_in/$(basename "${species_fasta}")"
-done
+if [ "${_PIPE_STEP00_REDUCE_ISOFORMS:-no}" = "yes" ]
+then
+	python "${REDUCE_ISOFORMS_PY}" \
+		"${TEMP_DIR_NAME}/orthofinder_cds_in" \
+		"${_PIPE_FINAL_OUTPUT_DIR}/Isoform_Map.tsv" \
+		"${_PIPE_CYP_NAME_PROTEIN_ID}" \
+		$(cat "${_PIPE_FINAL_OUTPUT_DIR}/Species_list.txt")
+else
+	for species_fasta in $(cat "${_PIPE_FINAL_OUTPUT_DIR}/Species_list.txt")
+	do
+		ln -s "${species_fasta}" "${TEMP_DIR_NAME}/orthofinder_cds_in/$(basename "${species_fasta}")"
+	done
+fi
+
+# If _PIPE_STEP00_SEARCH is "diamond", translate the CDS files that were set up
+# for Orthofinder and search the proteins with DIAMOND, rather than searching the
+# nucleotides with BLAST. The proteins keep the CDS sequence IDs and file names,
+# so Orthogroups.tsv is the same format either way.
+STEP00_SEARCH="${_PIPE_STEP00_SEARCH:-blast_nucl}"
+if [ "${STEP00_SEARCH}" = "diamond" ]
+then
+	python "${TRANSLATE_COHORT_PY}" \
+		"${TEMP_DIR_NAME}/orthofinder_prot_in" \
+		"${_PIPE_FINAL_OUTPUT_DIR}/CDS_Protein_Map.tsv" \
+		"${TEMP_DIR_NAME}"/orthofinder_cds_in/*
+	ORTHOFINDER_IN="${TEMP_DIR_NAME}/orthofinder_prot_in"
+	ORTHOFINDER_SEARCH=(-S "diamond")
+else
+	ORTHOFINDER_IN="${TEMP_DIR_NAME}/orthofinder_cds_in"
+	ORTHOFINDER_SEARCH=(-d -S "blast_nucl")
+fi
 
 # Run Orthofinder
 #	Define a output folder name for Orthofinder based on the date that the run
@@ -48,22 +125,107 @@ HPC_ORTHOFINDER_OUT="${_PIPE_RUN_NICKNAME}"
 #	Remove the output folder if already exists, to prevent "cross-contamination" of
 #	Orthofinder analyses.
 rm -rf "./${HPC_ORTHOFINDER_OUT}"
+#	If _PIPE_STEP00_ORTHOFINDER_MODE is "orthogroups", stop Orthofinder once the
+#	orthogroups are inferred (-og). Nothing after this step uses the Orthofinder
+#	alignments or trees, and this skips writing a FASTA file for every orthogroup;
+#	the target orthogroup FASTA files are built from the CDS store instead (below).
+STEP00_ORTHOFINDER_MODE="${_PIPE_STEP00_ORTHOFINDER_MODE:-full}"
+#	If _PIPE_STEP00_HOG_NODE is set (e.g., N0), the target groups are the
+#	phylogenetic hierarchical orthogroups (HOGs) at that node of the species tree
+#	rather than the orthogroups. Orthofinder only infers HOGs from the gene trees,
+#	so this needs the full analysis.
+STEP00_HOG_NODE="${_PIPE_STEP00_HOG_NODE:-}"
+if [ -n "${STEP00_HOG_NODE}" ] && [ "${STEP00_ORTHOFINDER_MODE}" = "orthogroups" ]
+then
+	echo "_PIPE_STEP00_HOG_NODE needs _PIPE_STEP00_ORTHOFINDER_MODE to be full, because Orthofinder does not infer HOGs with -og." >&2
+	exit 1
+fi
+if [ "${STEP00_ORTHOFINDER_MODE}" = "orthogroups" ]
+then
+	ORTHOFINDER_STAGES=(-og)
+else
+	ORTHOFINDER_STAGES=(-M "msa" -os -A "mafft" -T "raxml" -z)
+fi
+#	If _PIPE_STEP00_SEARCH_CACHE is "yes", the search results of every species
+#	pair are kept in ${_PIPE_ALL_DATA}/Orthofinder_Search_Cache, keyed by the
+#	checksums of the two input FASTA files. The hits are kept apart for each
+#	search method and version of diamond or blastn, so an updated search tool
+#	searches the pairs again. The species of the cohort that were
+#	already searched against each other are written out as an Orthofinder working
+#	directory, and Orthofinder is run on it with -b, adding the other species with
+#	-f. Orthofinder then only searches the species pairs that are not cached, e.g.,
+#	adding a 17th species to a 16-species cohort only searches its 33 new pairs.
+#	Orthofinder puts its results for -b inside the working directory, so it is made
+#	inside the output folder.
+SEARCH_CACHE_DIR="${_PIPE_ALL_DATA}/Orthofinder_Search_Cache"
+ORTHOFINDER_INPUT=(-f "${ORTHOFINDER_IN}" -o "${HPC_ORTHOFINDER_OUT}")
+if [ "${_PIPE_STEP00_SEARCH_CACHE:-no}" = "yes" ]
+then
+	mkdir -p "${HPC_ORTHOFINDER_OUT}"
+	SEARCH_CACHE_MODE=$(python "${SEARCH_CACHE_PY}" prepare \
+		"${SEARCH_CACHE_DIR}" "${STEP00_SEARCH}" "${ORTHOFINDER_IN}" \
+		"${TEMP_DIR_NAME}/${HPC_ORTHOFINDER_OUT}/WorkingDirectory_Cached" \
+		"${TEMP_DIR_NAME}/orthofinder_new_species")
+	echo "$(date +'%F %T'): Orthofinder search cache: ${SEARCH_CACHE_MODE}"
+	if [ "${SEARCH_CACHE_MODE}" = "reuse" ]
+	then
+		ORTHOFINDER_INPUT=(-b "${TEMP_DIR_NAME}/${HPC_ORTHOFINDER_OUT}/WorkingDirectory_Cached")
+	elif [ "${SEARCH_CACHE_MODE}" = "add" ]
+	then
+		ORTHOFINDER_INPUT=(-b "${TEMP_DIR_NAME}/${HPC_ORTHOFINDER_OUT}/WorkingDirectory_Cached" -f "${TEMP_DIR_NAME}/orthofinder_new_species")
+	else
+		rm -rf "./${HPC_ORTHOFINDER_OUT}"
+	fi
+fi
 echo "$(date +'%F %T'): Starting Orthofinder"
-orthofinder -f "${TEMP_DIR_NAME}/orthofinder_cds_in" -t "${SLURM_CPUS_PER_TASK}" -a "${SLURM_CPUS_PER_TASK}" -d -M "msa" -os -S "blast_nucl" -A "mafft" -T "raxml" -z -o "${HPC_ORTHOFINDER_OUT}" 
+orthofinder "${ORTHOFINDER_INPUT[@]}" -t "${SLURM_CPUS_PER_TASK}" -a "${SLURM_CPUS_PER_TASK}" "${ORTHOFINDER_SEARCH[@]}" "${ORTHOFINDER_STAGES[@]}"
 echo "$(date +'%F %T'): Finished Orthofinder"
+#	Add the new species pairs to the search cache.
+if [ "${_PIPE_STEP00_SEARCH_CACHE:-no}" = "yes" ]
+then
+	python "${SEARCH_CACHE_PY}" store "${SEARCH_CACHE_DIR}" "${STEP00_SEARCH}" "${ORTHOFINDER_IN}" "${HPC_ORTHOFINDER_OUT}"
+fi
 
 
 # Use a find command to get the full path to the Orthogroups.tsv file in the Orthofinder results directory
 # This is because Orthofinder names its output based on the date it is run, which will necessarily change each run.
 OG_TSV=$(find "${HPC_ORTHOFINDER_OUT}" -type f -name 'Orthogroups.tsv')
+# Use the HOG table of the chosen node instead, if there is one. It is copied to
+# the same path as Orthogroups.tsv would be, since its index (and every later
+# step) reads it the same way.
+if [ -n "${STEP00_HOG_NODE}" ]
+then
+	OG_TSV=$(find "${HPC_ORTHOFINDER_OUT}" -type f -path "*/Phylogenetic_Hierarchical_Orthogroups/${STEP00_HOG_NODE}.tsv")
+fi
 # Use a find command to get the path to the Orthogroup_Sequences directory in the Orthofinder results directory.
 OG_SEQS_DIR=$(find "${HPC_ORTHOFINDER_OUT}" -type d -name 'Orthogroup_Sequences')
 # Make the full path to the destination directory for target CYPs. Use a find command to get the name of the
 # date-specific results directory that is made by Orthofinder.
 ORTHOFINDER_DATE_DIR=$(find "${HPC_ORTHOFINDER_OUT}" -mindepth 1 -maxdepth 1 -type d -name 'Results_*')
 TARGET_CYP_DIR_FULLPATH="${_PIPE_FINAL_OUTPUT_DIR}/Step_00_Orthofinder_TargetOGs"
-python "${PARSE_ORTHOGROUPS_PY}" "${_PIPE_CYP_NAME_PROTEIN_ID}" "${OG_TSV}" "${OG_SEQS_DIR}" "${TARGET_CYP_DIR_FULLPATH}" > "${_PIPE_ALL_DATA}/CYPnames_Trans_Prot_with_OGs_${_PIPE_RUN_NICKNAME}.csv"
+# Copy the Orthogroups.tsv file out of the temp directory and build its index
+# (Orthogroups_<nickname>.tsv.sqlite). The index is used by the parsing script
+# below and by the backtranslation in step 01, so that the table is only parsed once.
 cp "${OG_TSV}" "${_PIPE_ALL_DATA}/Orthogroups_${_PIPE_RUN_NICKNAME}.tsv"
+python "${OG_INDEX_PY}" "${_PIPE_ALL_DATA}/Orthogroups_${_PIPE_RUN_NICKNAME}.tsv"
+# The target orthogroup FASTA files are put into the destination directory with
+# _PIPE_STEP00_TRANSFER_MODE. Symbolic links are not allowed here, because the
+# Orthofinder results in the temp directory are removed below. If Orthofinder
+# only inferred the orthogroups, or its orthogroup sequences are proteins (the
+# DIAMOND search), or the target groups are HOGs (which Orthofinder does not
+# write sequence files for), build the files from the CDS store instead.
+STEP00_TRANSFER_MODE="${_PIPE_STEP00_TRANSFER_MODE:-copy}"
+if [ "${STEP00_TRANSFER_MODE}" = "symlink" ]
+then
+	echo "_PIPE_STEP00_TRANSFER_MODE cannot be symlink, because the Orthofinder results are removed after step 00." >&2
+	exit 1
+fi
+if [ "${STEP00_ORTHOFINDER_MODE}" = "orthogroups" ] || [ "${STEP00_SEARCH}" = "diamond" ] || [ -n "${STEP00_HOG_NODE}" ]
+then
+	OG_SEQS_DIR=$(cat "${_PIPE_FINAL_OUTPUT_DIR}/CDS_Store_Path.txt")
+	STEP00_TRANSFER_MODE="build"
+fi
+python "${PARSE_ORTHOGROUPS_PY}" "${_PIPE_CYP_NAME_PROTEIN_ID}" "${_PIPE_ALL_DATA}/Orthogroups_${_PIPE_RUN_NICKNAME}.tsv" "${OG_SEQS_DIR}" "${TARGET_CYP_DIR_FULLPATH}" "${STEP00_TRANSFER_MODE}" > "${_PIPE_ALL_DATA}/CYPnames_Trans_Prot_with_OGs_${_PIPE_RUN_NICKNAME}.csv"
 
 # Remove the temp directory that we used for analysis. Not strictly necessary,
 # but nice for multiuser systems.
@@ -11,6 +11,13 @@
 #	_PIPE_COHORT_MEMBERS
 #	_PIPE_RUN_NICKNAME
 #	_PIPE_ALL_DATA
+# And optionally:
+#	_PIPE_BACKTRANSLATE_VERIFY (off, flag, or drop; default off)
+#	_PIPE_STEP01_KEEP_INTERMEDIATES (yes or no; default no)
+#	_PIPE_STEP01_PRESELECT (yes or no; default no)
+#	_PIPE_TRIM_METHOD (gap, codon_gap, entropy, or gappyout; default gap)
+#	_PIPE_REPRESENTATIVE_SELECTION (length or identity; default length)
+#	_PIPE_STEP01_MAFFT_SPARE_THREADS (yes or no; default no)
 
 # Look for the checkpoint. Exit with success if we find it, exit without error.
 if [ -f "${_PIPE_FINAL_OUTPUT_DIR}/Checkpoints/01_Prepare_PAML_Sequences.done" ]
@@ -24,12 +31,12 @@ set -euo pipefail
 module load anaconda
 conda activate CYPevol
 
-# Define paths to the Python scripts for translating, backtranslating, and selecting
-# representative orthologues. These are distributed via GitHub repository, so the
-# user will have a local copy when they clone the repo.
-TRANSLATE_SCRIPT="${_PIPE_SCRIPTS_FROM_GITHUB}/Final_Pipeline_Scripts/Translate_Orthogroup_Sequences.py"
-BACKTRANSLATE_SCRIPT="${_PIPE_SCRIPTS_FROM_GITHUB}/Final_Pipeline_Scripts/Backtranslate_AA_aligned.py"
-REP_ORTHOLOGUE_SCRIPT="${_PIPE_SCRIPTS_FROM_GITHUB}/Final_Pipeline_Scripts/Choose_Representative_Orthologs.py"
+# Define path to the Python script that runs the translating, aligning, backtranslating,
+# and selecting representative orthologues steps. It is distributed via GitHub repository,
+# so the user will have a local copy when they clone the repo. It uses the functions
+# from the Translate_Orthogroup_Sequences.py, Backtranslate_AA_aligned.py, and
+# Choose_Representative_Orthologs.py scripts in the same directory.
+PREPARE_PARALLEL_SCRIPT="${_PIPE_SCRIPTS_FROM_GITHUB}/Final_Pipeline_Scripts/Prepare_PAML_Sequences_Parallel.py"
 
 # Define path to directory of orthogroup sequences from Orthofinder. This is the directory from the
 # Orthofinder script where the orthogroups with human CYPs of interest were copied into.
@@ -39,6 +46,15 @@ TARGET_CYP_DIR_FULLPATH="${_PIPE_FINAL_OUTPUT_DIR}/Step_00_Orthofinder_TargetOGs
 # We will identify the full path to the first entry of the list of species, and then use its
 # directory name (dirname) to get the path to where the CDS FASTAs are deposited.
 ORTHOFINDER_CDS_INPUT_DIR="$(dirname "${_PIPE_COHORT_MEMBERS[0]}")"
+# If step 00 packed the CDS files into a CDS store, backtranslate from the store
+# instead of from the FASTA files.
+CDS_STORE_PATH_FILE="${_PIPE_FINAL_OUTPUT_DIR}/CDS_Store_Path.txt"
+if [ -s "${CDS_STORE_PATH_FILE}" ]
+then
+	BACKTRANSLATE_CDS_SOURCE="$(cat "${CDS_STORE_PATH_FILE}")"
+else
+	BACKTRANSLATE_CDS_SOURCE="${ORTHOFINDER_CDS_INPUT_DIR}"
+fi
 
 # Define path to the Orthogroups.tsv from Orthofinder
 ORTHOGROUPS_TSV="${_PIPE_ALL_DATA}/Orthogroups_${_PIPE_RUN_NICKNAME}.tsv"
@@ -46,7 +62,9 @@ ORTHOGROUPS_TSV="${_PIPE_ALL_DATA}/Orthogroups_${_PIPE_RUN_NICKNAME}.tsv"
 # Define the path to the CYP-Protein ID-Orthogroup ID CSV file
 TARGET_CYP_CSV="${_PIPE_ALL_DATA}/CYPnames_Trans_Prot_with_OGs_${_PIPE_RUN_NICKNAME}.csv"
 
-# Define paths to hold the intermediate files.
+# Define paths to hold the intermediate files. These are only written if
+# _PIPE_STEP01_KEEP_INTERMEDIATES is "yes"; otherwise each orthogroup is kept in
+# memory from start to finish, and only the PAML inputs are written.
 # A path for orthogroup sequences that have been translated to amino acids
 OG_AA_DIR="${_PIPE_SCRATCH_DIR}/${_PIPE_RUN_NICKNAME}_Target_OG_AA_Seqs"
 # A path for the aligned amino acid orthogroup sequences
@@ -60,24 +78,42 @@ PAML_SEQ_INPUT_DIR="${_PIPE_FINAL_OUTPUT_DIR}/Step_01_PAML_Seq_Inputs"
 # Make the output directories if they do not yet exist on disk
 mkdir -p "${OG_AA_DIR}" "${OG_AA_ALIGN_DIR}" "${OG_BACKTRANSLATED_ALIGN_DIR}" "${PAML_SEQ_INPUT_DIR}"
 
-# Run the translate-align-backgranslate-representative orthologue steps in a for loop
-for OG_FASTA in $(find "${TARGET_CYP_DIR_FULLPATH}" -mindepth 1 -maxdepth 1 -type f -name '*.fa')
-do
-	# Extract the OG ID from the filename
-	OG_ID=$(basename "${OG_FASTA}" | sed -e 's/.fa//g')
-	#	First, translate the orthogroup sequence to amino acid
-	python "${TRANSLATE_SCRIPT}" "${OG_FASTA}" > "${OG_AA_DIR}/${OG_ID}_AA.fa"
-
-	# 	Second, align the amino acids with MAFFT-linsi
-	mafft-linsi --maxiterate 1000 "${OG_AA_DIR}/${OG_ID}_AA.fa" > "${OG_AA_ALIGN_DIR}/${OG_ID}_AA_Aligned.fa"
-
-	#	Third, backtranslate the aligned amino acids to nucleotide
-	python "${BACKTRANSLATE_SCRIPT}" "${ORTHOFINDER_CDS_INPUT_DIR}" "${OG_AA_ALIGN_DIR}/${OG_ID}_AA_Aligned.fa" "${ORTHOGROUPS_TSV}" > "${OG_BACKTRANSLATED_ALIGN_DIR}/${OG_ID}_Backtranslated.fa"
-
-	#	Fourth, select one representative orthologue from each species, fix names for PAML, and replace gap (-) with question mark (?)
-	#		Note that for humans, the representative will be the NCBI sequence that is officially associated with that CYP gene
-	python "${REP_ORTHOLOGUE_SCRIPT}" "${OG_BACKTRANSLATED_ALIGN_DIR}/${OG_ID}_Backtranslated.fa" "${TARGET_CYP_CSV}" > "${PAML_SEQ_INPUT_DIR}/${OG_ID}_RepOrthologues.fa"
-done
+# Run the translate-align-backtranslate-representative orthologue steps for every
+# target orthogroup. The orthogroups are independent, so they are spread over a
+# pool of worker processes, one per CPU requested from Slurm (SLURM_CPUS_PER_TASK),
+# with the largest orthogroups started first. Each orthogroup is processed in memory,
+# with the amino acids piped through MAFFT-linsi. For each orthogroup:
+#	If _PIPE_STEP01_PRESELECT is "yes", first pick the representative orthologues
+#		(longest sequence per species, plus the human CYPs of interest) so that
+#		only they are translated, aligned, and backtranslated. This is skipped if
+#		_PIPE_REPRESENTATIVE_SELECTION is "identity", which needs the whole alignment.
+#	First, translate the orthogroup sequence to amino acid
+# 	Second, align the amino acids with MAFFT-linsi
+#	Third, backtranslate the aligned amino acids to nucleotide. Each worker opens the
+#		CDS files and the Orthogroups.tsv index only once. Sequences whose codons do not
+#		encode their aligned amino acids are reported (and optionally dropped)
+#		according to _PIPE_BACKTRANSLATE_VERIFY.
+#	Fourth, select one representative orthologue from each species, fix names for PAML, and replace gap (-) with question mark (?)
+#		Columns are trimmed with the method in _PIPE_TRIM_METHOD, and the columns removed from each
+#		orthogroup are written to Trim_Report.tsv in the PAML sequence input directory.
+#		The representative is the sequence with the fewest gaps ("length") or the highest
+#		codon identity to the human CYPs ("identity"), set by _PIPE_REPRESENTATIVE_SELECTION.
+#		Note that for humans, the representative will be the NCBI sequence that is officially associated with that CYP gene
+python "${PREPARE_PARALLEL_SCRIPT}" \
+	"${TARGET_CYP_DIR_FULLPATH}" \
+	"${BACKTRANSLATE_CDS_SOURCE}" \
+	"${ORTHOGROUPS_TSV}" \
+	"${TARGET_CYP_CSV}" \
+	"${OG_AA_DIR}" \
+	"${OG_AA_ALIGN_DIR}" \
+	"${OG_BACKTRANSLATED_ALIGN_DIR}" \
+	"${PAML_SEQ_INPUT_DIR}" \
+	"${_PIPE_BACKTRANSLATE_VERIFY:-off}" \
+	"${_PIPE_STEP01_KEEP_INTERMEDIATES:-no}" \
+	"${_PIPE_STEP01_PRESELECT:-no}" \
+	"${_PIPE_TRIM_METHOD:-gap}" \
+	"${_PIPE_REPRESENTATIVE_SELECTION:-length}" \
+	"${_PIPE_STEP01_MAFFT_SPARE_THREADS:-no}"
 
 # Put a checkpoint file when we finish
 touch "${_PIPE_FINAL_OUTPUT_DIR}/Checkpoints/01_Prepare_PAML_Sequences.done"
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+"""
+Column trimming methods for the backtranslated alignment of representative
+orthologues (see Choose_Representative_Orthologs.py). Gappy and low-information
+columns are the main reason that codeml runs take a long time. Every method
+works on the whole alignment at once, held as a 2-D uint8 NumPy array with one
+row per sequence, and returns a boolean mask of the columns to keep.
+
+The methods are:
+    gap:        Keep nucleotide columns with at most 50% gaps ('?'). This is
+                the original filter of the pipeline, and the default.
+    codon_gap:  Keep codons (sets of three columns) in which at most 50% of the
+                sequences have a gap. Whole codons are kept or removed, so the
+                reading frame is kept for PAML.
+    entropy:    The codon_gap filter, and also remove codons whose mean
+                Shannon entropy over their three nucleotide columns is more
+                than 1.0 bit (out of 2), i.e., columns that are too divergent
+                to be reliably aligned.
+    gappyout:   Keep codons with at most the gap proportion that is picked
+                automatically from the distribution of codon gap proportions
+                of the alignment, in the style of trimAl's -gappyout: the
+                cutoff is where the curve of gap proportion versus the fraction
+                of the alignment kept bends upward the most.
+
+Each orthogroup also gets a trim report row, with the number of columns that
+were removed and the predicted saving in codeml run time. The codeml time of a
+site model is roughly proportional to the number of distinct site patterns
+(distinct codon columns) in the alignment, so the predicted saving is one
+minus the ratio of site patterns after and before trimming.
+
+This is meant to be imported by the other pipeline scripts, e.g.,
+
+    from Alignment_Trimming import trim_columns, TRIM_METHODS
+"""
+
+import numpy as np
+
+# Allowed values of the trimming method
+TRIM_METHODS = ('gap', 'codon_gap', 'entropy', 'gappyout')
+# Byte value of the gap character in the backtranslated alignment
+GAP_CHAR = ord('?')
+# Maximum proportion of gaps in a kept column (or codon)
+MAX_PROP_GAP = 0.5
+# Maximum mean entropy (in bits) of the nucleotide columns of a kept codon
+MAX_CODON_ENTROPY = 1.0
+# Columns of the trim report
+TRIM_REPORT_HEADER = [
+    'Orthogroup', 'Trim_Method', 'Sequences', 'Columns_Before', 'Columns_After',
+    'Columns_Removed', 'Site_Patterns_Before', 'Site_Patterns_After',
+    'Predicted_Codeml_Time_Saved']
+
+# Lookup from the byte value of a nucleotide to its index in A, C, G, T. Any
+# other character (gaps and ambiguous bases) is 4 and is not counted.
+NUCLEOTIDE_INDEX = np.full(256, 4, dtype=np.uint8)
+for nuc_index, nucleotide in enumerate('ACGT'):
+    NUCLEOTIDE_INDEX[ord(nucleotide)] = nuc_index
+    NUCLEOTIDE_INDEX[ord(nucleotide.lower())] = nuc_index
+
+
+def column_gap_proportions(matrix):
+    """Return the proportion of gap characters (?) in each column of an
+    alignment matrix, as a 1-D float array."""
+    if matrix.shape[0] == 0:
+        return np.zeros(matrix.shape[1], dtype=np.float64)
+    return np.count_nonzero(matrix == GAP_CHAR, axis=0) / matrix.shape[0]
+
+
+def codon_view(matrix):
+    """Return a (n_seqs, n_codons, 3) view of the whole codons of an alignment
+    matrix. A partial codon at the end is left out."""
+    n_codons = matrix.shape[1] // 3
+    return matrix[:, 0:n_codons * 3].reshape(matrix.shape[0], n_codons, 3)
+
+
+def codon_gap_proportions(matrix):
+    """Return the proportion of sequences that have a gap in each codon."""
+    codons = codon_view(matrix)
+    if matrix.shape[0] == 0:
+        return np.zeros(codons.shape[1], dtype=np.float64)
+    return np.count_nonzero((codons == GAP_CHAR).any(axis=2), axis=0) / matrix.shape[0]
+
+
+def column_entropy(matrix):
+    """Return the Shannon entropy (in bits) of the A/C/G/T composition of each
+    column of an alignment matrix. Gaps and ambiguous bases are not counted;
+    a column with no A/C/G/T has entropy 0."""
+    nuc_index = NUCLEOTIDE_INDEX[matrix]
+    counts = np.stack([np.count_nonzero(nuc_index == i, axis=0) for i in range(4)])
+    totals = counts.sum(axis=0)
+    freqs = counts / np.maximum(totals, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = np.where(freqs > 0, -freqs * np.log2(freqs), 0.0)
+    return terms.sum(axis=0)
+
+
+def gappyout_cutoff(gap_props):
+    """Pick the gap proportion cutoff for the gappyout method. The gap
+    proportions are sorted into a curve of gap proportion against the
+    fraction of the alignment that is kept with that proportion as the
+    cutoff. The cutoff is the point where the slope of the curve increases the
+    most. If there are too few distinct gap proportions to have a curve, the
+    default MAX_PROP_GAP is used."""
+    levels = np.unique(gap_props)
+    if len(levels) < 3:
+        return MAX_PROP_GAP
+    # Fraction of the alignment that has a gap proportion at or below each level
+    retained = np.searchsorted(np.sort(gap_props), levels, side='right') / len(gap_props)
+    slopes = np.diff(levels) / np.diff(retained)
+    # slopes[i] runs from levels[i] to levels[i + 1], so the change between
+    # slopes[i] and slopes[i + 1] happens at levels[i + 1].
+    return levels[1 + np.argmax(np.diff(slopes))]
+
+
+def expand_codon_mask(codon_keep, aln_len):
+    """Turn a mask over codons into a mask over nucleotide columns. Columns of
+    a partial codon at the end are not kept."""
+    keep = np.zeros(aln_len, dtype=bool)
+    keep[0:len(codon_keep) * 3] = np.repeat(codon_keep, 3)
+    return keep
+
+
+def trim_columns(matrix, method='gap'):
+    """Return a boolean mask of the columns of an alignment matrix to keep,
+    with one of the methods in TRIM_METHODS (see the module doc string)."""
+    if method == 'gap':
+        return column_gap_proportions(matrix) <= MAX_PROP_GAP
+    codon_gaps = codon_gap_proportions(matrix)
+    if method == 'codon_gap':
+        codon_keep = codon_gaps <= MAX_PROP_GAP
+    elif method == 'entropy':
+        # Give the number of columns explicitly; numpy can not infer it for an
+        # alignment with no sequences.
+        codons = codon_view(matrix)
+        entropy = column_entropy(codons.reshape(codons.shape[0], codons.shape[1] * 3))
+        codon_entropy = entropy.reshape(-1, 3).mean(axis=1)
+        codon_keep = (codon_gaps <= MAX_PROP_GAP) & (codon_entropy <= MAX_CODON_ENTROPY)
+    elif method == 'gappyout':
+        codon_keep = codon_gaps <= gappyout_cutoff(codon_gaps)
+    else:
+        raise ValueError('Unknown trimming method: ' + str(method))
+    return expand_codon_mask(codon_keep, matrix.shape[1])
+
+
+def count_site_patterns(matrix):
+    """Return the number of distinct codon columns (site patterns) of an
+    alignment matrix, which is what the run time of codeml scales with."""
+    codons = codon_view(matrix)
+    if codons.shape[0] == 0 or codons.shape[1] == 0:
+        return 0
+    # Make each codon column one row of bytes, and count the distinct rows.
+    patterns = np.ascontiguousarray(codons.transpose(1, 0, 2)).reshape(codons.shape[1], -1)
+    return len(np.unique(patterns, axis=0))
+
+
+def trim_report_row(og_id, method, matrix, keep):
+    """Return the trim report row (see TRIM_REPORT_HEADER) for an alignment
+    matrix and the mask of kept columns."""
+    patterns_before = count_site_patterns(matrix)
+    patterns_after = count_site_patterns(matrix[:, keep])
+    saved = 1 - patterns_after / patterns_before if patterns_before else 0.0
+    n_kept = int(np.count_nonzero(keep))
+    return [
+        og_id, method, str(matrix.shape[0]), str(matrix.shape[1]), str(n_kept),
+        str(matrix.shape[1] - n_kept), str(patterns_before), str(patterns_after),
+        '{:.3f}'.format(saved)]
+
+
+def write_trim_report(trim_rows, report_handle):
+    """Write trim report rows, with a header, to an open handle."""
+    report_handle.write('\t'.join(TRIM_REPORT_HEADER) + '\n')
+    for trim_row in trim_rows:
+        report_handle.write('\t'.join(trim_row) + '\n')
+    return
@@ -4,115 +4,133 @@ Authors: TK AN... Majority taken directly from code by T. Kono.
 Date Modified: 2022-08-07
 
 Back translate amino acid sequences to nucleotides for cyp-identified
-orthogroups that have already been aligned. Requires Biopython and SAMtools.
-Takes three arugments:
-    1) Path to directory that contains CDS FASTA files
+orthogroups that have already been aligned. Requires NumPy. CDS sequences
+are fetched with the Fasta_Index module that is distributed with this script,
+which reads (or builds) the SAMtools-style '.fai' index of each CDS file.
+Takes three to five arugments:
+    1) Path to directory that contains CDS FASTA files, or the prefix of a CDS
+       store built by CDS_Store.py
     2) Path to the aligned amino acid FASTA file
     3) Path to the Orthogroups.tsv file
+    4) (Optional) Output directory, for batch mode (see below). Use '-' to
+       write to standard output as usual.
+    5) (Optional) Codon concordance check: 'off' (default), 'flag', or 'drop'
+       (see below)
 
 Usage:
 
 python /path/to/Backtranslate_AA_aligned.py /path/to/CDS_FASTA /path/to/OGXXXXXX_AA.fa /path/to/Orthogroups.tsv > /path/to/OGXXXXX_Backtranslated.fa 
 
+Batch mode: if an output directory is given as the fourth argument, then the
+second argument can be a directory of aligned amino acid FASTA files (all
+files ending in '.fa' are used) or a text file that lists the paths to the
+aligned FASTA files, one per line. Every alignment is backtranslated in one
+run of the script, and written to OGXXXXX_Backtranslated.fa in the output
+directory. The output for each orthogroup is the same as running the script
+on that orthogroup alone.
+
+python /path/to/Backtranslate_AA_aligned.py /path/to/CDS_FASTA /path/to/Aligned_AA_dir /path/to/Orthogroups.tsv /path/to/Backtranslated_dir
+
+Codon concordance check: backtranslation assumes that the nth non-gap residue
+of the aligned protein is encoded by the nth codon of the CDS. If a CDS record
+has a partial leading codon or an odd length, that is no longer true, and the
+backtranslated sequence is out of frame. With 'flag' or 'drop', the codons
+that were put in for each residue are translated back to amino acids and
+compared to the aligned residues. A per-sequence report of mismatches is
+written to Backtranslation_Concordance_Report.tsv in the output directory (or
+to standard error, when writing to standard output). With 'flag', offending
+sequences are reported but kept; with 'drop', they are also left out of the
+backtranslated FASTA.
+
 """
 
 import sys
-import subprocess
 import os
+import collections
 
 #NOT DO THIS CONVENTION, SO IT IS MORE PORTABLE TO OTHER COMPUTING ENVIRONMENTS
 #HOME_DIR = 
 #OUTPUT_DIR = HOME_DIR +
 
 try:
-    cds_db_dir = sys.argv[1]
-    og_to_backtrans = sys.argv[2]
-    orthogroups_tsv = sys.argv[3]
-except IndexError:
-    sys.stderr.write(__doc__ + '\n')
-    sys.exit(1)
-
-try:
-    from Bio import SeqIO
+    import numpy as np
 except ImportError:
-    print('This script requires Biopython')
+    print('This script requires NumPy')
     exit(1)
 
+from Fasta_Index import fetch_sequence
+from Fasta_IO import read_fasta, write_fasta
+from CDS_Store import is_cds_store, store_species, fetch_cds
+from Compressed_IO import strip_compression_suffix
+from Codon_Tools import translate_codons
+from Orthogroup_Index import open_og_index, species_lookup
+
+# Where the CDS sequences of a species are read from: the path of its CDS
+# FASTA file, or the prefix of a CDS store (is_store is True).
+CdsSource = collections.namedtuple('CdsSource', ['path', 'is_store'])
+
+
 def list_files(directory):
-    """Get the FASTA files that are present in the supplied directory."""
+    """Get the FASTA files that are present in the supplied directory, as a
+    dictionary of species name -> CdsSource. If the 'directory' is actually the
+    prefix of a CDS store, every species in the store is associated with the
+    store instead. Whether the sequences come from a store is decided here,
+    once, rather than for every sequence that is fetched. Compressed FASTA
+    files (e.g., Homo_sapiens.fasta.gz) are listed too."""
+    if is_cds_store(directory):
+        return dict((sp, CdsSource(directory, True)) for sp in store_species(directory))
     try:
         abpath = os.path.abspath(directory)
         filepaths = os.listdir(abpath)
         cds_dict = {}
         for fasta_file in filepaths:
-            if fasta_file.endswith('.fasta'):
+            if strip_compression_suffix(fasta_file).endswith('.fasta'):
                 species_name = fasta_file.split('.')[0]
-                cds_dict[species_name] = os.path.join(abpath, fasta_file)
+                cds_dict[species_name] = CdsSource(os.path.join(abpath, fasta_file), False)
     except (OSError, IOError):
         print('The directory supplied is not readable, or does not exist!')
         exit(1)
     return cds_dict
 
 
-def parse_og_tsv(og_table):
-    """Parse the Orthogroups.tsv file and return dictionary of
-    prot_id -> species. Use the column headers of the tsv file to identify the
-    species."""
-    # We will use the protein ID as the lookup name (called the "key" in Python
-    # dictionaries). The referenced value (called the "value" in Python in
-    # dictionaries) will be the species.
-    key_dat = {}
-    with open(og_table, 'rt') as f:
-        for line_number, row in enumerate(f):
-            if line_number == 0:
-                header = row.strip().split('\t')
-                # Remove the first column ("Orthogroup") because it is not of
-                # interest for this step.
-                species_names = header[1:]
-            else:
-                table_row = row.strip().split('\t')
-                # When multiple proteins from the same species are in a single
-                # orthogroup, Orthofinder reports them with a ', ' between
-                # the protein IDs. To maintain the association between the
-                # protein IDs and the species names, we will use the zip()
-                # function.
-                for pid_list, sp_name in zip(table_row[1:], species_names):
-                    # Now, we will split the protein ID list
-                    prot_ids = pid_list.split(', ')
-                    for pid in prot_ids:
-                        # push the protein ID -> species association into the
-                        # dictionary
-                        key_dat[pid] = sp_name
-    return key_dat
-
-
 #def fix_seqname(sname):
     #"""Don't need this cause it was needed for grass names quirkiness"""
 
 def extract_cds(file_list, prot_id, protein_key):
     """Given the protein ID from the alignment and the file list, get the
-    correct FASTA to extract from, then use samtools to fetch the CDS sequence.
+    correct FASTA to extract from, then fetch the CDS sequence from its index.
     """
     # Get the species name associated with the protein ID
     species = protein_key.get(prot_id)
     # Get the filename associated with the species name
-    cds_fasta = file_list.get(species)
-    #   Then, buld the command line
-    cmd = ['samtools', 'faidx', cds_fasta, prot_id]
-    proc = subprocess.Popen(
-        cmd, shell=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-        )
-    out, err = proc.communicate()
-    #   Then, process the output. We will remove the first line, since it is
-    #   just the sequence ID. We will then put all the nucleotides into a single
-    #   long string.
-    lines = out.decode('utf-8').split('\n')
-    cds = ''.join(lines[1:])
+    cds_source = file_list.get(species)
+    if cds_source is None:
+        sys.stderr.write('[extract_cds] There is no CDS file for species ' + str(species) + ' of ' + prot_id + '\n')
+        return ''
+    # 2026-10-16: Fetch the sequence from the memory-mapped CDS FASTA instead
+    # of running 'samtools faidx' once per sequence. The FASTA and its index
+    # are opened once per species and kept open for the rest of the run. The
+    # sequence comes back as a single long string, like the joined SAMtools
+    # output did.
+    # 2026-10-16: If the CDS files were packed into a CDS store (see
+    # CDS_Store.py), fetch the sequence from the store instead. list_files()
+    # has already decided which it is.
+    if cds_source.is_store:
+        return fetch_cds(cds_source.path, prot_id)
+    cds = fetch_sequence(cds_source.path, prot_id)
     return cds
 
-def backtranslate(p_seq, n_seq):
+# Byte values of the alignment gap character and the character that we use to
+# fill gapped codons.
+GAP_CHAR = ord('-')
+FILL_CHAR = ord('?')
+
+
+def backtranslate_loop(p_seq, n_seq):
     """Iterate through the aligned protein sequence, and replace the amino acids
-    with codon triplets from the CDS file."""
+    with codon triplets from the CDS file. This is the original, one residue
+    at a time, implementation. It is kept as the reference for
+    backtranslate() and is used when the CDS is too short for the protein."""
     #   Keep track of the new sequence. Also keep track of which codon we are
     #   actually processing (gaps don't count)
     newseq = ''
@@ -127,6 +145,76 @@ def backtranslate(p_seq, n_seq):
     return newseq
 
 
+def backtranslate(p_seq, n_seq):
+    """Replace the amino acids of an aligned protein sequence with codon
+    triplets from the CDS, and gaps with '???'. The codon that belongs to each
+    residue is found with a cumulative sum over the non-gap positions, and all
+    codons are copied out of a (n_codons, 3) view of the CDS at once. The
+    result is the same as backtranslate_loop()."""
+    p_arr = np.frombuffer(str(p_seq).encode('ascii'), dtype=np.uint8)
+    residues = p_arr != GAP_CHAR
+    n_codons = len(n_seq) // 3
+    # If the protein has more residues than the CDS has whole codons, the
+    # last codons would be partial. Use the loop so that the output is the
+    # same as it always was in that case.
+    if np.count_nonzero(residues) > n_codons:
+        return backtranslate_loop(p_seq, n_seq)
+    codons = np.frombuffer(n_seq.encode('ascii'), dtype=np.uint8, count=n_codons * 3).reshape(n_codons, 3)
+    # The nth non-gap residue gets the nth codon (counting from 0)
+    codon_index = np.cumsum(residues) - 1
+    newseq = np.full((len(p_arr), 3), FILL_CHAR, dtype=np.uint8)
+    newseq[residues] = codons[codon_index[residues]]
+    return newseq.tobytes().decode('ascii')
+
+
+def backtranslate_batch(p_seqs, n_seqs):
+    """Backtranslate many aligned protein sequences at once. 'p_seqs' is a list
+    of aligned protein sequences (all the same length) and 'n_seqs' is the list
+    of matching CDS sequences. Returns a (n_seqs, 3 * aligned length) uint8
+    matrix of backtranslated sequences, and an array with the number of
+    residues in each protein that had no whole codon left in its CDS. Those
+    residues are filled with '???' in the matrix, so every row keeps the
+    aligned length."""
+    n_rows = len(p_seqs)
+    aln_len = len(p_seqs[0]) if n_rows else 0
+    p_mat = np.frombuffer(''.join(str(p) for p in p_seqs).encode('ascii'), dtype=np.uint8).reshape(n_rows, aln_len)
+    residues = p_mat != GAP_CHAR
+    codon_index = np.cumsum(residues, axis=1) - 1
+    # Pack the CDS sequences into one (n_seqs, max_codons + 1, 3) array. The
+    # extra row at the end of each CDS is all '?' and is where gaps (and
+    # residues past the end of the CDS) take their codon from.
+    n_codons = np.array([len(n) // 3 for n in n_seqs], dtype=np.int64)
+    max_codons = int(n_codons.max()) if n_rows else 0
+    codons = np.full((n_rows, max_codons + 1, 3), FILL_CHAR, dtype=np.uint8)
+    for row, n_seq in enumerate(n_seqs):
+        k = n_codons[row]
+        codons[row, :k] = np.frombuffer(n_seq.encode('ascii'), dtype=np.uint8, count=k * 3).reshape(k, 3)
+    has_codon = residues & (codon_index < n_codons[:, None])
+    gather_index = np.where(has_codon, codon_index, max_codons)
+    newseqs = codons[np.arange(n_rows)[:, None], gather_index]
+    missing_codons = np.count_nonzero(residues & ~has_codon, axis=1)
+    return newseqs.reshape(n_rows, aln_len * 3), missing_codons
+
+
+def verify_concordance(p_seqs, bt_matrix):
+    """Check that backtranslated codons encode the aligned amino acids, for a
+    whole alignment at once. 'p_seqs' are the aligned protein sequences and
+    'bt_matrix' is the (n_seqs, 3 * aligned length) matrix that comes out of
+    backtranslate_batch(). Returns the number of mismatched residues in each
+    sequence and the (1-based) aligned column of the first mismatch in each
+    sequence, or 0 if there is no mismatch. Residues or codons that are
+    ambiguous ('X') are not compared."""
+    n_rows = len(p_seqs)
+    aln_len = len(p_seqs[0]) if n_rows else 0
+    p_mat = np.frombuffer(''.join(str(p) for p in p_seqs).upper().encode('ascii'), dtype=np.uint8).reshape(n_rows, aln_len)
+    translated = translate_codons(bt_matrix.reshape(n_rows, aln_len, 3))
+    comparable = (p_mat != GAP_CHAR) & (p_mat != ord('X')) & (translated != ord('X'))
+    mismatch = comparable & (translated != p_mat)
+    mismatch_counts = np.count_nonzero(mismatch, axis=1)
+    first_mismatch = np.where(mismatch_counts > 0, mismatch.argmax(axis=1) + 1, 0)
+    return mismatch_counts, first_mismatch
+
+
 def generate_paml_name(orig_name, protein_species_key):
     """Generate a PAML-friendly sequence name. It will be in the format of 
         Gen.spe_PROTEIN.ID
@@ -153,23 +241,173 @@ def generate_paml_name(orig_name, protein_species_key):
     return new_name
 
 
-def main(db_dir, msa, og_tsv):
+def list_alignments(aln_source):
+    """Return the list of aligned amino acid FASTA files to backtranslate in
+    batch mode. 'aln_source' is either a directory, in which case every file
+    ending in '.fa' (or a compressed '.fa.gz', '.fa.zst', ...) is used, or a
+    manifest file with one path per line."""
+    if os.path.isdir(aln_source):
+        abpath = os.path.abspath(aln_source)
+        aln_files = [
+            os.path.join(abpath, fname)
+            for fname in sorted(os.listdir(abpath))
+            if strip_compression_suffix(fname).endswith('.fa')]
+    else:
+        try:
+            with open(aln_source, 'rt') as f:
+                aln_files = [line.strip() for line in f if line.strip()]
+        except (OSError, IOError):
+            print('The alignment directory or manifest supplied is not readable, or does not exist!')
+            exit(1)
+    return aln_files
+
+
+def batch_output_name(aln_file, out_dir):
+    """Build the output filename for an alignment in batch mode. The
+    orthogroup ID is the part of the alignment filename before the first
+    underscore, e.g., OGXXXXX_AA_Aligned.fa -> OGXXXXX_Backtranslated.fa"""
+    og_id = os.path.basename(aln_file).split('_')[0]
+    return os.path.join(out_dir, og_id + '_Backtranslated.fa')
+
+
+def backtranslate_records(aln, paths, og_index, verify='off', aln_name=''):
+    """Backtranslate a list of aligned amino acid FASTA records (see
+    Fasta_IO.py). Returns a list of
+    (PAML name, backtranslated sequence) tuples, and a list of concordance
+    report rows (empty if 'verify' is 'off'). 'aln_name' is used to label the
+    report rows."""
+    # 2026-10-16: Look up the species of just the proteins in this alignment
+    # from the Orthogroups.tsv index (built in step 00), rather than parsing
+    # the whole Orthogroups.tsv into a dictionary for every orthogroup.
+    prot_og_key = species_lookup(og_index, [sequence.id for sequence in aln])
+    cds_seqs = [extract_cds(paths, sequence.id, prot_og_key) for sequence in aln]
+    p_seqs = [sequence.seq.decode('ascii') for sequence in aln]
+    # 2026-10-16: Backtranslate the whole alignment as one matrix. Sequences
+    # whose CDS is too short for the protein are redone with the original
+    # loop, so that the output is the same as backtranslating one at a time.
+    aligned = len(set(len(p_seq) for p_seq in p_seqs)) == 1
+    if aligned:
+        bt_matrix, missing_codons = backtranslate_batch(p_seqs, cds_seqs)
+    if verify != 'off':
+        if aligned:
+            mismatch_counts, first_mismatch = verify_concordance(p_seqs, bt_matrix)
+        else:
+            # Not a proper alignment (rows of different lengths). Check the
+            # sequences one at a time instead.
+            mismatch_counts = np.zeros(len(aln), dtype=np.int64)
+            first_mismatch = np.zeros(len(aln), dtype=np.int64)
+            missing_codons = np.zeros(len(aln), dtype=np.int64)
+            for row, p_seq in enumerate(p_seqs):
+                row_matrix, row_missing = backtranslate_batch([p_seq], [cds_seqs[row]])
+                row_counts, row_first = verify_concordance([p_seq], row_matrix)
+                mismatch_counts[row] = row_counts[0]
+                first_mismatch[row] = row_first[0]
+                missing_codons[row] = row_missing[0]
+    bt_records = []
+    report_rows = []
+    for row, sequence in enumerate(aln):
+        if aligned and missing_codons[row] == 0:
+            bt_seq = bt_matrix[row].tobytes().decode('ascii')
+        else:
+            bt_seq = backtranslate(p_seqs[row], cds_seqs[row])
+        # Added on 2022-08-07: new function to generate a PAML-friendly sequence name
+        paml_name = generate_paml_name(sequence.id, prot_og_key)
+        if verify != 'off':
+            # A sequence is out of concordance if any residue translates to a
+            # different amino acid, or if the CDS ran out of codons.
+            discordant = mismatch_counts[row] > 0 or missing_codons[row] > 0
+            if not discordant:
+                action = 'kept'
+            elif verify == 'drop':
+                action = 'dropped'
+            else:
+                action = 'flagged'
+            report_rows.append([
+                aln_name, sequence.id, paml_name,
+                str(len(p_seqs[row].replace('-', ''))), str(mismatch_counts[row]),
+                str(missing_codons[row]), str(first_mismatch[row]), action])
+            if action == 'dropped':
+                continue
+        bt_records.append((paml_name, bt_seq))
+    return bt_records, report_rows
+
+
+def write_backtranslated(bt_records, out_handle):
+    """Write backtranslated (name, sequence) tuples in FASTA format, with each
+    sequence on one line."""
+    write_fasta(((paml_name, paml_name, bt_seq) for paml_name, bt_seq in bt_records), out_handle, line_width=None)
+    return
+
+
+def backtranslate_alignment(msa, paths, og_index, out_handle, verify='off', report_handle=None):
+    """Backtranslate one aligned amino acid FASTA and write the result to an
+    open file handle. If 'verify' is 'flag' or 'drop', also check the codon
+    concordance of each sequence and write a row per sequence to
+    'report_handle'."""
+    #   Parse the alignment
+    aln = list(read_fasta(msa))
+    bt_records, report_rows = backtranslate_records(aln, paths, og_index, verify, os.path.basename(msa))
+    write_backtranslated(bt_records, out_handle)
+    for report_row in report_rows:
+        report_handle.write('\t'.join(report_row) + '\n')
+    return
+
+
+# Allowed values of the codon concordance check argument, and the columns of
+# the concordance report.
+VERIFY_MODES = ('off', 'flag', 'drop')
+REPORT_HEADER = [
+    'Alignment', 'Sequence_ID', 'PAML_Name', 'Residues', 'Codon_Mismatches',
+    'Missing_Codons', 'First_Mismatch_Column', 'Action']
+
+
+def main(db_dir, msa, og_tsv, out_dir=None, verify='off'):
     """Main function."""
     #   Get the paths of the CDS files
     paths = list_files(db_dir)
-    # Parse the Orthogroups.tsv file and store it as a dictionary
-    prot_og_key = parse_og_tsv(og_tsv)
-    #   Parse the alignment
-    aln = SeqIO.parse(msa, 'fasta')
-    for sequence in aln:
-        #s, p = fix_seqname(sequence.id)
-        cdsseq = extract_cds(paths, sequence.id, prot_og_key) 
-        bt_seq = backtranslate(sequence.seq, cdsseq)
-        # Added on 2022-08-07: new function to generate a PAML-friendly sequence name
-        paml_name = generate_paml_name(sequence.id, prot_og_key)
-        #   Print out the sequence in FASTA format
-        print('>' + paml_name + '\n' + bt_seq)
+    og_index = open_og_index(og_tsv)
+    if out_dir is None:
+        report_handle = sys.stderr if verify != 'off' else None
+        if report_handle:
+            report_handle.write('\t'.join(REPORT_HEADER) + '\n')
+        backtranslate_alignment(msa, paths, og_index, sys.stdout, verify, report_handle)
+    else:
+        # 2026-10-16: Batch mode. The CDS file list, the Orthogroups.tsv
+        # index, and the open CDS files are set up once and shared by every
+        # alignment.
+        os.makedirs(out_dir, exist_ok=True)
+        report_handle = None
+        if verify != 'off':
+            report_handle = open(os.path.join(out_dir, 'Backtranslation_Concordance_Report.tsv'), 'wt')
+            report_handle.write('\t'.join(REPORT_HEADER) + '\n')
+        for aln_file in list_alignments(msa):
+            with open(batch_output_name(aln_file, out_dir), 'wt') as out_handle:
+                backtranslate_alignment(aln_file, paths, og_index, out_handle, verify, report_handle)
+        if report_handle:
+            report_handle.close()
+    og_index.close()
     return
 
 
-main(cds_db_dir, og_to_backtrans, orthogroups_tsv)
\ No newline at end of file
+if __name__ == '__main__':
+    try:
+        cds_db_dir = sys.argv[1]
+        og_to_backtrans = sys.argv[2]
+        orthogroups_tsv = sys.argv[3]
+    except IndexError:
+        sys.stderr.write(__doc__ + '\n')
+        sys.exit(1)
+    try:
+        backtranslated_dir = sys.argv[4]
+    except IndexError:
+        backtranslated_dir = '-'
+    if backtranslated_dir == '-':
+        backtranslated_dir = None
+    try:
+        verify_mode = sys.argv[5]
+    except IndexError:
+        verify_mode = 'off'
+    if verify_mode not in VERIFY_MODES:
+        sys.stderr.write('The codon concordance check should be one of: ' + ', '.join(VERIFY_MODES) + '\n')
+        sys.exit(1)
+    main(cds_db_dir, og_to_backtrans, orthogroups_tsv, backtranslated_dir, verify_mode)
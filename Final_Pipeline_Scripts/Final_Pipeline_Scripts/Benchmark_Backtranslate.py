@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of the backtranslation engines in Backtranslate_AA_aligned.py.
+Simulates an aligned orthogroup of random CDS sequences, then times the
+original one-residue-at-a-time loop, the vectorized backtranslate(), and the
+whole-alignment backtranslate_batch(). It also checks that all three give the
+same sequences. Requires Biopython and NumPy (through
+Backtranslate_AA_aligned.py).
+
+Takes up to three optional arguments:
+    1) Number of sequences in the alignment (default: 50)
+    2) Length of the unaligned proteins, in amino acids (default: 500)
+    3) Number of timing repeats (default: 20)
+
+Usage:
+
+python /path/to/Benchmark_Backtranslate.py [N_SEQS] [PROT_LEN] [REPEATS]
+"""
+
+import sys
+import random
+import timeit
+
+from Backtranslate_AA_aligned import backtranslate_loop, backtranslate, backtranslate_batch
+
+try:
+    n_seqs = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    prot_len = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+except ValueError:
+    sys.stderr.write(__doc__ + '\n')
+    sys.exit(1)
+
+
+def simulate_alignment(num_seqs, length, seed=1):
+    """Simulate CDS sequences and a gapped "alignment" of their proteins. Each
+    protein is a random length near 'length', and gaps are inserted at random
+    until every row is the same length. Only the positions of the gaps matter
+    for backtranslation, so the amino acids are random."""
+    rng = random.Random(seed)
+    cds_seqs = []
+    lengths = []
+    for _ in range(num_seqs):
+        n_aa = rng.randint(int(length * 0.8), length)
+        cds_seqs.append(''.join(rng.choice('ACGT') for _ in range(n_aa * 3)))
+        lengths.append(n_aa)
+    aln_len = int(length * 1.2)
+    prot_seqs = []
+    for n_aa in lengths:
+        gaps = set(rng.sample(range(aln_len), aln_len - n_aa))
+        prot_seqs.append(''.join('-' if i in gaps else 'M' for i in range(aln_len)))
+    return prot_seqs, cds_seqs
+
+
+def main(num_seqs, length, n_repeats):
+    """Main function."""
+    prot_seqs, cds_seqs = simulate_alignment(num_seqs, length)
+    # Check that the engines agree before timing them.
+    expected = [backtranslate_loop(p, n) for p, n in zip(prot_seqs, cds_seqs)]
+    vectorized = [backtranslate(p, n) for p, n in zip(prot_seqs, cds_seqs)]
+    batch_matrix, missing_codons = backtranslate_batch(prot_seqs, cds_seqs)
+    batch = [row.tobytes().decode('ascii') for row in batch_matrix]
+    if expected != vectorized or expected != batch or missing_codons.any():
+        sys.stderr.write('The backtranslation engines do not agree!\n')
+        sys.exit(1)
+    timings = [
+        ('loop', lambda: [backtranslate_loop(p, n) for p, n in zip(prot_seqs, cds_seqs)]),
+        ('vectorized', lambda: [backtranslate(p, n) for p, n in zip(prot_seqs, cds_seqs)]),
+        ('batch', lambda: backtranslate_batch(prot_seqs, cds_seqs)),
+        ]
+    print('Alignment: ' + str(num_seqs) + ' sequences, ' + str(len(prot_seqs[0])) + ' aligned columns')
+    print('\t'.join(['Engine', 'Seconds_per_alignment', 'Speedup_vs_loop']))
+    loop_time = None
+    for engine, func in timings:
+        seconds = min(timeit.repeat(func, number=1, repeat=n_repeats))
+        if loop_time is None:
+            loop_time = seconds
+        print('\t'.join([engine, '{:.6f}'.format(seconds), '{:.1f}'.format(loop_time / seconds)]))
+    return
+
+
+main(n_seqs, prot_len, repeats)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""
+Startup-time benchmark of reading FASTA with Fasta_IO.py versus Biopython.
+The step 01 scripts used to be run once per orthogroup, so the time it takes
+to start Python and import the FASTA reader is paid thousands of times per
+run. This starts a fresh Python process that reads a FASTA file, over and
+over, and reports the time per invocation for:
+    1) Bare Python startup (no imports), as the floor
+    2) Importing Fasta_IO and reading the file
+    3) Importing Biopython's SeqIO and reading the file (skipped if Biopython
+       is not installed)
+
+Takes up to two optional arguments:
+    1) FASTA file to read (default: a simulated orthogroup of 50 sequences)
+    2) Number of invocations per reader (default: 20)
+
+Usage:
+
+python /path/to/Benchmark_Fasta_IO_Startup.py [FASTA] [REPEATS]
+"""
+
+import sys
+import os
+import random
+import subprocess
+import tempfile
+import time
+
+try:
+    fasta_file = sys.argv[1] if len(sys.argv) > 1 else None
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+except ValueError:
+    sys.stderr.write(__doc__ + '\n')
+    sys.exit(1)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+READERS = [
+    ('python_startup', 'pass'),
+    ('fasta_io', 'import sys; from Fasta_IO import read_fasta; n = sum(1 for r in read_fasta(sys.argv[1]))'),
+    ('biopython', "import sys; from Bio import SeqIO; n = sum(1 for r in SeqIO.parse(sys.argv[1], 'fasta'))"),
+    ]
+
+
+def simulate_fasta(out_handle, num_seqs=50, length=1500, seed=1):
+    """Write a FASTA file of random CDS-like sequences, wrapped at 60 bases."""
+    rng = random.Random(seed)
+    for i in range(num_seqs):
+        seq = ''.join(rng.choice('ACGT') for _ in range(length))
+        out_handle.write('>XP_' + str(i) + '.1 simulated\n')
+        for start in range(0, len(seq), 60):
+            out_handle.write(seq[start:start + 60] + '\n')
+    return
+
+
+def biopython_available():
+    """Check whether Biopython can be imported in a fresh Python process."""
+    return subprocess.run([sys.executable, '-c', 'import Bio'], stderr=subprocess.DEVNULL).returncode == 0
+
+
+def time_invocations(code, fasta, n_repeats):
+    """Run 'python -c code fasta' n_repeats times, and return the fastest and
+    the mean wall-clock time of one invocation."""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = SCRIPT_DIR + os.pathsep + env.get('PYTHONPATH', '')
+    timings = []
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code, fasta], env=env, check=True)
+        timings.append(time.perf_counter() - start)
+    return min(timings), sum(timings) / len(timings)
+
+
+def main(fasta, n_repeats):
+    """Main function."""
+    tmp_file = None
+    if fasta is None:
+        tmp_file = tempfile.NamedTemporaryFile('wt', suffix='.fa', delete=False)
+        simulate_fasta(tmp_file)
+        tmp_file.close()
+        fasta = tmp_file.name
+    readers = READERS if biopython_available() else READERS[:-1]
+    print('FASTA: ' + fasta + ', ' + str(n_repeats) + ' invocations per reader')
+    print('\t'.join(['Reader', 'Best_seconds', 'Mean_seconds', 'Mean_over_startup']))
+    startup_time = None
+    for reader, code in readers:
+        best, mean = time_invocations(code, fasta, n_repeats)
+        if startup_time is None:
+            startup_time = mean
+        print('\t'.join([reader, '{:.4f}'.format(best), '{:.4f}'.format(mean), '{:.4f}'.format(mean - startup_time)]))
+    if tmp_file is not None:
+        os.remove(tmp_file.name)
+    return
+
+
+main(fasta_file, repeats)
@@ -0,0 +1,73 @@
+#!/bin/bash
+#SBATCH --nodes=1 #how many nodes
+#SBATCH --ntasks=1 #how many threads
+#SBATCH --cpus-per-task=32
+#SBATCH --mem-per-cpu=4gb
+#SBATCH --time=24:00:00 #time limit hrs:min:sec
+#SBATCH --partition=amilan #partition or queue
+#SBATCH --qos=normal #quality of service
+#SBATCH --job-name=bench_orthofinder #job name
+#SBATCH --output=bench_orthofinder.%j.out #output log
+#SBATCH --error=bench_orthofinder.%j.err #error log
+
+# Benchmark the two step 00 Orthofinder searches on the same cohort:
+#	blast_nucl: the nucleotide BLAST search on the CDS files
+#	diamond: the protein DIAMOND search on the translated CDS files (see Translate_Cohort_CDS.py)
+# Both stop after the orthogroups are inferred (-og), since that is all that
+# the search changes. Writes to the output directory:
+#	Orthofinder_Search_Benchmark.tsv: wall-clock time of each search
+#	Orthogroup_Concordance_Report.tsv: target orthogroup members of the
+#		DIAMOND run compared to the blast_nucl run (see Compare_Orthogroup_Runs.py)
+#
+# Usage:
+#	sbatch --export=ALL,_PIPE_SCRIPTS_FROM_GITHUB=/path/to/PGxPipelineDevelopment \
+#		Benchmark_Orthofinder_Search.sh /path/to/Species_list.txt /path/to/CYP_CSV /path/to/Output_Dir
+# where Species_list.txt lists the CDS FASTA files of the cohort (e.g., the
+# 10-species cohort), one per line, like the one that Palea.sh writes, and
+# _PIPE_SCRIPTS_FROM_GITHUB is the clone of this repository, as in Lemma.sh.
+# Relative paths are taken from the directory that sbatch is run from.
+
+# Load conda environment
+module load anaconda
+conda activate CYPevol
+
+set -euo pipefail
+
+# Resolve the arguments (and the CDS files in the species list) to absolute
+# paths before changing into the output directory, so that relative paths work.
+# Relative paths are from the directory that sbatch was run from, which is
+# where Slurm starts the job.
+SPECIES_LIST="$(realpath "${1}")"
+CYP_CSV="$(realpath "${2}")"
+mkdir -p "${3}"
+BENCH_OUT="$(realpath "${3}")"
+SPECIES_FASTAS=()
+for species_fasta in $(cat "${SPECIES_LIST}")
+do
+	SPECIES_FASTAS+=("$(realpath "${species_fasta}")")
+done
+SCRIPT_DIR="${_PIPE_SCRIPTS_FROM_GITHUB}/Final_Pipeline_Scripts"
+cd "${BENCH_OUT}"
+
+# Link the CDS files for the blast_nucl search, and translate them for DIAMOND
+rm -rf cds_in prot_in blast_nucl diamond
+mkdir -p cds_in
+for species_fasta in "${SPECIES_FASTAS[@]}"
+do
+	ln -s "${species_fasta}" "cds_in/$(basename "${species_fasta}")"
+done
+python "${SCRIPT_DIR}/Translate_Cohort_CDS.py" prot_in CDS_Protein_Map.tsv "${SPECIES_FASTAS[@]}"
+
+echo -e "Search\tSeconds" > Orthofinder_Search_Benchmark.tsv
+START=$(date +%s)
+orthofinder -f cds_in -t "${SLURM_CPUS_PER_TASK}" -a "${SLURM_CPUS_PER_TASK}" -d -S "blast_nucl" -og -o blast_nucl
+echo -e "blast_nucl\t$(( $(date +%s) - START ))" >> Orthofinder_Search_Benchmark.tsv
+START=$(date +%s)
+orthofinder -f prot_in -t "${SLURM_CPUS_PER_TASK}" -a "${SLURM_CPUS_PER_TASK}" -S "diamond" -og -o diamond
+echo -e "diamond\t$(( $(date +%s) - START ))" >> Orthofinder_Search_Benchmark.tsv
+
+python "${SCRIPT_DIR}/Compare_Orthogroup_Runs.py" \
+	"$(find blast_nucl -type f -name 'Orthogroups.tsv')" \
+	"$(find diamond -type f -name 'Orthogroups.tsv')" \
+	"${CYP_CSV}" > Orthogroup_Concordance_Report.tsv
+cat Orthofinder_Search_Benchmark.tsv
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of the representative orthologue selection modes in
+Choose_Representative_Orthologs.py. Simulates a backtranslated, aligned
+orthogroup with many paralogues per species, then times
+pick_representative_ortholog() with the 'length' (fewest gaps) and 'identity'
+(highest codon identity to the human sequences) modes. Requires NumPy
+(through Choose_Representative_Orthologs.py).
+
+Takes up to four optional arguments:
+    1) Number of sequences in the orthogroup (default: 300)
+    2) Number of species, including human (default: 16)
+    3) Aligned length, in codons (default: 600)
+    4) Number of timing repeats (default: 20)
+
+Usage:
+
+python /path/to/Benchmark_Representative_Selection.py [N_SEQS] [N_SPECIES] [N_CODONS] [REPEATS]
+"""
+
+import sys
+import random
+import timeit
+
+from Fasta_IO import FastaRecord
+from Choose_Representative_Orthologs import pick_representative_ortholog
+
+try:
+    n_seqs = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    n_species = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    n_codons = int(sys.argv[3]) if len(sys.argv) > 3 else 600
+    repeats = int(sys.argv[4]) if len(sys.argv) > 4 else 20
+except ValueError:
+    sys.stderr.write(__doc__ + '\n')
+    sys.exit(1)
+
+CODONS = [a + b + c for a in 'ACGT' for b in 'ACGT' for c in 'ACGT']
+
+
+def simulate_orthogroup(num_seqs, num_species, length, seed=1):
+    """Simulate a backtranslated orthogroup as the species dictionary that
+    generate_fasta_dictionary() makes. Every sequence is a copy of a random
+    ancestral sequence with some codons changed and a random block of gaps, so
+    that the candidates differ in both length and identity. Returns the
+    dictionary and the human protein lookup."""
+    rng = random.Random(seed)
+    ancestor = [rng.choice(CODONS) for _ in range(length)]
+    species_codes = ['Hom.sap'] + ['S{:02d}.spe'.format(i)[0:7] for i in range(1, num_species)]
+    og_dict = dict()
+    og_human_lookup = dict()
+    for i in range(num_seqs):
+        species = species_codes[i % num_species]
+        divergence = rng.uniform(0.01, 0.4)
+        codons = [rng.choice(CODONS) if rng.random() < divergence else c for c in ancestor]
+        gap_start = rng.randrange(length)
+        gap_end = min(length, gap_start + rng.randrange(length // 4 + 1))
+        codons[gap_start:gap_end] = ['???'] * (gap_end - gap_start)
+        prot_id = 'XP_{:06d}.1'.format(i)
+        if species == 'Hom.sap':
+            og_human_lookup[prot_id] = 'OG0000000'
+        seq_id = species + '_' + prot_id
+        og_dict.setdefault(species, []).append(FastaRecord(seq_id, seq_id, ''.join(codons).encode('ascii')))
+    return og_dict, og_human_lookup
+
+
+def main(num_seqs, num_species, length, n_repeats):
+    """Main function."""
+    og_dict, og_human_lookup = simulate_orthogroup(num_seqs, num_species, length)
+    print('Orthogroup: ' + str(num_seqs) + ' sequences, ' + str(num_species) + ' species, ' + str(length) + ' aligned codons')
+    print('\t'.join(['Selection', 'Seconds_per_orthogroup', 'Changed_representatives']))
+    length_reps = pick_representative_ortholog(og_dict, 'OG0000000', og_human_lookup, 'length')
+    for selection in ('length', 'identity'):
+        seconds = min(timeit.repeat(
+            lambda: pick_representative_ortholog(og_dict, 'OG0000000', og_human_lookup, selection),
+            number=1, repeat=n_repeats))
+        reps = pick_representative_ortholog(og_dict, 'OG0000000', og_human_lookup, selection)
+        changed = len(set(reps) - set(length_reps))
+        print('\t'.join([selection, '{:.6f}'.format(seconds), str(changed)]))
+    return
+
+
+main(n_seqs, n_species, n_codons, repeats)
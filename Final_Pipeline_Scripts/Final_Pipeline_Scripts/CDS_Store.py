@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+"""
+Pack the CDS FASTA files of a cohort into a single sequence store that can be
+memory-mapped by any number of processes at once.
+
+The store is two files that share a prefix:
+    PREFIX.seq: Every CDS sequence of every species, one after another, with
+                the FASTA line breaks removed.
+    PREFIX.idx.sqlite: Index of sequence ID -> (offset, length, species) in
+                PREFIX.seq, plus the size and modification time of each member
+                FASTA file so that the store is rebuilt when one changes, and
+                of the PREFIX.seq file it was built with.
+Fetching a sequence is then an index lookup and a slice of the mapped
+PREFIX.seq file, with no copying until the caller asks for a string.
+
+The two files are renamed into place one after the other, so a run that opens
+the store while another run rebuilds it could get the new PREFIX.seq with the
+old index. The index records the size and modification time of its PREFIX.seq,
+and a store whose files do not match is waited for, and then rebuilt or
+refused, rather than read with the wrong offsets.
+
+The prefix is derived from the set of member FASTA files, so that every run of
+the same cohort finds the same store. The member FASTA files can be gzip,
+BGZF, or zstd compressed (see Compressed_IO.py); they are stream-decompressed
+while the store is built, and the store itself is not compressed.
+
+Takes two or more arguments:
+    1) Directory to hold CDS stores
+    2+) CDS FASTA files of the cohort members
+
+Prints the prefix of the (new or existing) store to standard output.
+
+Usage:
+
+python /path/to/CDS_Store.py /path/to/CDS_Stores /path/to/species1.fasta /path/to/species2.fasta ... > CDS_Store_Path.txt
+"""
+
+import sys
+import os
+import mmap
+import sqlite3
+import time
+import hashlib
+import functools
+
+from Compressed_IO import open_compressed
+
+# Bump this if the layout of the store changes, so that old stores get
+# rebuilt rather than read with the wrong layout.
+STORE_VERSION = '2'
+# Number of times to look again, one second apart, for a store whose sequence
+# buffer does not match its index (e.g., while another run renames them in)
+SWAP_RETRIES = 10
+
+
+def cohort_store_prefix(store_dir, fasta_files):
+    """Return the store prefix for a set of member FASTA files. The species
+    file names are hashed so that each distinct cohort gets its own store."""
+    members = sorted(os.path.basename(f) for f in fasta_files)
+    cohort_hash = hashlib.sha1('\n'.join(members).encode('utf-8')).hexdigest()[0:10]
+    return os.path.join(store_dir, 'CDS_Store_' + str(len(members)) + 'sp_' + cohort_hash)
+
+
+def species_name(fasta_file):
+    """Return the species name of a CDS FASTA file, e.g., /path/to/Homo_sapiens.fasta
+    -> Homo_sapiens. This is the same convention as the CDS file list in
+    Backtranslate_AA_aligned.py."""
+    return os.path.basename(fasta_file).split('.')[0]
+
+
+def member_signature(fasta_file):
+    """Return the (size, mtime) of a member FASTA as strings."""
+    st = os.stat(fasta_file)
+    return str(st.st_size), str(st.st_mtime_ns)
+
+
+def seq_signature(st):
+    """Return the (size, mtime) of the os.stat() result of a PREFIX.seq file as
+    strings."""
+    return str(st.st_size), str(st.st_mtime_ns)
+
+
+def is_cds_store(prefix):
+    """Return True if 'prefix' is the prefix of a CDS store."""
+    return os.path.isfile(prefix + '.seq') and os.path.isfile(prefix + '.idx.sqlite')
+
+
+def store_is_current(prefix, fasta_files):
+    """Check that a CDS store exists and was built from the current versions
+    of exactly these member FASTA files."""
+    if not is_cds_store(prefix):
+        return False
+    try:
+        conn = sqlite3.connect(prefix + '.idx.sqlite')
+        meta = dict(conn.execute('SELECT key, value FROM meta'))
+        stored = conn.execute('SELECT fasta_path, fasta_size, fasta_mtime FROM species').fetchall()
+        conn.close()
+    except sqlite3.Error:
+        return False
+    if meta.get('store_version') != STORE_VERSION:
+        return False
+    if (meta.get('seq_size'), meta.get('seq_mtime')) != seq_signature(os.stat(prefix + '.seq')):
+        return False
+    current = [(os.path.abspath(f),) + member_signature(f) for f in fasta_files]
+    return sorted(stored) == sorted(current)
+
+
+def build_cds_store(prefix, fasta_files):
+    """Read the member FASTA files and write the sequence buffer and index of a
+    CDS store. Both files are written under temporary names and then renamed
+    into place."""
+    tmp_seq = prefix + '.seq.' + str(os.getpid()) + '.tmp'
+    tmp_idx = prefix + '.idx.sqlite.' + str(os.getpid()) + '.tmp'
+    if os.path.exists(tmp_idx):
+        os.remove(tmp_idx)
+    conn = sqlite3.connect(tmp_idx)
+    conn.executescript("""
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE species (
+            species_code INTEGER PRIMARY KEY,
+            species_name TEXT,
+            fasta_path TEXT,
+            fasta_size TEXT,
+            fasta_mtime TEXT);
+        CREATE TABLE sequences (
+            seq_id TEXT,
+            species_code INTEGER,
+            seq_offset INTEGER,
+            seq_length INTEGER,
+            description TEXT);
+        """)
+    offset = 0
+    with open(tmp_seq, 'wb') as seq_out:
+        for species_code, fasta_file in enumerate(fasta_files):
+            fasta_size, fasta_mtime = member_signature(fasta_file)
+            conn.execute(
+                'INSERT INTO species VALUES (?, ?, ?, ?, ?)',
+                (species_code, species_name(fasta_file), os.path.abspath(fasta_file), fasta_size, fasta_mtime))
+            rows = []
+            seq_id = None
+            with open_compressed(fasta_file, 'rb') as f:
+                for line in f:
+                    if line.startswith(b'>'):
+                        if seq_id is not None:
+                            rows.append((seq_id, species_code, seq_start, offset - seq_start, description))
+                        # The sequence ID is the header up to the first space;
+                        # keep the rest of the header as the description.
+                        header = line[1:].rstrip(b'\r\n').decode('utf-8')
+                        seq_id = header.split()[0]
+                        description = header
+                        seq_start = offset
+                    else:
+                        bases = line.rstrip(b'\r\n')
+                        seq_out.write(bases)
+                        offset += len(bases)
+            if seq_id is not None:
+                rows.append((seq_id, species_code, seq_start, offset - seq_start, description))
+            conn.executemany('INSERT INTO sequences VALUES (?, ?, ?, ?, ?)', rows)
+    conn.execute('CREATE INDEX sequences_id ON sequences (seq_id)')
+    # The rename keeps the size and modification time of the buffer
+    seq_size, seq_mtime = seq_signature(os.stat(tmp_seq))
+    conn.executemany(
+        'INSERT INTO meta VALUES (?, ?)',
+        [('store_version', STORE_VERSION), ('seq_size', seq_size), ('seq_mtime', seq_mtime)])
+    conn.commit()
+    conn.close()
+    os.replace(tmp_seq, prefix + '.seq')
+    os.replace(tmp_idx, prefix + '.idx.sqlite')
+    return
+
+
+@functools.lru_cache(maxsize=None)
+def open_cds_store(prefix):
+    """Memory-map the sequence buffer of a CDS store and open its index.
+    Returns a tuple of (memoryview of the buffer, index connection). This is
+    cached, so each process maps the store only once. Raises ValueError if the
+    buffer still does not match the index after SWAP_RETRIES tries."""
+    for attempt in range(SWAP_RETRIES):
+        # Open the index first; the open files stay the same even if another
+        # run renames new ones into place.
+        conn = sqlite3.connect('file:' + prefix + '.idx.sqlite?mode=ro', uri=True)
+        meta = dict(conn.execute('SELECT key, value FROM meta'))
+        with open(prefix + '.seq', 'rb') as f:
+            st = os.fstat(f.fileno())
+            if (meta.get('seq_size'), meta.get('seq_mtime')) == seq_signature(st):
+                # mmap can not map an empty file; an empty store has no sequences.
+                if st.st_size == 0:
+                    mapped = b''
+                else:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                return memoryview(mapped), conn
+        conn.close()
+        time.sleep(1)
+    raise ValueError('The sequence buffer of the CDS store ' + prefix + ' does not match its index; rebuild it with CDS_Store.py.')
+
+
+def store_record(prefix, seq_id):
+    """Return the (offset, length, species name, description) of a sequence in
+    a CDS store, or None if it is not in the store."""
+    buffer, conn = open_cds_store(prefix)
+    return conn.execute(
+        'SELECT seq_offset, seq_length, species_name, description FROM sequences '
+        'JOIN species USING (species_code) WHERE seq_id = ?', (seq_id,)).fetchone()
+
+
+def fetch_cds_view(prefix, seq_id):
+    """Return a zero-copy memoryview of a sequence in a CDS store, or None if
+    it is not in the store. The view can be handed straight to
+    numpy.frombuffer()."""
+    record = store_record(prefix, seq_id)
+    if record is None:
+        return None
+    buffer, conn = open_cds_store(prefix)
+    seq_offset, seq_length = record[0:2]
+    return buffer[seq_offset:seq_offset + seq_length]
+
+
+def fetch_cds(prefix, seq_id):
+    """Return a sequence from a CDS store as a string. Like 'samtools faidx', a
+    sequence that is not in the store gives an empty result and a warning on
+    stderr."""
+    view = fetch_cds_view(prefix, seq_id)
+    if view is None:
+        sys.stderr.write('[fetch_cds] Could not find ' + seq_id + ' in ' + prefix + '\n')
+        return ''
+    return view.tobytes().decode('ascii')
+
+
+def fetch_cds_record(prefix, seq_id):
+    """Return the (sequence, description) of a sequence in a CDS store from a
+    single index lookup, or None if it is not in the store."""
+    record = store_record(prefix, seq_id)
+    if record is None:
+        return None
+    buffer, conn = open_cds_store(prefix)
+    seq_offset, seq_length, sp_name, description = record
+    return buffer[seq_offset:seq_offset + seq_length].tobytes().decode('ascii'), description
+
+
+def store_species(prefix):
+    """Return the species names of the members of a CDS store."""
+    buffer, conn = open_cds_store(prefix)
+    return [row[0] for row in conn.execute('SELECT species_name FROM species ORDER BY species_code')]
+
+
+def main(store_dir, fasta_files):
+    """Main function. Build the CDS store for the cohort if it is missing or
+    out of date, and print its prefix."""
+    os.makedirs(store_dir, exist_ok=True)
+    prefix = cohort_store_prefix(os.path.abspath(store_dir), fasta_files)
+    if not store_is_current(prefix, fasta_files):
+        build_cds_store(prefix, fasta_files)
+    print(prefix)
+    return
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        sys.stderr.write(__doc__ + '\n')
+        sys.exit(1)
+    main(sys.argv[1], sys.argv[2:])
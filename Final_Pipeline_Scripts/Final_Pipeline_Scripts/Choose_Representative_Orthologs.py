@@ -5,12 +5,35 @@ backtranslated) orthogroup. The method that will be used for choosing a
 representative is the sequence with the fewest number of gaps will be
 retained. (Recall that because the sequences are aligned, they will all be
 the same length.) In the case of a tie, the first sequence in lexicographic
-sort order will be chosen. Requires Biopython, and take one argument:
+sort order will be chosen. FASTA is read and written with Fasta_IO.py (no
+Biopython needed). Requires NumPy, and take one argument:
 	1) Backtranslated orthogroup FASTA for an individual gene
 	2) CYP-ProteinID-Orthogroup CSV
+	3) (Optional) Path to write a report of the STOP codons that were masked
+	   in each sequence (see mask_stop_codons()). Use '-' to skip it.
+	4) (Optional) Column trimming method: gap (default), codon_gap, entropy, or
+	   gappyout (see Alignment_Trimming.py)
+	5) (Optional) Path to write the trim report for the orthogroup. Use '-' to skip it.
+	6) (Optional) Representative selection mode: length (default; fewest gaps) or identity
+	   (highest codon identity to the human sequences; see pick_representative_ortholog())
 
 Usage:
-python OrthologSelection.py /path/to/OGXXXXX_Backtranslated.fa path/to/ProteinID_JulyOG.csv > /path/to/OGXXXXX_RepOrthologues.fa
+python OrthologSelection.py /path/to/OGXXXXX_Backtranslated.fa path/to/ProteinID_JulyOG.csv [STOP_REPORT.tsv] [TRIM_METHOD] [TRIM_REPORT.tsv] [SELECTION] > /path/to/OGXXXXX_RepOrthologues.fa
+
+Batch mode: if the first argument is a directory of backtranslated orthogroups (all files
+ending in '.fa') or a text file that lists their paths one per line, then every orthogroup is
+done in one run. The CSV is read once, and the orthogroups are spread over a pool of worker
+processes (one per CPU in SLURM_CPUS_PER_TASK, by default). The arguments are then:
+	1) Directory or manifest of backtranslated orthogroup FASTA files
+	2) CYP-ProteinID-Orthogroup CSV
+	3) Output directory; OGXXXXX_RepOrthologues.fa is written here for each orthogroup, along
+	   with Stop_Codon_Report.tsv, Trim_Report.tsv, and Representative_Selection_Summary.tsv
+	   (sequences kept, columns trimmed, and STOP codons masked in each orthogroup)
+	4) (Optional) Column trimming method (as above)
+	5) (Optional) Representative selection mode (as above)
+	6) (Optional) Number of workers
+
+python OrthologSelection.py /path/to/Backtranslated_dir path/to/ProteinID_JulyOG.csv /path/to/RepOrthologues_dir [TRIM_METHOD] [SELECTION] [N_WORKERS]
 
 
 2024-02-18: Update to the selection procedure to perform the following:
@@ -27,6 +50,9 @@ primarily interested in analyzing the genes as they are characterized in humans.
 The column-wise gap filter is applied because "gappy" columns take a long time to
 process in PAML and do not provide much information.
 
+2026-10-16: The 50% gap filter of step 4 is now the default ('gap') of several trimming
+methods in Alignment_Trimming.py. The method is picked with _PIPE_TRIM_METHOD in Lemma.sh.
+
 """
 
 import sys
@@ -35,18 +61,15 @@ import os
 import pprint
 
 try:
-   from Bio import SeqIO
+	import numpy as np
 except ImportError:
-   print('This script requires Biopython')
-   sys.exit(1)
-
-try:
-	og_fa_in = sys.argv[1]
-	cyp_protid_og_csv = sys.argv[2]
-except IndexError:
-	sys.stderr.write(__doc__+ '\n')
+	print('This script requires NumPy')
 	sys.exit(1)
 
+from Fasta_IO import read_fasta, write_fasta
+from Compressed_IO import open_compressed
+from Alignment_Trimming import GAP_CHAR, TRIM_METHODS, column_gap_proportions, trim_columns, trim_report_row, write_trim_report
+
 def generate_fasta_dictionary(og_fasta):
 	"""Read a FASTA file containing a backtranslated and aligned orthogroup sequence. It will return a
 	dictionary of the form
@@ -54,11 +77,11 @@ def generate_fasta_dictionary(og_fasta):
 			'sp1_id': [sp1_gene1, sp1_gene2, ...],
 			'sp2_id': [sp2_gene1, sp2_gene2, ...]
 		}
-	where 'spX_id' is the 6-character species identifier for species X, and 'spX_geneY' is the 'SeqRecord'
-	object for the actual FASTA record of a single gene in species X.
+	where 'spX_id' is the 6-character species identifier for species X, and 'spX_geneY' is the 'FastaRecord'
+	(see Fasta_IO.py) for the actual FASTA record of a single gene in species X.
 	EDIT: 12 Feb 2024 - with the addition of species. now using a gen.spe six letter plus . code. try for 7 characters 0:6 ..."""
 	og_dict = dict()
-	for og_seq in SeqIO.parse(og_fasta, 'fasta'):
+	for og_seq in read_fasta(og_fasta):
 		seq_name = og_seq.id 
 		species_name = seq_name[0:7]
 		if species_name in og_dict: 
@@ -92,13 +115,70 @@ def generate_gene_lookup(csvPath):
 			lookup[prot_id] = orthogroup_id #using orthogroup id as the key because will need to lookup by orthogroup id
 	return lookup
 
-def pick_representative_ortholog(full_og_dict, og_ID, og_human_lookup):
+def codon_identity_to_humans(candidates, human_genes):
+	"""Calculate the identity of every candidate sequence to the human reference sequences, over the
+	aligned codons. The identity of a candidate to one human sequence is the proportion of codons that
+	are identical, out of the codons where neither sequence has a gap; the identity of the candidate is
+	its highest identity to any of the human sequences. Every candidate is compared to every human
+	sequence at once, by broadcasting a (candidates, 1, codons) array against a (1, humans, codons)
+	array. Returns a 1-D array with one identity per candidate."""
+	aln_len = min(len(record.seq) for record in candidates + human_genes)
+	n_codons = aln_len // 3
+	def packed_codons(records):
+		matrix = np.empty((len(records), n_codons * 3), dtype=np.uint8)
+		for row, record in enumerate(records):
+			matrix[row] = np.frombuffer(record.seq, dtype=np.uint8, count=n_codons * 3)
+		codons = matrix.reshape(len(records), n_codons, 3)
+		return pack_codon_bytes(codons), ~(codons == GAP_CHAR).any(axis=2)
+	cand_codons, cand_present = packed_codons(candidates)
+	human_codons, human_present = packed_codons(human_genes)
+	compared = cand_present[:, None, :] & human_present[None, :, :]
+	identical = compared & (cand_codons[:, None, :] == human_codons[None, :, :])
+	n_compared = np.count_nonzero(compared, axis=2)
+	identity = np.count_nonzero(identical, axis=2) / np.maximum(n_compared, 1)
+	return identity.max(axis=1)
+
+
+# Allowed values of the representative selection mode
+SELECTION_MODES = ('length', 'identity')
+
+
+def pick_representative_ortholog(full_og_dict, og_ID, og_human_lookup, selection='length'):
 	"""This function will parse the orthologs in each species group and 1)calculate the length of the
 	sequence 2)calculate how many gap characters (????) are in the sequence 3)return the ortholog per
-	species with the fewest gap characters."""
+	species with the fewest gap characters.
+	2026-10-16: With selection='identity', the ortholog per species is instead the one with the highest
+	codon identity to the human sequences that are kept (see codon_identity_to_humans()), with ties
+	going to the fewest gap characters and then to the first sequence. This avoids picking a long but
+	divergent paralogue over the true orthologue. If no human sequence is kept, the fewest gap
+	characters rule is used."""
 	# Uncomment this to see the format of the NCBI Protein ID->Orthogroup dictionary
 	# pprint.pprint(og_human_lookup)
 	representative_og_dict = dict()
+	if selection == 'identity':
+		human_genes = [
+			human_gene for human_gene in full_og_dict.get('Hom.sap', [])
+			if human_gene.id[8:] in og_human_lookup]
+		candidates = [
+			sp_gene for species_group in full_og_dict if species_group != 'Hom.sap'
+			for sp_gene in full_og_dict[species_group]]
+		if human_genes and candidates:
+			# The candidates are in species group order, so each species is a slice of the identities
+			identity = codon_identity_to_humans(candidates, human_genes)
+			first_candidate = 0
+			for species_group in full_og_dict:
+				if species_group == 'Hom.sap':
+					representative_og_dict['Hom.sap'] = human_genes
+					continue
+				species_genelist = full_og_dict[species_group]
+				species_identity = identity[first_candidate:first_candidate + len(species_genelist)]
+				first_candidate += len(species_genelist)
+				# max() returns the first of the best candidates
+				best = max(
+					range(len(species_genelist)),
+					key=lambda i: (species_identity[i], -species_genelist[i].seq.count(b'?')))
+				representative_og_dict[species_genelist[best].id] = species_genelist[best]
+			return representative_og_dict
 	for species_group in full_og_dict:
 		if species_group == 'Hom.sap': #look up reference gene-protein ID EDIT 12 feb 2024 to longer species name convention
 			# Edit 2024-02-18: Keep all human genes that were identified in the CSV
@@ -114,7 +194,7 @@ def pick_representative_ortholog(full_og_dict, og_ID, og_human_lookup):
 			seq_name_gap_count = []
 			for sp_gene in species_genelist:
 				seq_name = sp_gene.id
-				gap_count = sp_gene.seq.count('?')
+				gap_count = sp_gene.seq.count(b'?')
 				seq_name_gap_count.append((seq_name, gap_count))
 			seq_name_gap_count.sort(key=lambda x: x[1], reverse=False) #sort from low gap to high gap count
 			representative_seq_id = seq_name_gap_count[0][0] #pick first pair and first member of the pair
@@ -126,103 +206,308 @@ def pick_representative_ortholog(full_og_dict, og_ID, og_human_lookup):
 	return representative_og_dict
 
 
-def column_filter(repr_dict, max_prop_gap=0.5):
-	"""Apply a column-wise gapping filter to a dictionary of aligned nucleotide
-	sequences. Columns with more than 'max_prop_gap' gap characters will be
-	trimmed."""
-	# Start to unpack the dictionary of represenatative sequences. The nonhuman
-	# sequences are SeqRecord objects and the human sequences are stored as a list.
-	sequence_matrix = dict()
+def stream_representative_orthologs(og_fasta, og_human_lookup):
+	"""Do the same selection as generate_fasta_dictionary() followed by pick_representative_ortholog(),
+	in one pass over the FASTA records. Only the best sequence so far of each species and the human
+	sequences in the CSV are held in memory, rather than every record of the orthogroup, so the memory
+	use grows with the number of species rather than the number of sequences. Returns the same
+	dictionary as pick_representative_ortholog().
+	The ties are broken the same way: the representative of a species is the first sequence with the
+	fewest gaps, and if a later sequence has the same name as the representative, that later record is
+	the one that is kept (because pick_representative_ortholog() looks the representative up by name)."""
+	# Species code -> [fewest gap count, name of the best sequence, record to keep], or a list of
+	# human records for 'Hom.sap'. Species are kept in the order that they first appear.
+	species_best = dict()
+	for og_seq in read_fasta(og_fasta):
+		species_group = og_seq.id[0:7]
+		if species_group == 'Hom.sap':
+			human_genes = species_best.setdefault('Hom.sap', [])
+			if og_seq.id[8:] in og_human_lookup:
+				human_genes.append(og_seq)
+			continue
+		gap_count = og_seq.seq.count(b'?')
+		best = species_best.get(species_group)
+		if best is None:
+			species_best[species_group] = [gap_count, og_seq.id, og_seq]
+		elif og_seq.id == best[1]:
+			# Same name as the current representative: the later record is the one that is kept
+			best[0] = min(best[0], gap_count)
+			best[2] = og_seq
+		elif gap_count < best[0]:
+			species_best[species_group] = [gap_count, og_seq.id, og_seq]
+	representative_og_dict = dict()
+	for species_group, best in species_best.items():
+		if species_group == 'Hom.sap':
+			representative_og_dict['Hom.sap'] = best
+		else:
+			representative_og_dict[best[1]] = best[2]
+	return representative_og_dict
+
+
+def sequence_matrix(repr_dict):
+	"""Unpack the dictionary of representative sequences into a list of
+	sequence names and a 2-D uint8 NumPy array with one row per sequence. The
+	nonhuman sequences are FastaRecord tuples and the human sequences are
+	stored as a list."""
+	seqs = dict()
 	for sp in repr_dict:
 		if sp == 'Hom.sap':
 			for prot in repr_dict[sp]:
-				sequence_matrix[prot.id] = str(prot.seq)
+				seqs[prot.id] = prot.seq
 		else:
-			sequence_matrix[sp] = str(repr_dict[sp].seq)
-	# Now we have a dictionary of strings, where the key is the sequence name
-	# (which includes genus, species, and NCBI protein ID) and the value is the
-	# nucleotide sequence. We now have to apply the column-wise filter.
-	# Let's start the filtering procedure by "transposing" the sequence matrix so
-	# we can iterate over columns, rather than rows.
-	t_seq_matrix = zip(*sequence_matrix.values())
-	# Then, let's make a list of alignment columns that pass our gapping filter. We
-	# will do this by iterating over the transposed sequence matrix and keeping a record
-	# of column numbers that pass.
-	keep_columns = []
-	for col_number, aln_column in enumerate(t_seq_matrix):
-		# Calculate the number of gaps (? characters)
-		gap_count = aln_column.count('?')
-		gap_prop = gap_count / len(aln_column)
-		if gap_prop <= max_prop_gap:
-			keep_columns.append(col_number)
-	# Then, start a new dictionary for the filtered alignment. Keep only the columns
-	# that passed our filter in the previous block of statements. We will refer to the
-	# un-transposed alignment matrix now.
-	filtered_seq_matrix = dict()
-	for sequence in sequence_matrix:
-		# Filter the aligned nucleotide row based on the columns that passed the gap filter.
-		flt_row = ''
-		for col_number, nucleotide in enumerate(sequence_matrix[sequence]):
-			if col_number in keep_columns:
-				flt_row += nucleotide
-		# Push the filtered sequence into the new dictionary
-		filtered_seq_matrix[sequence] = flt_row
-	# Return the filtered alignment dictionary
-	return filtered_seq_matrix
-
-
-def mask_stop_codons(og_seq_dictionary):
+			seqs[sp] = repr_dict[sp].seq
+	names = list(seqs)
+	rows = list(seqs.values())
+	# The rows of an alignment are all the same length. If they are not, only
+	# the columns that every row has are kept (like zip() does).
+	aln_len = min(len(row) for row in rows) if rows else 0
+	matrix = np.empty((len(rows), aln_len), dtype=np.uint8)
+	for row_number, row in enumerate(rows):
+		matrix[row_number] = np.frombuffer(row, dtype=np.uint8, count=aln_len)
+	return names, matrix
+
+
+def column_filter(repr_dict, max_prop_gap=0.5):
+	"""Apply a column-wise gapping filter to a dictionary of aligned nucleotide
+	sequences. Columns with more than 'max_prop_gap' gap characters will be
+	trimmed. Returns the list of sequence names, the filtered alignment as a
+	2-D uint8 array (one row per name), and the gap proportion of every column
+	of the unfiltered alignment. The gap proportions can be used to try other
+	thresholds without counting the gaps again, e.g.,
+		matrix[:, gap_props <= 0.3]"""
+	# Hold the alignment as a 2-D array, rather than transposing a
+	# dictionary of strings and testing every nucleotide against a list of
+	# passing columns.
+	names, matrix = sequence_matrix(repr_dict)
+	# Gap proportion of every column, in one pass over the array
+	gap_props = column_gap_proportions(matrix)
+	# Keep only the columns that pass the filter
+	filtered_matrix = matrix[:, gap_props <= max_prop_gap]
+	return names, filtered_matrix, gap_props
+
+
+# The mammalian STOP codons, packed into one integer each (see pack_codon_bytes())
+STOP_CODONS = [b'TAA', b'TAG', b'TGA']
+
+
+def pack_codon_bytes(codons):
+	"""Pack a (..., 3) uint8 array of codons into one integer per codon, from
+	the byte values of the three nucleotides. Unlike Codon_Tools.pack_codons(),
+	this keeps upper and lower case distinct, so it matches the exact codon
+	strings."""
+	codons = codons.astype(np.uint32)
+	return (codons[..., 0] << 16) | (codons[..., 1] << 8) | codons[..., 2]
+
+
+STOP_CODONS_PACKED = pack_codon_bytes(np.frombuffer(b''.join(STOP_CODONS), dtype=np.uint8).reshape(len(STOP_CODONS), 3))
+
+
+def mask_stop_codons(aln_matrix):
 	"""Screen for in-frame STOP codons and replace them with ambiguity codes
 	('???'). We need this function because NCBI sometimes serves CDS reference
-	sequences with internal STOP codons."""
-	# Define the set of mammalian STOP codons
-	stop_codons = set(['TAA', 'TAG', 'TGA'])
-	masked_sequences = dict()
-	# Iterate through each sequence
-	for sequence in og_seq_dictionary:
-		# Start an entry in the masked sequence dictionary
-		masked_sequences[sequence] = ''
-		# Then, iterate through the nucleotides in each sequence
-		#	Annotation for the following statements:
-		#		Iterate over the nucleotides with a counter starting at 1 (instead of 0) 
-		#		If the counter, when divided by 3 has a remainder of 0 (i.e., we are on a multiple of 3)
-		#				N.B.: This is called the "modulus" operator. X % Y = "X modulus Y" = "remainder when X is divided by Y"
-		#			Then, take the current nucleotide and the two before the current and treat them as a codon
-		#			If the codon is in the set of STOP codons, replace them with '???'
-		#			Else, leave them as-is
-		#			Put the codon onto the end of a growing string that holds the masked sequence
-		#		Return the masked sequences
-		for nuc_index, base in enumerate(og_seq_dictionary[sequence], start=1):
-			if nuc_index % 3 == 0:
-				codon = og_seq_dictionary[sequence][nuc_index-3:nuc_index]
-				if codon in stop_codons:
-					masked_sequences[sequence] += '???'
-				else:
-					masked_sequences[sequence] += codon
-	return masked_sequences
-
-
-
-
-def print_best_orthologs(dict_of_representative_orthologs):
-	"""print a fasta file to standard output"""
-	for sequence in dict_of_representative_orthologs:
-		print('>' + sequence)
-		print(dict_of_representative_orthologs[sequence])
-
-def main(og_file, cyp_protein_orthogroup_table):
+	sequences with internal STOP codons. 'aln_matrix' is the 2-D uint8 array
+	of aligned nucleotides from column_filter(); it is masked in place.
+	Returns the masked matrix, the number of STOP codons that were masked in
+	each sequence, and the number of those that were internal (i.e., not the
+	last codon of the sequence that is not a gap)."""
+	n_seqs, aln_len = aln_matrix.shape
+	# Only whole codons are kept; a partial codon at the end is dropped.
+	n_codons = aln_len // 3
+	if n_codons * 3 != aln_len or not aln_matrix.flags['C_CONTIGUOUS']:
+		aln_matrix = np.ascontiguousarray(aln_matrix[:, 0:n_codons * 3])
+	# View the alignment as (sequences, codons, 3 nucleotides). This is a view
+	# of the same memory, so masking the codons masks the alignment.
+	codons = aln_matrix.reshape(n_seqs, n_codons, 3)
+	is_stop = np.isin(pack_codon_bytes(codons), STOP_CODONS_PACKED)
+	codons[is_stop] = GAP_CHAR
+	stop_counts = np.count_nonzero(is_stop, axis=1)
+	# Find the last codon in each sequence that is not all gaps, to tell the
+	# terminal STOP codon apart from internal ones.
+	not_gap = ~(codons == GAP_CHAR).all(axis=2) | is_stop
+	has_codons = not_gap.any(axis=1)
+	last_codon = n_codons - 1 - np.argmax(not_gap[:, ::-1], axis=1) if n_codons else np.zeros(n_seqs, dtype=np.int64)
+	terminal_stop = has_codons & is_stop[np.arange(n_seqs), last_codon] if n_codons else np.zeros(n_seqs, dtype=bool)
+	internal_stop_counts = stop_counts - terminal_stop
+	return aln_matrix, stop_counts, internal_stop_counts
+
+
+def print_best_orthologs(dict_of_representative_orthologs, out_handle=sys.stdout):
+	"""print a fasta file to standard output (or to another open file handle)"""
+	write_fasta(
+		((sequence, sequence, dict_of_representative_orthologs[sequence]) for sequence in dict_of_representative_orthologs),
+		out_handle, line_width=None)
+
+def choose_representatives(og_fasta, og_ID, og_human_lookup, out_handle=sys.stdout, trim_method='gap', selection='length'):
+	"""Run the selection procedure described in the module doc string on one backtranslated
+	orthogroup (a FASTA path or an open handle), and write the result as FASTA to 'out_handle'.
+	Representatives are picked with 'selection' (see pick_representative_ortholog()) and columns
+	are trimmed with 'trim_method' (see Alignment_Trimming.py). Returns one STOP codon report row
+	(see STOP_REPORT_HEADER) per sequence that was written, and the trim report row of the
+	orthogroup."""
+	if selection == 'identity':
+		# Identity to the human sequences needs every candidate at once
+		og_species_dict = generate_fasta_dictionary(og_fasta) #pseudocode step 1
+		og_rep_per_species = pick_representative_ortholog(og_species_dict, og_ID, og_human_lookup, selection) # pseudocode actions for step 2
+	else:
+		# 2026-10-16: Steps 1 and 2 are done in one streaming pass over the records, which picks the same
+		# sequences as generate_fasta_dictionary() and pick_representative_ortholog().
+		og_rep_per_species = stream_representative_orthologs(og_fasta, og_human_lookup)
+	# 2026-10-16: Trim the columns with the chosen method. The 'gap' method is the same as
+	# column_filter().
+	seq_names, og_matrix = sequence_matrix(og_rep_per_species)
+	keep_columns = trim_columns(og_matrix, trim_method)
+	trim_row = trim_report_row(og_ID, trim_method, og_matrix, keep_columns)
+	og_col_filtered_matrix = og_matrix[:, keep_columns]
+	# 2024-03-17: Make a new function that screens for in-frame STOP codons and replaces them with '???'
+	og_col_stop_filtered_matrix, stop_counts, internal_stop_counts = mask_stop_codons(og_col_filtered_matrix)
+	og_col_stop_filtered = dict(zip(seq_names, (row.tobytes().decode('ascii') for row in og_col_stop_filtered_matrix)))
+	print_best_orthologs(og_col_stop_filtered, out_handle)
+	n_codons = og_col_stop_filtered_matrix.shape[1] // 3
+	stop_rows = [
+		[og_ID, seq_name, str(n_codons), str(stop_counts[row]), str(internal_stop_counts[row])]
+		for row, seq_name in enumerate(seq_names)]
+	return stop_rows, trim_row
+
+
+# Columns of the STOP codon report. Keeping the reports of each run makes it
+# possible to track CDS records that have internal STOP codons run after run.
+STOP_REPORT_HEADER = ['Orthogroup', 'Sequence_ID', 'Codons', 'Stop_Codons_Masked', 'Internal_Stop_Codons']
+
+
+def write_stop_report(stop_rows, report_handle):
+	"""Write STOP codon report rows, with a header, to an open handle."""
+	report_handle.write('\t'.join(STOP_REPORT_HEADER) + '\n')
+	for stop_row in stop_rows:
+		report_handle.write('\t'.join(stop_row) + '\n')
+
+
+# Columns of the per-orthogroup summary table of batch mode
+SUMMARY_HEADER = [
+	'Orthogroup', 'Sequences_Kept', 'Human_Sequences_Kept', 'Columns_Before', 'Columns_Trimmed',
+	'Columns_After', 'Stop_Codons_Masked', 'Internal_Stop_Codons']
+
+
+def summary_row(stop_rows, trim_row):
+	"""Summarize one orthogroup from its STOP codon report rows and trim report row."""
+	n_human = sum(1 for stop_row in stop_rows if stop_row[1].startswith('Hom.sap'))
+	n_stops = sum(int(stop_row[3]) for stop_row in stop_rows)
+	n_internal = sum(int(stop_row[4]) for stop_row in stop_rows)
+	return [trim_row[0], str(len(stop_rows)), str(n_human), trim_row[3], trim_row[5], trim_row[4], str(n_stops), str(n_internal)]
+
+
+# The human protein lookup of a batch worker process. It is set once per worker by
+# set_worker_lookup(), rather than being sent along with every orthogroup.
+WORKER_LOOKUP = dict()
+
+
+def set_worker_lookup(og_human_lookup):
+	"""Initialize a batch worker process with the human protein lookup."""
+	global WORKER_LOOKUP
+	WORKER_LOOKUP = og_human_lookup
+
+
+def choose_to_file(og_file, out_dir, trim_method, selection):
+	"""Run the selection procedure on one orthogroup in batch mode, and write
+	OGXXXXX_RepOrthologues.fa to the output directory. Returns the STOP codon report
+	rows and the trim report row."""
+	og_ID = get_orthogroupID(og_file)
+	with open(os.path.join(out_dir, og_ID + '_RepOrthologues.fa'), 'wt') as out_handle:
+		return choose_representatives(og_file, og_ID, WORKER_LOOKUP, out_handle, trim_method, selection)
+
+
+def is_fasta_file(path):
+	"""Return True if 'path' is a FASTA file (rather than a directory, or a manifest of paths)."""
+	if not os.path.isfile(path):
+		return False
+	with open_compressed(path, 'rt') as f:
+		for line in f:
+			if line.strip():
+				return line.startswith('>')
+	return True
+
+
+def main_batch(og_source, cyp_protein_orthogroup_table, out_dir, trim_method='gap', selection='length', n_workers=None):
+	"""Batch mode: run the selection procedure on every backtranslated orthogroup in a
+	directory (or listed in a manifest file), with the human protein lookup built once and the
+	orthogroups spread over a pool of worker processes. Writes OGXXXXX_RepOrthologues.fa for
+	each orthogroup, and the STOP codon report, trim report, and a summary table for all of the
+	orthogroups, to the output directory."""
+	# These are only needed in batch mode, so they are imported here
+	import concurrent.futures
+	from Backtranslate_AA_aligned import list_alignments
+	from Prepare_PAML_Sequences_Parallel import available_cpus
+	og_files = list_alignments(og_source)
+	os.makedirs(out_dir, exist_ok=True)
+	og_human_lookup = generate_gene_lookup(cyp_protein_orthogroup_table)
+	if n_workers is None:
+		n_workers = available_cpus()
+	n_workers = max(1, min(n_workers, len(og_files)))
+	with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers, initializer=set_worker_lookup, initargs=(og_human_lookup,)) as pool:
+		results = list(pool.map(
+			choose_to_file, og_files, [out_dir] * len(og_files), [trim_method] * len(og_files), [selection] * len(og_files)))
+	# Write the tables in orthogroup order
+	results.sort(key=lambda result: result[1][0])
+	with open(os.path.join(out_dir, 'Stop_Codon_Report.tsv'), 'wt') as report_handle:
+		write_stop_report([stop_row for stop_rows, trim_row in results for stop_row in stop_rows], report_handle)
+	with open(os.path.join(out_dir, 'Trim_Report.tsv'), 'wt') as report_handle:
+		write_trim_report([trim_row for stop_rows, trim_row in results], report_handle)
+	with open(os.path.join(out_dir, 'Representative_Selection_Summary.tsv'), 'wt') as report_handle:
+		report_handle.write('\t'.join(SUMMARY_HEADER) + '\n')
+		for stop_rows, trim_row in results:
+			report_handle.write('\t'.join(summary_row(stop_rows, trim_row)) + '\n')
+
+
+def main(og_file, cyp_protein_orthogroup_table, stop_report=None, trim_method='gap', trim_report=None, selection='length'):
 	"""function doc string: highlevel function that will carry out the steps of the algorithm described 
 	in the module doc string above. The main function is pretty short and calls other functions defined
 	in the script. What is happening in this script can be seen in main"""
 	#read the orthogroup alignment into memory. Stored as as dictionary.
 	og_ID = get_orthogroupID(og_file) # function to extract orthogroup id from the input fasta file name:
 	og_human_lookup = generate_gene_lookup(cyp_protein_orthogroup_table)
-	og_species_dict = generate_fasta_dictionary(og_file) #pseudocode step 1
-	og_rep_per_species = pick_representative_ortholog(og_species_dict, og_ID, og_human_lookup) # pseudocode actions for step 2
-	og_col_filtered = column_filter(og_rep_per_species)
-	# 2024-03-17: Make a new function that screens for in-frame STOP codons and replaces them with '???'
-	og_col_stop_filtered = mask_stop_codons(og_col_filtered)
-	print_best_orthologs(og_col_stop_filtered)
+	stop_rows, trim_row = choose_representatives(og_file, og_ID, og_human_lookup, sys.stdout, trim_method, selection)
+	if stop_report is not None:
+		with open(stop_report, 'wt') as report_handle:
+			write_stop_report(stop_rows, report_handle)
+	if trim_report is not None:
+		with open(trim_report, 'wt') as report_handle:
+			write_trim_report([trim_row], report_handle)
 
 
-main(og_fa_in, cyp_protid_og_csv)
+if __name__ == '__main__':
+	try:
+		og_fa_in = sys.argv[1]
+		cyp_protid_og_csv = sys.argv[2]
+	except IndexError:
+		sys.stderr.write(__doc__+ '\n')
+		sys.exit(1)
+	if not is_fasta_file(og_fa_in):
+		# Batch mode: a directory or manifest of orthogroups, and an output directory
+		if len(sys.argv) < 4:
+			sys.stderr.write(__doc__+ '\n')
+			sys.exit(1)
+		trim_method_in = sys.argv[4] if len(sys.argv) > 4 else 'gap'
+		if trim_method_in not in TRIM_METHODS:
+			sys.stderr.write('The trimming method should be one of: ' + ', '.join(TRIM_METHODS) + '\n')
+			sys.exit(1)
+		selection_in = sys.argv[5] if len(sys.argv) > 5 else 'length'
+		if selection_in not in SELECTION_MODES:
+			sys.stderr.write('The selection mode should be one of: ' + ', '.join(SELECTION_MODES) + '\n')
+			sys.exit(1)
+		try:
+			workers = int(sys.argv[6]) if len(sys.argv) > 6 else None
+		except ValueError:
+			sys.stderr.write('The number of workers should be an integer.\n')
+			sys.exit(1)
+		main_batch(og_fa_in, cyp_protid_og_csv, sys.argv[3], trim_method_in, selection_in, workers)
+		sys.exit(0)
+	stop_report_out = sys.argv[3] if len(sys.argv) > 3 and sys.argv[3] != '-' else None
+	trim_method_in = sys.argv[4] if len(sys.argv) > 4 else 'gap'
+	if trim_method_in not in TRIM_METHODS:
+		sys.stderr.write('The trimming method should be one of: ' + ', '.join(TRIM_METHODS) + '\n')
+		sys.exit(1)
+	trim_report_out = sys.argv[5] if len(sys.argv) > 5 and sys.argv[5] != '-' else None
+	selection_in = sys.argv[6] if len(sys.argv) > 6 else 'length'
+	if selection_in not in SELECTION_MODES:
+		sys.stderr.write('The selection mode should be one of: ' + ', '.join(SELECTION_MODES) + '\n')
+		sys.exit(1)
+	main(og_fa_in, cyp_protid_og_csv, stop_report_out, trim_method_in, trim_report_out, selection_in)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+"""
+Codon lookup tables for working on nucleotide sequences that are stored as
+NumPy uint8 arrays, with one codon per row of a (..., 3) view. Requires NumPy.
+
+Each codon is packed into a single integer (0-63) from its three bases, so
+that translating or screening codons is a single table lookup for the whole
+array rather than a Python loop. Codons with any base that is not A, C, G, or
+T (e.g., 'N', '?', '-') are packed as AMBIGUOUS_CODON (64).
+
+Full nucleotide sequences are translated through a second, larger table that
+also covers the IUPAC ambiguity codes, with the same results as Biopython's
+Seq.translate(table=1).
+
+This is meant to be imported by the other pipeline scripts, e.g.,
+
+    from Codon_Tools import translate_codons
+"""
+
+import numpy as np
+
+# NCBI translation table 1 (the standard genetic code), written in the same
+# order that NCBI uses: the bases of each codon run through T, C, A, G, with
+# the first base changing slowest.
+NCBI_BASE_ORDER = 'TCAG'
+STANDARD_CODE = 'FFLLSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG'
+
+# The packed value of a codon that has a base other than A, C, G, or T
+AMBIGUOUS_CODON = 64
+
+# Lookup from the byte value of a nucleotide to its 2-bit code. Anything that
+# is not an unambiguous base is 4. Lower case bases are treated the same as
+# upper case bases.
+BASE_CODES = np.full(256, 4, dtype=np.uint8)
+for code, base in enumerate(NCBI_BASE_ORDER):
+    BASE_CODES[ord(base)] = code
+    BASE_CODES[ord(base.lower())] = code
+BASE_CODES[ord('U')] = BASE_CODES[ord('T')]
+BASE_CODES[ord('u')] = BASE_CODES[ord('T')]
+
+# Lookup from a packed codon to the byte value of its amino acid. Ambiguous
+# codons translate to 'X'.
+AA_TABLE = np.frombuffer((STANDARD_CODE + 'X').encode('ascii'), dtype=np.uint8).copy()
+
+
+def pack_codon(codon):
+    """Return the packed integer value of a single codon string."""
+    if len(codon) != 3:
+        return AMBIGUOUS_CODON
+    codes = [int(BASE_CODES[ord(base)]) for base in codon]
+    if max(codes) > 3:
+        return AMBIGUOUS_CODON
+    return codes[0] * 16 + codes[1] * 4 + codes[2]
+
+
+def pack_codons(codon_array):
+    """Pack a (..., 3) uint8 array of codons into an array of integers in
+    0-64, with one value per codon."""
+    codes = BASE_CODES[codon_array]
+    packed = codes[..., 0].astype(np.int16) * 16 + codes[..., 1] * 4 + codes[..., 2]
+    # Any ambiguous base makes the whole codon ambiguous.
+    packed[(codes > 3).any(axis=-1)] = AMBIGUOUS_CODON
+    return packed
+
+
+def translate_codons(codon_array):
+    """Translate a (..., 3) uint8 array of codons into a uint8 array of amino
+    acid byte values with the standard genetic code. Stops are '*', and codons
+    with ambiguous bases are 'X'."""
+    return AA_TABLE[pack_codons(codon_array)]
+
+
+# IUPAC nucleotide codes, as the set of bases that each one can stand for.
+IUPAC_BASES = {
+    'A': 'A', 'C': 'C', 'G': 'G', 'T': 'T', 'U': 'T',
+    'R': 'AG', 'Y': 'CT', 'S': 'CG', 'W': 'AT', 'K': 'GT', 'M': 'AC',
+    'B': 'CGT', 'D': 'AGT', 'H': 'ACT', 'V': 'ACG', 'N': 'ACGT'}
+# Amino acid codes for a codon that can stand for exactly these two amino acids
+AMBIGUOUS_AA = {
+    frozenset('DN'): 'B',
+    frozenset('EQ'): 'Z',
+    frozenset('IL'): 'J'}
+# Each nucleotide byte gets a 5-bit code: 0-14 for the IUPAC codes (in the
+# order of IUPAC_SYMBOLS), 15 for a gap, and 16 for anything else.
+IUPAC_SYMBOLS = 'ACGTRYSWKMBDHVN'
+GAP_CODE = 15
+INVALID_CODE = 16
+IUPAC_CODES = np.full(256, INVALID_CODE, dtype=np.uint16)
+for code, symbol in enumerate(IUPAC_SYMBOLS):
+    IUPAC_CODES[ord(symbol)] = code
+    IUPAC_CODES[ord(symbol.lower())] = code
+IUPAC_CODES[ord('U')] = IUPAC_CODES[ord('T')]
+IUPAC_CODES[ord('u')] = IUPAC_CODES[ord('T')]
+IUPAC_CODES[ord('-')] = GAP_CODE
+
+
+def resolve_codon(codon):
+    """Return the amino acid for a codon string that may have IUPAC ambiguity
+    codes. This follows Biopython: if every codon the ambiguous codon could
+    stand for gives the same amino acid (or every one is a stop), use it; if
+    they give D/N, E/Q, or I/L, use B, Z, or J; if they are a mix of stops and
+    amino acids, or anything else, use X. A codon that is all gaps is a gap."""
+    if codon == '---':
+        return '-'
+    if any(base not in IUPAC_BASES for base in codon):
+        return 'X'
+    amino_acids = set()
+    for b1 in IUPAC_BASES[codon[0]]:
+        for b2 in IUPAC_BASES[codon[1]]:
+            for b3 in IUPAC_BASES[codon[2]]:
+                amino_acids.add(STANDARD_CODE[pack_codon(b1 + b2 + b3)])
+    if len(amino_acids) == 1:
+        return amino_acids.pop()
+    return AMBIGUOUS_AA.get(frozenset(amino_acids), 'X')
+
+
+def build_iupac_table():
+    """Build the lookup from a packed IUPAC codon (three 5-bit codes) to the
+    byte value of its amino acid."""
+    symbols = list(IUPAC_SYMBOLS) + ['-', '?']
+    table = np.full(32 * 32 * 32, ord('X'), dtype=np.uint8)
+    for c1, s1 in enumerate(symbols):
+        for c2, s2 in enumerate(symbols):
+            for c3, s3 in enumerate(symbols):
+                table[c1 * 1024 + c2 * 32 + c3] = ord(resolve_codon(s1 + s2 + s3))
+    return table
+
+
+IUPAC_AA_TABLE = build_iupac_table()
+
+
+def translate_nucleotides(nuc_seq):
+    """Translate a nucleotide sequence (bytes) to amino acids (bytes) with the
+    standard genetic code. A partial codon at the end is left off, like
+    Biopython does. The sequence is viewed as a (n_codons, 3) array and every
+    codon is translated with one table lookup."""
+    n_codons = len(nuc_seq) // 3
+    codons = IUPAC_CODES[np.frombuffer(nuc_seq, dtype=np.uint8, count=n_codons * 3).reshape(n_codons, 3)]
+    return IUPAC_AA_TABLE[codons[:, 0] * 1024 + codons[:, 1] * 32 + codons[:, 2]].tobytes()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Compare the target orthogroups of two Orthofinder runs of the same cohort,
+e.g., the nucleotide BLAST search (-S blast_nucl) against the protein DIAMOND
+search on translated CDS (see Translate_Cohort_CDS.py). For every human CYP of
+interest, the members of the orthogroup that holds it in each run are
+compared, and a TSV row is written with the orthogroup IDs, the number of
+shared members, the members found in only one of the runs, and the Jaccard
+index of the two member sets. Orthogroup IDs are not comparable between runs,
+so the orthogroups are matched through the CYP that they hold.
+
+A summary (how many CYPs have identical orthogroup members in both runs, and
+the mean Jaccard index) is written to standard error.
+
+Takes three arguments:
+    1) Orthogroups.tsv of the baseline run (e.g., blast_nucl)
+    2) Orthogroups.tsv of the alternative run (e.g., DIAMOND)
+    3) CSV of CYPs to keep (CYP name, NCBI protein ID; with a header)
+
+Usage:
+
+python /path/to/Compare_Orthogroup_Runs.py Baseline_Orthogroups.tsv Alternative_Orthogroups.tsv CYP_CSV > Orthogroup_Concordance_Report.tsv
+"""
+
+import sys
+
+from Orthogroup_Index import open_og_index, accession_orthogroups, orthogroup_members
+
+# Columns of the concordance report
+CONCORDANCE_HEADER = [
+    'CYP_Name', 'Protein_ID', 'Baseline_Orthogroup', 'Alternative_Orthogroup',
+    'Baseline_Members', 'Alternative_Members', 'Shared_Members', 'Jaccard',
+    'Only_Baseline', 'Only_Alternative']
+
+
+def read_cyp_table(cyp_csv):
+    """Return a list of (CYP name, NCBI protein ID) tuples from the CYP CSV, in
+    file order (the first line is a header)."""
+    cyps = []
+    with open(cyp_csv, 'rt') as f:
+        for line_number, line in enumerate(f):
+            if line_number == 0 or not line.strip():
+                continue
+            cyp_name, prot_id = line.strip().split(',')[0:2]
+            cyps.append((cyp_name, prot_id))
+    return cyps
+
+
+def target_members(og_index, prot_ids):
+    """Return the orthogroup of each CYP protein and the member sets of those
+    orthogroups, as two dictionaries."""
+    cyp_ogs = accession_orthogroups(og_index, prot_ids)
+    members = dict()
+    for og_id in set(cyp_ogs.values()):
+        members[og_id] = set(prot_id for prot_id, sp_name in orthogroup_members(og_index, og_id))
+    return cyp_ogs, members
+
+
+def concordance_rows(cyps, baseline, alternative):
+    """Compare the target orthogroups of two runs. 'baseline' and
+    'alternative' are the (orthogroup, members) dictionaries of
+    target_members(). Returns the report rows and the Jaccard index of every
+    CYP that is in an orthogroup in either run."""
+    base_ogs, base_members = baseline
+    alt_ogs, alt_members = alternative
+    rows = []
+    jaccards = []
+    for cyp_name, prot_id in cyps:
+        base_og = base_ogs.get(prot_id)
+        alt_og = alt_ogs.get(prot_id)
+        base_set = base_members.get(base_og, set())
+        alt_set = alt_members.get(alt_og, set())
+        union = base_set | alt_set
+        shared = base_set & alt_set
+        if union:
+            jaccard = len(shared) / len(union)
+            jaccards.append(jaccard)
+            jaccard_str = '{:.3f}'.format(jaccard)
+        else:
+            jaccard_str = 'NA'
+        rows.append([
+            cyp_name, prot_id, base_og or 'NA', alt_og or 'NA',
+            str(len(base_set)), str(len(alt_set)), str(len(shared)), jaccard_str,
+            ','.join(sorted(base_set - alt_set)), ','.join(sorted(alt_set - base_set))])
+    return rows, jaccards
+
+
+def main(baseline_tsv, alternative_tsv, cyp_csv):
+    """Main function."""
+    cyps = read_cyp_table(cyp_csv)
+    prot_ids = [prot_id for cyp_name, prot_id in cyps]
+    runs = []
+    for og_tsv in (baseline_tsv, alternative_tsv):
+        og_index = open_og_index(og_tsv)
+        runs.append(target_members(og_index, prot_ids))
+        og_index.close()
+    rows, jaccards = concordance_rows(cyps, runs[0], runs[1])
+    print('\t'.join(CONCORDANCE_HEADER))
+    for row in rows:
+        print('\t'.join(row))
+    identical = sum(1 for jaccard in jaccards if jaccard == 1)
+    mean_jaccard = sum(jaccards) / len(jaccards) if jaccards else 0.0
+    sys.stderr.write(
+        str(identical) + ' of ' + str(len(jaccards)) + ' CYPs have the same orthogroup members in both runs; mean Jaccard index '
+        + '{:.3f}'.format(mean_jaccard) + '.\n')
+    return
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 4:
+        sys.stderr.write(__doc__ + '\n')
+        sys.exit(1)
+    main(sys.argv[1], sys.argv[2], sys.argv[3])
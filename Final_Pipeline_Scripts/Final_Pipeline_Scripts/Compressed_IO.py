@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+"""
+Read gzip-, BGZF-, and zstd-compressed input files as if they were plain
+files. The archived Orthofinder runs and NCBI CDS downloads are kept
+compressed to save quota, so the readers in the other pipeline scripts open
+their inputs through open_compressed(), which looks at the first bytes of the
+file (not the file name) and stream-decompresses it. Plain files are opened
+as usual.
+
+Sequences are fetched out of CDS files by their offset (see Fasta_Index.py),
+which needs random access. A gzip file can only be read from the start, but a
+BGZF file (written by 'bgzip', which is also valid gzip) is a series of small,
+independently compressed blocks. Its '.gzi' index, which 'bgzip -i' or
+'samtools faidx' write, gives the compressed and uncompressed offset of every
+block, so any part of the file can be read by decompressing only the blocks
+that hold it. BgzfReader does this; the '.gzi' index is built by scanning the
+block headers if it is missing.
+
+Reading zstd files needs the 'zstandard' package, which is only imported the
+first time that a zstd file is opened. A zstd file can hold more than one
+frame (e.g., from 'pzstd', 'zstd -T' on long inputs, or concatenated files),
+and every frame is read.
+
+This is meant to be imported by the other pipeline scripts, e.g.,
+
+    from Compressed_IO import open_compressed
+    with open_compressed('/path/to/Orthogroups.tsv.gz', 'rt') as f:
+        ...
+
+It can also be run on its own to build the '.gzi' index for one or more BGZF
+files ahead of time:
+
+python /path/to/Compressed_IO.py /path/to/species1.fasta.gz [/path/to/species2.fasta.gz ...]
+
+or to check that multi-member gzip and multi-frame zstd files are read to the
+end (the zstd check needs the 'zstandard' package):
+
+python /path/to/Compressed_IO.py --check
+"""
+
+import sys
+import os
+import io
+import gzip
+import zlib
+import mmap
+import struct
+import bisect
+
+# Magic numbers at the start of compressed files
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+# File name suffixes of compressed files. These are stripped before the file
+# name is checked for its '.fa' or '.fasta' extension.
+COMPRESSED_SUFFIXES = ('.gz', '.bgz', '.zst')
+# Size of the fixed part of the gzip header, before the extra field
+GZIP_HEADER_SIZE = 12
+# Size of the CRC32 and ISIZE fields at the end of each gzip member
+GZIP_FOOTER_SIZE = 8
+
+
+def detect_compression(path):
+    """Return the compression of a file from its first bytes: 'bgzf', 'gzip',
+    'zstd', or None for a plain file."""
+    with open(path, 'rb') as f:
+        header = f.read(GZIP_HEADER_SIZE + 4)
+    if header.startswith(ZSTD_MAGIC):
+        return 'zstd'
+    if not header.startswith(GZIP_MAGIC):
+        return None
+    # A BGZF block is a gzip member with the FEXTRA flag set and a 'BC'
+    # subfield (holding the block size) first in the extra field.
+    if len(header) == GZIP_HEADER_SIZE + 4 and header[3] & 4 and header[12:14] == b'BC':
+        return 'bgzf'
+    return 'gzip'
+
+
+def is_compressed(path):
+    """Return True if a file is gzip, BGZF, or zstd compressed."""
+    return detect_compression(path) is not None
+
+
+def strip_compression_suffix(fname):
+    """Remove a compression suffix (.gz, .bgz, or .zst) from a file name, e.g.,
+    Homo_sapiens.fasta.gz -> Homo_sapiens.fasta"""
+    for suffix in COMPRESSED_SUFFIXES:
+        if fname.endswith(suffix):
+            return fname[:-len(suffix)]
+    return fname
+
+
+def open_zstd(path):
+    """Open a zstd-compressed file for streaming, as a binary file object."""
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('Reading zstd-compressed files requires the zstandard package: ' + path)
+    # Without read_across_frames, the reader stops at the end of the first
+    # frame and the rest of a multi-frame file is silently lost.
+    reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True, closefd=True)
+    return io.BufferedReader(reader)
+
+
+def open_compressed(path, mode='rb'):
+    """Open a file for reading, stream-decompressing it if it is compressed
+    (see detect_compression()). 'mode' is 'rb' or 'rt'; text is read as
+    ASCII-compatible UTF-8, like open() does by default on Linux."""
+    compression = detect_compression(path)
+    if compression is None:
+        return open(path, mode)
+    if compression == 'zstd':
+        handle = open_zstd(path)
+    else:
+        # BGZF is a series of gzip members, so the gzip module reads it too
+        handle = gzip.open(path, 'rb')
+    if mode == 'rt':
+        return io.TextIOWrapper(handle, encoding='utf-8')
+    return handle
+
+
+def read_decompressed(path):
+    """Return the whole (decompressed) contents of a file as bytes."""
+    with open_compressed(path, 'rb') as f:
+        return f.read()
+
+
+def gzi_path(bgzf_path):
+    """Return the path to the '.gzi' index of a BGZF file. This follows the
+    htslib convention of appending '.gzi' to the file name."""
+    return bgzf_path + '.gzi'
+
+
+def read_gzi(gzi_file):
+    """Parse a '.gzi' index. The file is a little-endian uint64 count, then
+    that many (compressed offset, uncompressed offset) uint64 pairs, one for
+    the start of every block after the first. Returns the two lists of
+    offsets, including the first block at (0, 0)."""
+    with open(gzi_file, 'rb') as f:
+        data = f.read()
+    n_entries = struct.unpack_from('<Q', data, 0)[0]
+    offsets = struct.unpack_from('<' + str(2 * n_entries) + 'Q', data, 8)
+    return [0] + list(offsets[0::2]), [0] + list(offsets[1::2])
+
+
+def build_gzi(mapped):
+    """Scan the block headers of a memory-mapped BGZF file and return the
+    compressed and uncompressed start offsets of its blocks. Only the block
+    headers and footers are read; nothing is decompressed."""
+    block_starts = []
+    data_starts = []
+    block_start = 0
+    data_start = 0
+    while block_start < len(mapped):
+        xlen = struct.unpack_from('<H', mapped, block_start + 10)[0]
+        if mapped[block_start:block_start + 2] != GZIP_MAGIC or xlen < 6:
+            raise ValueError('Not a BGZF block at byte ' + str(block_start))
+        # BSIZE is the total block size minus 1
+        block_size = struct.unpack_from('<H', mapped, block_start + 16)[0] + 1
+        # ISIZE, the uncompressed size, is the last 4 bytes of the block
+        data_size = struct.unpack_from('<I', mapped, block_start + block_size - 4)[0]
+        block_starts.append(block_start)
+        data_starts.append(data_start)
+        block_start += block_size
+        data_start += data_size
+    return block_starts, data_starts
+
+
+def write_gzi(block_starts, data_starts, gzi_file):
+    """Write a '.gzi' index in the htslib format (see read_gzi())."""
+    pairs = []
+    for block_start, data_start in zip(block_starts[1:], data_starts[1:]):
+        pairs.extend([block_start, data_start])
+    with open(gzi_file, 'wb') as f:
+        f.write(struct.pack('<Q', len(pairs) // 2))
+        f.write(struct.pack('<' + str(len(pairs)) + 'Q', *pairs))
+    return
+
+
+def load_gzi(bgzf_path, mapped):
+    """Return the block offsets of a BGZF file. If there is an up-to-date
+    '.gzi' next to the file, read it. Otherwise, build it, and try to save it
+    alongside the file for next time."""
+    gzi_file = gzi_path(bgzf_path)
+    if os.path.isfile(gzi_file) and os.path.getmtime(gzi_file) >= os.path.getmtime(bgzf_path):
+        return read_gzi(gzi_file)
+    block_starts, data_starts = build_gzi(mapped)
+    # Write to a temporary name and then rename, so that several processes
+    # building the same index at once do not leave a half-written file.
+    tmp_gzi = gzi_file + '.' + str(os.getpid()) + '.tmp'
+    try:
+        write_gzi(block_starts, data_starts, tmp_gzi)
+        os.replace(tmp_gzi, gzi_file)
+    except (OSError, IOError):
+        sys.stderr.write('Could not write ' + gzi_file + '; keeping the index in memory only.\n')
+    return block_starts, data_starts
+
+
+class BgzfReader(object):
+    """Random access to the uncompressed contents of a BGZF file. Slicing a
+    BgzfReader with uncompressed offsets, e.g., reader[start:end], returns the
+    bytes, like slicing a memory-mapped plain file. Only the blocks that hold
+    the slice are decompressed, and the last block is kept, since sequences
+    that are fetched one after another are often in the same block."""
+
+    def __init__(self, bgzf_path):
+        with open(bgzf_path, 'rb') as f:
+            self.mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.block_starts, self.data_starts = load_gzi(bgzf_path, self.mapped)
+        self.cached_block = None
+        self.cached_data = b''
+
+    def read_block(self, block_number):
+        """Return the decompressed contents of one block."""
+        if block_number != self.cached_block:
+            block_start = self.block_starts[block_number]
+            xlen = struct.unpack_from('<H', self.mapped, block_start + 10)[0]
+            block_size = struct.unpack_from('<H', self.mapped, block_start + 16)[0] + 1
+            payload_start = block_start + GZIP_HEADER_SIZE + xlen
+            payload_end = block_start + block_size - GZIP_FOOTER_SIZE
+            self.cached_data = zlib.decompress(self.mapped[payload_start:payload_end], -15)
+            self.cached_block = block_number
+        return self.cached_data
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise TypeError('BgzfReader only supports slices with a step of 1')
+        start = key.start or 0
+        end = key.stop
+        chunks = []
+        block_number = max(0, bisect.bisect_right(self.data_starts, start) - 1)
+        while block_number < len(self.block_starts) and (end is None or self.data_starts[block_number] < end):
+            data = self.read_block(block_number)
+            block_offset = self.data_starts[block_number]
+            chunk_start = max(0, start - block_offset)
+            chunk_end = len(data) if end is None else min(len(data), end - block_offset)
+            if chunk_end > chunk_start:
+                chunks.append(data[chunk_start:chunk_end])
+            block_number += 1
+        return b''.join(chunks)
+
+
+def check_multi_frame(tmp_dir):
+    """Write a two-member gzip file and a two-frame zstd file to the temporary
+    directory and check that open_compressed() reads both parts of each.
+    Returns a list of (format, passed) tuples; zstd is left out if the
+    zstandard package is not installed."""
+    parts = [b'>seq1 first frame\nATGAAATAA\n', b'>seq2 second frame\nATGCCCTGA\n']
+    expected = b''.join(parts)
+    compressors = [('gzip', gzip.compress)]
+    try:
+        import zstandard
+        compressors.append(('zstd', lambda data: zstandard.ZstdCompressor().compress(data)))
+    except ImportError:
+        pass
+    results = []
+    for fmt, compress in compressors:
+        path = os.path.join(tmp_dir, 'multi_frame.' + fmt)
+        with open(path, 'wb') as f:
+            for part in parts:
+                f.write(compress(part))
+        with open_compressed(path, 'rb') as f:
+            results.append((fmt, f.read() == expected))
+    return results
+
+
+def main(bgzf_files):
+    """Main function. Build the '.gzi' index of each BGZF file given on the
+    command line."""
+    for bgzf_file in bgzf_files:
+        if detect_compression(bgzf_file) != 'bgzf':
+            sys.stderr.write(bgzf_file + ' is not BGZF-compressed; recompress it with bgzip for random access.\n')
+            continue
+        BgzfReader(os.path.abspath(bgzf_file))
+    return
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.stderr.write(__doc__ + '\n')
+        sys.exit(1)
+    if sys.argv[1] == '--check':
+        import tempfile
+        with tempfile.TemporaryDirectory() as check_dir:
+            check_results = check_multi_frame(check_dir)
+        for check_format, check_passed in check_results:
+            sys.stderr.write(check_format + ': ' + ('read every frame' if check_passed else 'FAILED, frames were lost') + '\n')
+        if not all(check_passed for check_format, check_passed in check_results):
+            sys.exit(1)
+        sys.exit(0)
+    main(sys.argv[1:])
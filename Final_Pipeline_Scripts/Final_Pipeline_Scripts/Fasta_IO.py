@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""
+Small FASTA reader and writer for the pipeline scripts, so that reading and
+writing plain FASTA does not need Biopython. Importing this module only
+imports the standard library; NumPy is imported the first time an alignment
+is read into a matrix.
+
+Records are (id, description, seq) tuples, following the Biopython
+conventions: 'description' is the whole header line without the '>', 'id' is
+the description up to the first whitespace, and 'seq' is the sequence as
+bytes with the line breaks removed. FASTA files given by path are read through
+a memory map, so that the file is not copied through Python's file buffers
+line by line. Compressed FASTA files (gzip, BGZF, or zstd; see
+Compressed_IO.py) are stream-decompressed instead.
+
+This is meant to be imported by the other pipeline scripts, e.g.,
+
+    from Fasta_IO import read_fasta, write_fasta
+"""
+
+import os
+import mmap
+import collections
+
+from Compressed_IO import is_compressed, open_compressed
+
+FastaRecord = collections.namedtuple('FastaRecord', ['id', 'description', 'seq'])
+
+# Number of residues per line when writing wrapped FASTA, the same as Biopython
+FASTA_LINE_WIDTH = 60
+# Bytes that are removed from sequence lines
+SEQ_WHITESPACE = b' \t\r\n'
+
+
+def make_record(header, seq):
+    """Build a FastaRecord from a header line (bytes, without the '>') and the
+    raw sequence bytes."""
+    description = header.rstrip().decode('ascii')
+    seq_id = description.split(None, 1)[0] if description else ''
+    return FastaRecord(seq_id, description, seq.translate(None, SEQ_WHITESPACE))
+
+
+def records_from_buffer(buf):
+    """Yield FastaRecords from a buffer (bytes or mmap) that holds a whole
+    FASTA file. Anything before the first header is skipped."""
+    start = buf.find(b'>')
+    while start != -1:
+        header_end = buf.find(b'\n', start)
+        if header_end == -1:
+            header_end = len(buf)
+        next_start = buf.find(b'\n>', header_end)
+        seq_end = len(buf) if next_start == -1 else next_start
+        yield make_record(buf[start + 1:header_end], buf[header_end:seq_end])
+        start = -1 if next_start == -1 else next_start + 1
+
+
+def records_from_lines(handle):
+    """Yield FastaRecords from an open file handle, in text or binary mode."""
+    header = None
+    seq_lines = []
+    for line in handle:
+        if isinstance(line, str):
+            line = line.encode('ascii')
+        if line.startswith(b'>'):
+            if header is not None:
+                yield make_record(header, b''.join(seq_lines))
+            header = line[1:]
+            seq_lines = []
+        elif header is not None:
+            seq_lines.append(line)
+    if header is not None:
+        yield make_record(header, b''.join(seq_lines))
+
+
+def read_fasta(source):
+    """Yield (id, description, seq) FastaRecords from a FASTA file. 'source' is
+    either a path, which is memory-mapped (or stream-decompressed, if it is
+    compressed), or an open file handle."""
+    if not isinstance(source, (str, bytes, os.PathLike)):
+        yield from records_from_lines(source)
+        return
+    if is_compressed(source):
+        with open_compressed(source, 'rb') as f:
+            yield from records_from_lines(f)
+        return
+    with open(source, 'rb') as f:
+        # mmap can not map an empty file, and an empty file has no records.
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            yield from records_from_buffer(buf)
+
+
+def read_fasta_matrix(source):
+    """Read an aligned FASTA file into a NumPy matrix. Returns the list of
+    sequence IDs, the list of descriptions, and a (n_seqs, aligned length)
+    uint8 matrix of the sequences. Raises ValueError if the sequences are not
+    all the same length."""
+    import numpy as np
+    records = list(read_fasta(source))
+    lengths = set(len(record.seq) for record in records)
+    if len(lengths) > 1:
+        raise ValueError('The sequences in the alignment are not all the same length.')
+    aln_len = lengths.pop() if lengths else 0
+    matrix = np.frombuffer(b''.join(record.seq for record in records), dtype=np.uint8)
+    matrix = matrix.reshape(len(records), aln_len)
+    return [record.id for record in records], [record.description for record in records], matrix
+
+
+def fasta_header(seq_id, description):
+    """Return the header line for a record, the same way that Biopython
+    writes it: the description if it starts with the ID, otherwise the ID and
+    the description."""
+    if description and description.split(None, 1)[0] == seq_id:
+        return '>' + description + '\n'
+    if description:
+        return '>' + seq_id + ' ' + description + '\n'
+    return '>' + seq_id + '\n'
+
+
+def write_fasta(records, out_handle, line_width=FASTA_LINE_WIDTH):
+    """Write (id, description, seq) records to an open text handle as FASTA.
+    The sequence can be a string or bytes. Sequences are wrapped at
+    'line_width' residues, or written on one line if 'line_width' is None.
+    All records are written in one call to the handle."""
+    chunks = []
+    for seq_id, description, seq in records:
+        if isinstance(seq, (bytes, bytearray, memoryview)):
+            seq = bytes(seq).decode('ascii')
+        chunks.append(fasta_header(seq_id, description))
+        if line_width is None:
+            chunks.append(seq + '\n')
+        else:
+            for start in range(0, len(seq), line_width):
+                chunks.append(seq[start:start + line_width] + '\n')
+    out_handle.write(''.join(chunks))
+    return
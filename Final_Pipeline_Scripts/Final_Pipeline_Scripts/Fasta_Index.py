@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+"""
+Fetch sequences from FASTA files by name, without calling out to SAMtools.
+
+This module reads (or builds, if it is missing) the SAMtools-style '.fai'
+index of a FASTA file once, memory-maps the FASTA, and returns sequences by
+slicing the mapped file. The open files are held in a small least-recently-used
+cache so that a single Python process can serve sequence requests for every
+species in the cohort without re-opening the files for each sequence.
+
+Compressed FASTA files can be read too (see Compressed_IO.py). A BGZF file
+(from 'bgzip') is read with random access through its '.gzi' index, so only
+the blocks that hold a sequence are decompressed. Its '.fai' index holds
+uncompressed offsets, like the one that 'samtools faidx' writes. Other gzip or
+zstd files can not be read at random, so they are decompressed into memory
+once when they are opened.
+
+This is meant to be imported by the other pipeline scripts, e.g.,
+
+    from Fasta_Index import fetch_sequence
+    cds = fetch_sequence('/path/to/Homo_sapiens.fasta', 'lcl|NC_000019.10_cds_NP_001268900.1_117358')
+
+It can also be run on its own to build the '.fai' index for one or more FASTA
+files ahead of time:
+
+python /path/to/Fasta_Index.py /path/to/species1.fasta [/path/to/species2.fasta ...]
+"""
+
+import sys
+import os
+import mmap
+import functools
+
+from Compressed_IO import detect_compression, open_compressed, read_decompressed, BgzfReader
+
+# The number of FASTA files to keep open at once. The largest cohort that we
+# run is 16 species, so this lets one process hold every species' CDS file.
+MAX_OPEN_FASTA = 16
+
+
+def fai_path(fasta_path):
+    """Return the path to the '.fai' index that goes with a FASTA file. This
+    follows the SAMtools convention of appending '.fai' to the FASTA name."""
+    return fasta_path + '.fai'
+
+
+def read_fai(fai_file):
+    """Parse a SAMtools '.fai' index and return a dictionary of
+        seq_name -> (length, offset, line_bases, line_width)
+    The columns of the '.fai' file are described in the SAMtools faidx
+    documentation: name, sequence length, byte offset of the first base,
+    bases per line, and bytes per line (including the newline)."""
+    index = dict()
+    with open(fai_file, 'rt') as f:
+        for row in f:
+            fields = row.rstrip('\n').split('\t')
+            seq_name = fields[0]
+            length, offset, line_bases, line_width = [int(x) for x in fields[1:5]]
+            index[seq_name] = (length, offset, line_bases, line_width)
+    return index
+
+
+def build_fai(fasta_path):
+    """Scan through a FASTA file and build the same index that 'samtools faidx'
+    would. Returns the index as a dictionary (see read_fai()) and a list of
+    sequence names in file order so that the index can be written to disk in
+    the same order as SAMtools would write it."""
+    index = dict()
+    seq_order = []
+    # Keep track of the sequence that we are currently indexing. These are
+    # reset every time we see a new header line.
+    seq_name = None
+    length = offset = line_bases = line_width = 0
+    # A sequence is allowed to have a single short line at its end. If we see
+    # a short line and then more sequence, the file can not be indexed.
+    short_line_seen = False
+    byte_pos = 0
+    with open_compressed(fasta_path, 'rb') as f:
+        for line in f:
+            line_len = len(line)
+            if line.startswith(b'>'):
+                if seq_name is not None:
+                    index[seq_name] = (length, offset, line_bases, line_width)
+                    seq_order.append(seq_name)
+                # The sequence name is everything up to the first whitespace,
+                # which is also how SAMtools names the sequences.
+                seq_name = line[1:].split()[0].decode('utf-8')
+                length = line_bases = line_width = 0
+                offset = byte_pos + line_len
+                short_line_seen = False
+            elif seq_name is not None:
+                n_bases = len(line.rstrip(b'\r\n'))
+                if n_bases > 0:
+                    if line_bases == 0:
+                        line_bases = n_bases
+                        line_width = line_len
+                    elif short_line_seen or n_bases > line_bases:
+                        raise ValueError(
+                            'Different line length in sequence ' + seq_name
+                            + ' of ' + fasta_path + '; it can not be indexed.')
+                    if n_bases < line_bases:
+                        short_line_seen = True
+                    length += n_bases
+            byte_pos += line_len
+    if seq_name is not None:
+        index[seq_name] = (length, offset, line_bases, line_width)
+        seq_order.append(seq_name)
+    return index, seq_order
+
+
+def write_fai(index, seq_order, fai_file):
+    """Write a FASTA index to disk in the SAMtools '.fai' format."""
+    with open(fai_file, 'wt') as f:
+        for seq_name in seq_order:
+            length, offset, line_bases, line_width = index[seq_name]
+            f.write('\t'.join([seq_name, str(length), str(offset), str(line_bases), str(line_width)]) + '\n')
+    return
+
+
+def load_fai(fasta_path):
+    """Return the index for a FASTA file. If there is an up-to-date '.fai' next
+    to the FASTA, read it. Otherwise, build it, and try to save it alongside
+    the FASTA for next time. If the FASTA directory is not writable, we just
+    keep the index in memory."""
+    fai_file = fai_path(fasta_path)
+    if os.path.isfile(fai_file) and os.path.getmtime(fai_file) >= os.path.getmtime(fasta_path):
+        return read_fai(fai_file)
+    index, seq_order = build_fai(fasta_path)
+    # Write to a temporary name and then rename, so that several processes
+    # building the same index at once do not leave a half-written file.
+    tmp_fai = fai_file + '.' + str(os.getpid()) + '.tmp'
+    try:
+        write_fai(index, seq_order, tmp_fai)
+        os.replace(tmp_fai, fai_file)
+    except (OSError, IOError):
+        sys.stderr.write('Could not write ' + fai_file + '; keeping the index in memory only.\n')
+    return index
+
+
+@functools.lru_cache(maxsize=MAX_OPEN_FASTA)
+def open_indexed_fasta(fasta_path):
+    """Memory-map a FASTA file and load its index. Returns a tuple of
+    (mmap, index). A BGZF file gives a BgzfReader instead of the mmap, which
+    is sliced the same way, and any other compressed file gives its
+    decompressed bytes. The results are cached, so asking for the same file
+    again returns the already-mapped file. When more than MAX_OPEN_FASTA files
+    have been opened, the least recently used one is dropped from the cache
+    and is unmapped once nothing else refers to it."""
+    index = load_fai(fasta_path)
+    compression = detect_compression(fasta_path)
+    if compression == 'bgzf':
+        return BgzfReader(fasta_path), index
+    if compression is not None:
+        sys.stderr.write(fasta_path + ' is not BGZF-compressed, so it is decompressed into memory. Recompress it with bgzip for random access.\n')
+        return read_decompressed(fasta_path), index
+    with open(fasta_path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return mapped, index
+
+
+def fetch_sequence(fasta_path, seq_name):
+    """Return the sequence named 'seq_name' from 'fasta_path' as a string, with
+    the line breaks removed. Like 'samtools faidx', a sequence that is not in
+    the index gives an empty result and a warning on stderr."""
+    mapped, index = open_indexed_fasta(os.path.abspath(fasta_path))
+    try:
+        length, offset, line_bases, line_width = index[seq_name]
+    except KeyError:
+        sys.stderr.write('[fetch_sequence] Could not find ' + seq_name + ' in ' + fasta_path + '\n')
+        return ''
+    if length == 0:
+        return ''
+    # Calculate the byte position of the end of the sequence: every full line
+    # takes up 'line_width' bytes, and the last (possibly short) line only
+    # takes up the bases that are left.
+    full_lines, remainder = divmod(length, line_bases)
+    end = offset + full_lines * line_width + remainder
+    # Slice the mapped file and remove the line endings.
+    raw = mapped[offset:end]
+    return raw.replace(b'\n', b'').replace(b'\r', b'').decode('ascii')
+
+
+def main(fasta_files):
+    """Main function. Build the '.fai' index of each FASTA file given on the
+    command line."""
+    for fasta_file in fasta_files:
+        load_fai(os.path.abspath(fasta_file))
+    return
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.stderr.write(__doc__ + '\n')
+        sys.exit(1)
+    main(sys.argv[1:])
@@ -22,7 +22,13 @@ unset _PIPE_SCRIPTS_FROM_GITHUB _PIPE_ANALYSIS_START_DATE _PIPE_PARTITION \
 	_PIPE_MEM_PER_CPU _PIPE_WALLTIME _PIPE_CPUS_PER_TASK _PIPE_NTASKS \
 	_PIPE_NNODES _PIPE_SLURM_ACCOUNT _PIPE_EMAIL_TYPES _PIPE_SCRATCH_DIR \
 	_PIPE_ALL_DATA _PIPE_ALL_CDS _PIPE_CYP_NAME_PROTEIN_ID \
-	_PIPE_COHORT_MEMBERS _PIPE_RUN_NICKNAME
+	_PIPE_COHORT_MEMBERS _PIPE_RUN_NICKNAME _PIPE_BACKTRANSLATE_VERIFY \
+	_PIPE_STEP01_KEEP_INTERMEDIATES _PIPE_STEP01_PRESELECT _PIPE_TRIM_METHOD \
+	_PIPE_REPRESENTATIVE_SELECTION _PIPE_STEP01_MAFFT_SPARE_THREADS \
+	_PIPE_STEP00_TRANSFER_MODE \
+	_PIPE_STEP00_REDUCE_ISOFORMS _PIPE_STEP00_ORTHOFINDER_MODE \
+	_PIPE_STEP00_SEARCH _PIPE_STEP00_SEARCH_CACHE \
+	_PIPE_STEP00_SUPERSET_ORTHOGROUPS _PIPE_STEP00_HOG_NODE
 
 # Define the path to the user-specific copy of the GitHub repository. Each
 # user should have their own version of the pipeline scripts. This is the path
@@ -100,6 +106,108 @@ export _PIPE_COHORT_MEMBER_NUMBER="${#_PIPE_COHORT_MEMBERS[@]}"
 # directory for the pipeline.
 export _PIPE_RUN_NICKNAME="${_PIPE_COHORT_MEMBER_NUMBER}_${_PIPE_ANALYSIS_START_DATE}"
 
+# Give Orthofinder only the longest CDS of each gene of each species (step 00),
+# rather than every RefSeq isoform. The human CYPs of interest are always kept.
+# This makes the all-versus-all search several times faster. The isoforms of
+# each gene, and which one was kept, are written to Isoform_Map.tsv in the
+# output directory. Set to "no" to give Orthofinder every isoform.
+export _PIPE_STEP00_REDUCE_ISOFORMS="yes"
+
+# How much of Orthofinder to run in step 00. Set to one of:
+#	full: run the whole Orthofinder analysis (MSA gene trees and the species tree)
+#	orthogroups: stop once the orthogroups are inferred (orthofinder -og). The
+#		pipeline only uses Orthogroups.tsv, so the FASTA files of the target
+#		orthogroups are built from it and the CDS store instead of having
+#		Orthofinder write a FASTA file for every orthogroup.
+export _PIPE_STEP00_ORTHOFINDER_MODE="orthogroups"
+
+# Which sequence search Orthofinder runs in step 00. Set to one of:
+#	blast_nucl: BLAST the CDS nucleotide sequences (slowest)
+#	diamond: translate the CDS files and search the proteins with DIAMOND. The
+#		proteins keep the CDS sequence IDs, and the translation of each CDS is
+#		described in CDS_Protein_Map.tsv in the output directory.
+# Benchmark_Orthofinder_Search.sh compares the two on a cohort.
+export _PIPE_STEP00_SEARCH="blast_nucl"
+
+# Keep the Orthofinder search results of every species pair in
+# ${_PIPE_ALL_DATA}/Orthofinder_Search_Cache (step 00), keyed by the checksums
+# of the two FASTA files, and only search the pairs that are not cached. Moving
+# between the 6, 10, and 16 species cohorts, or adding a species, then reuses
+# the searches of the species that were already compared. Set to "no" to run
+# every search again.
+export _PIPE_STEP00_SEARCH_CACHE="yes"
+
+# Orthogroups.tsv of an earlier run of a larger cohort (e.g., the 16 species
+# cohort), to project onto this cohort instead of running Orthofinder (step 00).
+# Only the columns of this cohort's species are kept, and the target orthogroup
+# FASTA files are built from the CDS store. Leave empty to run Orthofinder.
+# e.g., export _PIPE_STEP00_SUPERSET_ORTHOGROUPS="${_PIPE_ALL_DATA}/Orthogroups_16_2024-02-18.tsv"
+export _PIPE_STEP00_SUPERSET_ORTHOGROUPS=""
+
+# Use the phylogenetic hierarchical orthogroups (HOGs) of a node of the species
+# tree as the target groups (step 00), rather than the orthogroups. e.g., N0 is
+# the root of the cohort: its HOGs split the big CYP families (CYP2, CYP4F, ...)
+# into smaller groups of orthologues, which are faster to align and to run
+# codeml on. HOGs need _PIPE_STEP00_ORTHOFINDER_MODE="full". Leave empty to use
+# Orthogroups.tsv.
+export _PIPE_STEP00_HOG_NODE=""
+
+# How step 00 puts the target orthogroup FASTA files into
+# Step_00_Orthofinder_TargetOGs. Set to one of:
+#	copy: copy each file
+#	hardlink: make a hard link to each file (no data is copied)
+#	reflink: make a copy-on-write clone of each file (Btrfs, XFS, ...)
+# hardlink and reflink fall back to a copy if the Orthofinder results and the
+# output directory are on different file systems, or the file system cannot do it.
+export _PIPE_STEP00_TRANSFER_MODE="hardlink"
+
+# Check that the backtranslated codons encode the aligned amino acids (step 01).
+# NCBI CDS records with a partial first codon or an odd length otherwise shift
+# out of frame without any error. Set to one of:
+#	off: do not check
+#	flag: report discordant sequences, but keep them
+#	drop: report discordant sequences, and remove them before PAML
+# The report is written to Backtranslation_Concordance_Report.tsv in the
+# backtranslated alignment directory in scratch.
+export _PIPE_BACKTRANSLATE_VERIFY="flag"
+
+# Step 01 keeps each orthogroup in memory from translation to the PAML input
+# file. Set this to "yes" to also write the translated, aligned, and
+# backtranslated intermediate files to scratch, for debugging.
+export _PIPE_STEP01_KEEP_INTERMEDIATES="no"
+
+# Set to "yes" to pick the representative orthologue of each species (the
+# longest CDS) and the human CYPs of interest before step 01 aligns the
+# orthogroup, rather than after. This is the same selection, but MAFFT-linsi
+# only aligns the sequences that are kept, so the alignment (and the PAML input)
+# can differ from aligning the whole orthogroup. "no" aligns every sequence of
+# the orthogroup.
+export _PIPE_STEP01_PRESELECT="no"
+
+# How to trim columns from the alignments of representative orthologues before
+# PAML (step 01). Gappy and divergent columns make codeml slow. Set to one of:
+#	gap: remove nucleotide columns with more than 50% gaps (the original filter)
+#	codon_gap: remove codons where more than 50% of the sequences have a gap
+#	entropy: codon_gap, and also remove highly divergent codons
+#	gappyout: remove codons above an automatic gap cutoff, like trimAl -gappyout
+# The columns removed from each orthogroup, and the predicted codeml time saved,
+# are written to Trim_Report.tsv in Step_01_PAML_Seq_Inputs.
+export _PIPE_TRIM_METHOD="gap"
+
+# How step 01 picks the representative orthologue of each non-human species:
+#	length: the sequence with the fewest gaps in the alignment (the longest CDS)
+#	identity: the sequence with the highest codon identity to the human CYPs of
+#		interest. This needs the whole orthogroup aligned, so it turns off
+#		_PIPE_STEP01_PRESELECT.
+export _PIPE_REPRESENTATIVE_SELECTION="length"
+
+# Step 01 runs one MAFFT-linsi job per CPU, each with a single thread, which
+# gives the same alignments as running the orthogroups one at a time. Set to
+# "yes" to give the CPUs that are left over (when there are fewer target
+# orthogroups than CPUs) to the MAFFT jobs as extra threads. This is faster, but
+# multithreaded MAFFT-linsi can give different alignments from run to run.
+export _PIPE_STEP01_MAFFT_SPARE_THREADS="no"
+
 # Version identifier for the pipeline.
 export _PIPE_VERSION="0.0.0"
 # Information about who is running the pipeline and when. Do not edit these.
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+"""
+Keep the all-versus-all search results of Orthofinder between runs, so that
+species pairs that were already searched (in any earlier cohort) are usually
+not searched again (see 'prepare' below). The cache holds one file of search
+hits per ordered species pair, keyed by the SHA-256 checksums of the two
+species' input FASTA files, so a changed FASTA file is never matched to old
+results. The pairs are kept separately for each search method and version of
+the search tool (the output of 'diamond version' or 'blastn -version'), so a
+different search never reuses the hits of an old one.
+
+Orthofinder numbers the species of a run (0, 1, ...) and names every
+sequence by species and position, e.g., 3_127. The cache stores the search
+hits, the species FASTA files, and the sequence IDs of its working directory
+with the species number taken off, and puts the numbers of the new run back
+on when they are reused.
+
+Takes one of two commands:
+
+prepare CACHE_DIR SEARCH INPUT_DIR PREVIOUS_DIR NEW_SPECIES_DIR
+    Pick a set of the cohort FASTA files in INPUT_DIR whose species and
+    species pairs are all in the cache for the SEARCH method (e.g., 'diamond'
+    or 'blast_nucl') and the installed version of its tool, and write them to
+    PREVIOUS_DIR as an Orthofinder working directory. The files are taken in
+    file name order, and each is kept if its pairs with the files kept before
+    it are cached; this is not always the largest such set. Links to the
+    other FASTA files are put in NEW_SPECIES_DIR. Prints how to run Orthofinder:
+        fresh: nothing is cached; run 'orthofinder -f INPUT_DIR'
+        reuse: everything is cached; run 'orthofinder -b PREVIOUS_DIR'
+        add: run 'orthofinder -b PREVIOUS_DIR -f NEW_SPECIES_DIR', which only
+             searches the pairs with a new species
+
+store CACHE_DIR SEARCH INPUT_DIR RESULTS_DIR
+    Add the species and search results of every Orthofinder working directory
+    under RESULTS_DIR to the cache.
+
+Usage:
+
+python /path/to/Orthofinder_Search_Cache.py prepare /path/to/Search_Cache diamond /path/to/orthofinder_in /path/to/WorkingDirectory_Cached /path/to/new_species
+python /path/to/Orthofinder_Search_Cache.py store /path/to/Search_Cache diamond /path/to/orthofinder_in /path/to/Orthofinder_Output
+"""
+
+import sys
+import os
+import re
+import gzip
+import hashlib
+import subprocess
+
+from Orthogroup_Index import file_checksum
+
+# Names of the files in an Orthofinder working directory
+SPECIES_IDS = 'SpeciesIDs.txt'
+SEQUENCE_IDS = 'SequenceIDs.txt'
+SPECIES_FASTA = re.compile(r'^Species(\d+)\.fa$')
+SEARCH_RESULT = re.compile(r'^Blast(\d+)_(\d+)\.txt\.gz$')
+# Commands that print the version of the tool that Orthofinder runs for each
+# search method
+SEARCH_VERSION_COMMANDS = {
+    'diamond': ['diamond', 'version'],
+    'blast_nucl': ['blastn', '-version']}
+# File in each cache directory with the version of the search tool
+SEARCH_VERSION_FILE = 'Search_Version.txt'
+
+
+def search_version(search):
+    """Return the version output of the search tool of a search method.
+    Raises ValueError for an unknown method, and OSError or
+    subprocess.CalledProcessError if the tool cannot be run."""
+    if search not in SEARCH_VERSION_COMMANDS:
+        raise ValueError('Unknown search method: ' + search + '; should be one of: ' + ', '.join(SEARCH_VERSION_COMMANDS))
+    proc = subprocess.run(SEARCH_VERSION_COMMANDS[search], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=True)
+    return proc.stdout.decode('utf-8', 'replace').strip()
+
+
+def search_key(search, version):
+    """Return the name of the cache directory of a search method and tool
+    version, e.g., diamond_3f2a9c01b7d4"""
+    return search + '_' + hashlib.sha256(version.encode('utf-8')).hexdigest()[0:12]
+
+
+def cache_paths(cache_dir, key):
+    """Return the directories of cached species and species pairs for a
+    search method and tool version (see search_key())."""
+    return os.path.join(cache_dir, key, 'species'), os.path.join(cache_dir, key, 'pairs')
+
+
+def pair_name(query_sha, subject_sha):
+    """Return the cache file name of the search hits of one species pair."""
+    return query_sha + '_' + subject_sha + '.txt.gz'
+
+
+def input_checksums(input_dir):
+    """Return a dictionary of FASTA file name -> SHA-256 checksum for the
+    files in the Orthofinder input directory, in file name order."""
+    checksums = dict()
+    for fname in sorted(os.listdir(input_dir)):
+        checksums[fname] = file_checksum(os.path.join(input_dir, fname))
+    return checksums
+
+
+def strip_species(seq_id):
+    """Remove the species number from an Orthofinder sequence ID, 3_127 -> 127"""
+    return seq_id.split('_', 1)[1]
+
+
+def renumber_lines(lines, query_species, subject_species):
+    """Yield lines of tab-separated search hits with a species number put on
+    the query (first column) and subject (second column) IDs. A species of
+    None takes the species numbers off instead."""
+    for line in lines:
+        query, subject, rest = line.split('\t', 2)
+        if query_species is None:
+            query = strip_species(query)
+            subject = strip_species(subject)
+        else:
+            query = query_species + '_' + query
+            subject = subject_species + '_' + subject
+        yield query + '\t' + subject + '\t' + rest
+
+
+def write_atomic(path, lines, compress=False):
+    """Write lines to a temporary file and rename it into place, so that runs
+    that share the cache never see a partly-written file."""
+    tmp_path = path + '.' + str(os.getpid()) + '.tmp'
+    opener = gzip.open if compress else open
+    with opener(tmp_path, 'wt') as f:
+        f.writelines(lines)
+    os.replace(tmp_path, path)
+    return
+
+
+def read_species_ids(work_dir):
+    """Return a dictionary of species number -> FASTA file name from the
+    SpeciesIDs.txt of a working directory. Commented-out species are left
+    out."""
+    species = dict()
+    with open(os.path.join(work_dir, SPECIES_IDS), 'rt') as f:
+        for line in f:
+            if not line.strip() or line.startswith('#'):
+                continue
+            number, fname = line.rstrip('\n').split(': ', 1)
+            species[number] = fname
+    return species
+
+
+def read_sequence_ids(work_dir):
+    """Return a dictionary of species number -> list of 'k: header' lines
+    (without the species number) from the SequenceIDs.txt of a working
+    directory."""
+    sequences = dict()
+    with open(os.path.join(work_dir, SEQUENCE_IDS), 'rt') as f:
+        for line in f:
+            number, rest = line.split('_', 1)
+            sequences.setdefault(number, []).append(rest)
+    return sequences
+
+
+def choose_cached_species(checksums, species_dir, pair_dir):
+    """Return the input files whose species, and pairs with every other chosen
+    species (and with themselves), are all in the cache, and the input files
+    that have to be searched as new species. The files are taken in file name
+    order, and each is kept if it fits with the ones kept before it. This
+    greedy pass can miss a larger set that is fully cached, e.g., when an
+    early file was only searched with some of the others; those species are
+    then searched again rather than reused."""
+    cached = []
+    new = []
+    for fname, sha in checksums.items():
+        needed = [os.path.join(species_dir, sha + '.fa'), os.path.join(species_dir, sha + '.ids'), os.path.join(pair_dir, pair_name(sha, sha))]
+        for other in cached:
+            needed.append(os.path.join(pair_dir, pair_name(sha, checksums[other])))
+            needed.append(os.path.join(pair_dir, pair_name(checksums[other], sha)))
+        if all(os.path.isfile(path) for path in needed):
+            cached.append(fname)
+        else:
+            new.append(fname)
+    return cached, new
+
+
+def prepare(cache_dir, key, input_dir, previous_dir, new_dir):
+    """Write the cached species of the cohort as an Orthofinder working
+    directory, and link the other species into the new species directory.
+    'key' is the cache directory of the search (see search_key()). Returns
+    'fresh', 'reuse', or 'add' (see the module doc string)."""
+    species_dir, pair_dir = cache_paths(cache_dir, key)
+    checksums = input_checksums(input_dir)
+    cached, new = choose_cached_species(checksums, species_dir, pair_dir)
+    if not cached:
+        return 'fresh'
+    os.makedirs(previous_dir, exist_ok=True)
+    species_lines = []
+    sequence_lines = []
+    for number, fname in enumerate(cached):
+        sha = checksums[fname]
+        species_lines.append(str(number) + ': ' + fname + '\n')
+        with open(os.path.join(species_dir, sha + '.ids'), 'rt') as f:
+            sequence_lines.extend(str(number) + '_' + line for line in f)
+        with open(os.path.join(species_dir, sha + '.fa'), 'rt') as f:
+            write_atomic(
+                os.path.join(previous_dir, 'Species' + str(number) + '.fa'),
+                ('>' + str(number) + '_' + line[1:] if line.startswith('>') else line for line in f))
+    write_atomic(os.path.join(previous_dir, SPECIES_IDS), species_lines)
+    write_atomic(os.path.join(previous_dir, SEQUENCE_IDS), sequence_lines)
+    for query_number, query_fname in enumerate(cached):
+        for subject_number, subject_fname in enumerate(cached):
+            cached_pair = os.path.join(pair_dir, pair_name(checksums[query_fname], checksums[subject_fname]))
+            with gzip.open(cached_pair, 'rt') as f:
+                write_atomic(
+                    os.path.join(previous_dir, 'Blast' + str(query_number) + '_' + str(subject_number) + '.txt.gz'),
+                    renumber_lines(f, str(query_number), str(subject_number)), compress=True)
+    if not new:
+        return 'reuse'
+    os.makedirs(new_dir, exist_ok=True)
+    for fname in new:
+        os.symlink(os.path.abspath(os.path.join(input_dir, fname)), os.path.join(new_dir, fname))
+    return 'add'
+
+
+def find_working_dirs(results_dir):
+    """Return every Orthofinder working directory (a directory with a
+    SpeciesIDs.txt) under the results directory."""
+    return [dirpath for dirpath, dirnames, filenames in os.walk(results_dir) if SPECIES_IDS in filenames]
+
+
+def store(cache_dir, key, version, input_dir, results_dir):
+    """Add the species FASTA files, sequence IDs, and search hits of every
+    working directory under the results directory to the cache directory of
+    the search (see search_key()), and record the search tool version there.
+    Species whose FASTA file is not one of the input files are skipped. Returns
+    the number of species pairs that were added."""
+    species_dir, pair_dir = cache_paths(cache_dir, key)
+    os.makedirs(species_dir, exist_ok=True)
+    os.makedirs(pair_dir, exist_ok=True)
+    write_atomic(os.path.join(cache_dir, key, SEARCH_VERSION_FILE), [version + '\n'])
+    checksums = input_checksums(input_dir)
+    n_added = 0
+    for work_dir in find_working_dirs(results_dir):
+        species_sha = dict()
+        for number, fname in read_species_ids(work_dir).items():
+            if fname in checksums:
+                species_sha[number] = checksums[fname]
+        sequence_ids = read_sequence_ids(work_dir)
+        for fname in sorted(os.listdir(work_dir)):
+            species_match = SPECIES_FASTA.match(fname)
+            pair_match = SEARCH_RESULT.match(fname)
+            if species_match and species_match.group(1) in species_sha:
+                number = species_match.group(1)
+                sha = species_sha[number]
+                if not os.path.isfile(os.path.join(species_dir, sha + '.fa')):
+                    write_atomic(os.path.join(species_dir, sha + '.ids'), sequence_ids.get(number, []))
+                    with open(os.path.join(work_dir, fname), 'rt') as f:
+                        write_atomic(
+                            os.path.join(species_dir, sha + '.fa'),
+                            ('>' + strip_species(line[1:]) if line.startswith('>') else line for line in f))
+            elif pair_match and pair_match.group(1) in species_sha and pair_match.group(2) in species_sha:
+                cached_pair = os.path.join(pair_dir, pair_name(species_sha[pair_match.group(1)], species_sha[pair_match.group(2)]))
+                if not os.path.isfile(cached_pair):
+                    with gzip.open(os.path.join(work_dir, fname), 'rt') as f:
+                        write_atomic(cached_pair, renumber_lines(f, None, None), compress=True)
+                    n_added += 1
+    return n_added
+
+
+if __name__ == '__main__':
+    if not ((len(sys.argv) == 7 and sys.argv[1] == 'prepare') or (len(sys.argv) == 6 and sys.argv[1] == 'store')):
+        sys.stderr.write(__doc__ + '\n')
+        sys.exit(1)
+    try:
+        tool_version = search_version(sys.argv[3])
+    except (ValueError, OSError, subprocess.CalledProcessError) as err:
+        sys.stderr.write('Could not get the version of the search tool: ' + str(err) + '\n')
+        sys.exit(1)
+    cache_key = search_key(sys.argv[3], tool_version)
+    if sys.argv[1] == 'prepare':
+        print(prepare(sys.argv[2], cache_key, sys.argv[4], sys.argv[5], sys.argv[6]))
+    else:
+        n_pairs = store(sys.argv[2], cache_key, tool_version, sys.argv[4], sys.argv[5])
+        sys.stderr.write('Added ' + str(n_pairs) + ' species pairs to the search cache.\n')
@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+"""
+Build and query an on-disk index of the Orthofinder Orthogroups.tsv file.
+
+The Orthogroups.tsv file is parsed once (in step 00) into a SQLite database
+that is stored next to it. The other pipeline scripts then look up
+protein -> species, protein -> orthogroup, and orthogroup -> members through
+the database indices instead of re-reading the whole table. The database
+records the size, modification time, and SHA-256 checksum of the TSV it was
+built from, and it is rebuilt automatically if the TSV changes. The TSV can be
+gzip, BGZF, or zstd compressed (see Compressed_IO.py); the checksum is of the
+compressed file.
+
+The table can also be one of the phylogenetic hierarchical orthogroup (HOG)
+tables of Orthofinder (Phylogenetic_Hierarchical_Orthogroups/N0.tsv, or the
+table of another node of the species tree), which have the HOG, OG, and Gene
+Tree Parent Clade columns before the species columns. HOG IDs (e.g.,
+N0.HOG0000001) are stored with the '.' removed (N0HOG0000001), because the
+later steps take the orthogroup ID of a file from the part of its name before
+the first '.' or the first '_' (e.g., OG0000001_RepOrthologues.fa), so every
+other script can use them as orthogroup IDs. The node stays in the ID, so HOGs
+of different nodes do not share an ID.
+
+Takes one or two arguments:
+    1) Path to the Orthogroups.tsv file
+    2) (Optional) Path to the index database. Default: Orthogroups.tsv path with '.sqlite' appended
+
+Usage:
+
+python /path/to/Orthogroup_Index.py /path/to/Orthogroups.tsv [/path/to/Orthogroups.tsv.sqlite]
+"""
+
+import sys
+import os
+import sqlite3
+import hashlib
+
+from Compressed_IO import open_compressed
+
+# Bump this if the layout of the database changes, so that old indices get
+# rebuilt rather than queried with the wrong layout.
+INDEX_VERSION = '2'
+# Number of columns before the species columns in Orthogroups.tsv (Orthogroup)
+# and in the HOG tables (HOG, OG, Gene Tree Parent Clade)
+OG_ID_COLUMNS = 1
+HOG_ID_COLUMNS = 3
+
+
+def index_path(og_table):
+    """Return the default path of the index database for an Orthogroups.tsv."""
+    return og_table + '.sqlite'
+
+
+def ncbi_accession(prot_name):
+    """Isolate just the NCBI protein ID from the complicated name that the
+    proteins have in the Orthogroups.tsv file. Orthogroups.tsv has entries like
+    lcl|NC_000019.10_cds_NP_001268900.1_117358, and we need just the
+    "NP_001268900.1" bit."""
+    return '_'.join(prot_name.split('_')[-3:-1])
+
+
+def is_hog_table(header):
+    """Return True if the header row (as a list of columns) is that of a
+    hierarchical orthogroup table rather than Orthogroups.tsv."""
+    return header[0] == 'HOG'
+
+
+def id_columns(header):
+    """Return the number of columns before the species columns of an
+    Orthogroups.tsv or HOG table, from its header row."""
+    return HOG_ID_COLUMNS if is_hog_table(header) else OG_ID_COLUMNS
+
+
+def read_table_header(og_table):
+    """Return the header row of an Orthogroups.tsv or HOG table as a list of
+    columns."""
+    with open_compressed(og_table, 'rt') as f:
+        return f.readline().strip().split('\t')
+
+
+def hog_group_id(hog_id):
+    """Return the orthogroup ID that the pipeline uses for a HOG, with no '.'
+    or '_' in it: N0.HOG0000001 -> N0HOG0000001"""
+    return hog_id.replace('.', '').replace('_', '')
+
+
+def file_checksum(path):
+    """Return the SHA-256 hex digest of a file, read in 1MB chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1048576), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_signature(path):
+    """Return the (size, mtime) of a file as strings, for storage in the
+    database metadata table."""
+    st = os.stat(path)
+    return str(st.st_size), str(st.st_mtime_ns)
+
+
+def build_og_index(og_table, db_file):
+    """Parse the Orthogroups.tsv file and store it in a SQLite database. The
+    database is written to a temporary file and renamed into place, so that
+    other processes never see a partially-built index."""
+    tmp_db = db_file + '.' + str(os.getpid()) + '.tmp'
+    if os.path.exists(tmp_db):
+        os.remove(tmp_db)
+    conn = sqlite3.connect(tmp_db)
+    conn.executescript("""
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE species (column_number INTEGER PRIMARY KEY, species_name TEXT);
+        CREATE TABLE members (
+            protein_id TEXT,
+            accession TEXT,
+            species_name TEXT,
+            orthogroup_id TEXT,
+            member_order INTEGER);
+        """)
+    # Take the file signature before reading, so that a TSV that is modified
+    # while we are reading it will look stale the next time it is opened.
+    tsv_size, tsv_mtime = file_signature(og_table)
+    member_order = 0
+    with open_compressed(og_table, 'rt') as f:
+        for line_number, row in enumerate(f):
+            if line_number == 0:
+                header = row.strip().split('\t')
+                # Remove the first column ("Orthogroup"), or the first three
+                # of a HOG table; the rest of the columns are the species names.
+                n_id_columns = id_columns(header)
+                hog_table = is_hog_table(header)
+                species_names = header[n_id_columns:]
+                conn.executemany(
+                    'INSERT INTO species VALUES (?, ?)',
+                    enumerate(species_names))
+                continue
+            # Explicitly strip only newlines, because species with no proteins
+            # in an orthogroup have an empty column.
+            table_row = row.strip('\n').split('\t')
+            og_id = hog_group_id(table_row[0]) if hog_table else table_row[0]
+            rows = []
+            # When multiple proteins from the same species are in a single
+            # orthogroup, Orthofinder reports them with a ', ' between the
+            # protein IDs.
+            for pid_list, sp_name in zip(table_row[n_id_columns:], species_names):
+                for pid in pid_list.split(', '):
+                    if not pid:
+                        continue
+                    rows.append((pid, ncbi_accession(pid), sp_name, og_id, member_order))
+                    member_order += 1
+            conn.executemany('INSERT INTO members VALUES (?, ?, ?, ?, ?)', rows)
+    # Build the indices after loading, which is much faster than keeping them
+    # up to date row by row.
+    conn.executescript("""
+        CREATE INDEX members_protein ON members (protein_id);
+        CREATE INDEX members_orthogroup ON members (orthogroup_id);
+        CREATE INDEX members_species_accession ON members (species_name, accession);
+        """)
+    conn.executemany(
+        'INSERT INTO meta VALUES (?, ?)',
+        [('index_version', INDEX_VERSION),
+         ('tsv_size', tsv_size),
+         ('tsv_mtime', tsv_mtime),
+         ('tsv_sha256', file_checksum(og_table))])
+    conn.commit()
+    conn.close()
+    os.replace(tmp_db, db_file)
+    return
+
+
+def read_meta(db_file):
+    """Return the metadata table of an index database as a dictionary. Returns
+    an empty dictionary if the database can not be read."""
+    try:
+        conn = sqlite3.connect(db_file)
+        meta = dict(conn.execute('SELECT key, value FROM meta'))
+        conn.close()
+    except sqlite3.Error:
+        return dict()
+    return meta
+
+
+def index_is_current(og_table, db_file):
+    """Check whether the index database was built from the current version of
+    the Orthogroups.tsv file. The size and modification time are checked first
+    because they are cheap. If they differ (e.g., the TSV was copied to a new
+    location), the checksum decides, and the stored size and modification time
+    are refreshed so the next check is cheap again."""
+    if not os.path.isfile(db_file):
+        return False
+    meta = read_meta(db_file)
+    if meta.get('index_version') != INDEX_VERSION:
+        return False
+    tsv_size, tsv_mtime = file_signature(og_table)
+    if meta.get('tsv_size') == tsv_size and meta.get('tsv_mtime') == tsv_mtime:
+        return True
+    if meta.get('tsv_size') != tsv_size:
+        return False
+    if meta.get('tsv_sha256') != file_checksum(og_table):
+        return False
+    try:
+        conn = sqlite3.connect(db_file)
+        conn.execute('UPDATE meta SET value = ? WHERE key = ?', (tsv_mtime, 'tsv_mtime'))
+        conn.commit()
+        conn.close()
+    except sqlite3.Error:
+        # A read-only index is still a valid index.
+        pass
+    return True
+
+
+def open_og_index(og_table, db_file=None):
+    """Return a connection to the index database of an Orthogroups.tsv file,
+    building or rebuilding the index first if it is missing or stale."""
+    if db_file is None:
+        db_file = index_path(og_table)
+    try:
+        fh = open(og_table, 'rt')
+        fh.close()
+    except (FileNotFoundError, OSError):
+        sys.stderr.write(
+            'The Orthogroups.tsv file does not exist, or is not readable.\n')
+        sys.exit(1)
+    if not index_is_current(og_table, db_file):
+        build_og_index(og_table, db_file)
+    return sqlite3.connect(db_file)
+
+
+def species_names(conn):
+    """Return the species names in the column order of the Orthogroups.tsv."""
+    return [row[0] for row in conn.execute(
+        'SELECT species_name FROM species ORDER BY column_number')]
+
+
+def protein_species(conn, prot_id):
+    """Return the species of a protein, or None if it is not in any
+    orthogroup."""
+    row = conn.execute(
+        'SELECT species_name FROM members WHERE protein_id = ?', (prot_id,)).fetchone()
+    return row[0] if row else None
+
+
+def protein_orthogroup(conn, prot_id):
+    """Return the orthogroup ID of a protein, or None if it is not in any
+    orthogroup."""
+    row = conn.execute(
+        'SELECT orthogroup_id FROM members WHERE protein_id = ?', (prot_id,)).fetchone()
+    return row[0] if row else None
+
+
+def orthogroup_members(conn, og_id):
+    """Return a list of (protein ID, species) tuples for the members of an
+    orthogroup, in the order that they appear in the Orthogroups.tsv."""
+    return conn.execute(
+        'SELECT protein_id, species_name FROM members WHERE orthogroup_id = ? ORDER BY member_order',
+        (og_id,)).fetchall()
+
+
+def species_lookup(conn, prot_ids):
+    """Return a dictionary of prot_id -> species for just the supplied protein
+    IDs. Proteins that are not in the index are left out, so dict.get() on the
+    result behaves like it did on the full protein -> species dictionary."""
+    lookup = dict()
+    for pid in prot_ids:
+        sp_name = protein_species(conn, pid)
+        if sp_name is not None:
+            lookup[pid] = sp_name
+    return lookup
+
+
+def accession_orthogroups(conn, accessions, species_name='Homo_sapiens'):
+    """Return a dictionary of NCBI protein accession -> orthogroup ID for the
+    supplied accessions of one species. Accessions that are not in any
+    orthogroup are left out."""
+    lookup = dict()
+    for acc in accessions:
+        row = conn.execute(
+            'SELECT orthogroup_id FROM members WHERE species_name = ? AND accession = ? ORDER BY member_order DESC',
+            (species_name, acc)).fetchone()
+        if row:
+            lookup[acc] = row[0]
+    return lookup
+
+
+def main(og_table, db_file):
+    """Main function. Build the index if it is missing or out of date."""
+    conn = open_og_index(og_table, db_file)
+    conn.close()
+    return
+
+
+if __name__ == '__main__':
+    try:
+        og_tsv = sys.argv[1]
+    except IndexError:
+        sys.stderr.write(__doc__ + '\n')
+        sys.exit(1)
+    try:
+        og_db = sys.argv[2]
+    except IndexError:
+        og_db = None
+    main(og_tsv, og_db)
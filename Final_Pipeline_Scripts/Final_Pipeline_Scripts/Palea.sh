@@ -112,7 +112,7 @@ STEP_00=$(sbatch \
     -t "${_PIPE_WALLTIME}" \
     --mem-per-cpu "${_PIPE_MEM_PER_CPU}" \
     -p "${_PIPE_PARTITION}" \
-    --export="_PIPE_SCRIPTS_FROM_GITHUB=${_PIPE_SCRIPTS_FROM_GITHUB},_PIPE_CYP_NAME_PROTEIN_ID=${_PIPE_CYP_NAME_PROTEIN_ID},_PIPE_SCRATCH_DIR=${_PIPE_SCRATCH_DIR},_PIPE_RUN_NICKNAME=${_PIPE_RUN_NICKNAME},_PIPE_ALL_DATA=${_PIPE_ALL_DATA},_PIPE_FINAL_OUTPUT_DIR=${_PIPE_FINAL_OUTPUT_DIR}" \
+    --export="_PIPE_SCRIPTS_FROM_GITHUB=${_PIPE_SCRIPTS_FROM_GITHUB},_PIPE_CYP_NAME_PROTEIN_ID=${_PIPE_CYP_NAME_PROTEIN_ID},_PIPE_SCRATCH_DIR=${_PIPE_SCRATCH_DIR},_PIPE_RUN_NICKNAME=${_PIPE_RUN_NICKNAME},_PIPE_ALL_DATA=${_PIPE_ALL_DATA},_PIPE_FINAL_OUTPUT_DIR=${_PIPE_FINAL_OUTPUT_DIR},_PIPE_STEP00_TRANSFER_MODE=${_PIPE_STEP00_TRANSFER_MODE},_PIPE_STEP00_REDUCE_ISOFORMS=${_PIPE_STEP00_REDUCE_ISOFORMS},_PIPE_STEP00_ORTHOFINDER_MODE=${_PIPE_STEP00_ORTHOFINDER_MODE},_PIPE_STEP00_SEARCH=${_PIPE_STEP00_SEARCH},_PIPE_STEP00_SEARCH_CACHE=${_PIPE_STEP00_SEARCH_CACHE},_PIPE_STEP00_SUPERSET_ORTHOGROUPS=${_PIPE_STEP00_SUPERSET_ORTHOGROUPS},_PIPE_STEP00_HOG_NODE=${_PIPE_STEP00_HOG_NODE}" \
     "${_PIPE_SCRIPTS_FROM_GITHUB}/Final_Pipeline_Scripts/00_Run_Orthofinder.sh")
 echo "Step 00: Run_Orthofinder has job ID ${STEP_00}" | tee -a "${_PIPE_EXEC_RECORD}"
 
@@ -133,7 +133,7 @@ STEP_01=$(sbatch \
     -t "${_PIPE_WALLTIME}" \
     --mem-per-cpu "${_PIPE_MEM_PER_CPU}" \
     -p "${_PIPE_PARTITION}" \
-    --export="_PIPE_SCRIPTS_FROM_GITHUB=${_PIPE_SCRIPTS_FROM_GITHUB},_PIPE_SCRATCH_DIR=${_PIPE_SCRATCH_DIR},_PIPE_RUN_NICKNAME=${_PIPE_RUN_NICKNAME},_PIPE_ALL_DATA=${_PIPE_ALL_DATA},_PIPE_FINAL_OUTPUT_DIR=${_PIPE_FINAL_OUTPUT_DIR},_PIPE_COHORT_MEMBERS=${_PIPE_COHORT_MEMBERS}" \
+    --export="_PIPE_SCRIPTS_FROM_GITHUB=${_PIPE_SCRIPTS_FROM_GITHUB},_PIPE_SCRATCH_DIR=${_PIPE_SCRATCH_DIR},_PIPE_RUN_NICKNAME=${_PIPE_RUN_NICKNAME},_PIPE_ALL_DATA=${_PIPE_ALL_DATA},_PIPE_FINAL_OUTPUT_DIR=${_PIPE_FINAL_OUTPUT_DIR},_PIPE_COHORT_MEMBERS=${_PIPE_COHORT_MEMBERS},_PIPE_BACKTRANSLATE_VERIFY=${_PIPE_BACKTRANSLATE_VERIFY},_PIPE_STEP01_KEEP_INTERMEDIATES=${_PIPE_STEP01_KEEP_INTERMEDIATES},_PIPE_STEP01_PRESELECT=${_PIPE_STEP01_PRESELECT},_PIPE_TRIM_METHOD=${_PIPE_TRIM_METHOD},_PIPE_REPRESENTATIVE_SELECTION=${_PIPE_REPRESENTATIVE_SELECTION},_PIPE_STEP01_MAFFT_SPARE_THREADS=${_PIPE_STEP01_MAFFT_SPARE_THREADS}" \
     "${_PIPE_SCRIPTS_FROM_GITHUB}/Final_Pipeline_Scripts/01_Prepare_PAML_Sequences.sh")
 echo "Step 01: Prepare_PAML_Sequences has job ID ${STEP_01}" | tee -a "${_PIPE_EXEC_RECORD}"
 
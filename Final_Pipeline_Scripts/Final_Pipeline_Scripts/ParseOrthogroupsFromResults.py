@@ -1,10 +1,25 @@
 #!/usr/bin/env python
 """Identify and copy orthogroup FASTA files with human CYPs of interest into a
-specified directory. Takes four arguments:
+specified directory. Takes four to six arguments:
     1) CSV of CYPs to keep
-    2) Orthogroups.tsv path
-    3) Directory of Orthogroup sequences
+    2) Orthogroups.tsv path, or the path to a hierarchical orthogroup (HOG)
+       table, e.g., Phylogenetic_Hierarchical_Orthogroups/N0.tsv. The HOG of
+       each CYP is used as its orthogroup, with the '.' taken out of its ID
+       (see Orthogroup_Index.py). HOGs have no sequence files in the
+       Orthofinder results, so they need 'build' (see 5).
+    3) Directory of Orthogroup sequences, or with 'build' (see 5), the CDS
+       FASTA directory or CDS store prefix (see CDS_Store.py)
     4) Destination directory
+    5) (Optional) How to put the orthogroup FASTA files into the destination
+       directory: 'copy' (default), 'hardlink', 'symlink', 'reflink', or
+       'build'. 'hardlink' and 'reflink' fall back to a copy if the file
+       system cannot do them (e.g., the two directories are on different file
+       systems). 'symlink' links to the source file, so the orthogroup
+       sequences directory has to be kept. 'build' writes the orthogroup FASTA
+       files from the members listed in Orthogroups.tsv and their CDS
+       sequences, for when Orthofinder was run with '-og' and did not write
+       the orthogroup sequences.
+    6) (Optional) Number of threads to transfer files with (default: 8)
 
 The CSV should have two columns:
     1: CYP name
@@ -22,16 +37,39 @@ import sys
 import pprint
 import shutil
 import os
+import errno
+import concurrent.futures
+
+from Orthogroup_Index import open_og_index, species_names, accession_orthogroups
+from Orthogroup_Index import orthogroup_members, read_table_header, is_hog_table
+from Compressed_IO import COMPRESSED_SUFFIXES
+from CDS_Store import fetch_cds_record
+from Fasta_Index import fetch_sequence
+from Fasta_IO import FastaRecord, write_fasta
 
 try:
     cyp_table = sys.argv[1]
     og_table = sys.argv[2]
     og_results_dir = sys.argv[3]
     cyp_dest_dir = sys.argv[4]
-except IndexError:
+    transfer_mode = sys.argv[5] if len(sys.argv) > 5 else 'copy'
+    transfer_threads = int(sys.argv[6]) if len(sys.argv) > 6 else 8
+except (IndexError, ValueError):
     sys.stderr.write(__doc__ + '\n')
     sys.exit(1)
 
+# Allowed ways to put the orthogroup FASTA files into the destination directory
+TRANSFER_MODES = ('copy', 'hardlink', 'symlink', 'reflink')
+# Modes of putting the orthogroup FASTA files into the destination directory:
+# the transfer modes, or building them from the CDS sequences
+OG_FASTA_MODES = TRANSFER_MODES + ('build',)
+# ioctl request number of FICLONE (linux/fs.h), which makes a copy-on-write
+# clone of a file on file systems that support it (Btrfs, XFS, ...)
+FICLONE = 0x40049409
+# errno values that mean a link or clone cannot be made between the two paths,
+# so we fall back to a copy
+NO_LINK_ERRNOS = (errno.EXDEV, errno.EPERM, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EINVAL, errno.ENOTTY, errno.EMLINK)
+
 
 def parse_cyp_table(ct):
     """Parse a CSV that holds the CYP-protein ID assocation. The first column
@@ -55,97 +93,167 @@ def parse_cyp_table(ct):
     return proteins_of_interest
 
 
-def get_og_fasta_files(orthofinder_results_dir, og_list, target_cyp_dir):
-    """Crawl through the orthofinder results directory to copy the target orthogroup
-    FASTA files into a special destination directory, to be copied to GCS."""
+def reflink_file(src_fname, dest_fname):
+    """Make dest_fname a copy-on-write clone of src_fname with the FICLONE
+    ioctl, and copy the file metadata like shutil.copy2() does. Raises OSError
+    if the file system cannot clone the file."""
+    import fcntl
+    with open(src_fname, 'rb') as src_handle, open(dest_fname, 'wb') as dest_handle:
+        fcntl.ioctl(dest_handle.fileno(), FICLONE, src_handle.fileno())
+    shutil.copystat(src_fname, dest_fname)
+    return
+
+
+def transfer_file(src_fname, dest_fname, mode='copy'):
+    """Put a file into the destination path with one of TRANSFER_MODES. Any
+    file that is already at the destination path is replaced. Hard links and
+    clones that the file system cannot make are done as copies instead."""
+    if mode == 'copy':
+        # Use the shutil.copy2() function so that the file metadata, such as
+        # acess and modifictaion timestamps, are preserved. File timestamps
+        # are useful to distinguish when a given file was made and when a
+        # particular analysis was performed.
+        shutil.copy2(src_fname, dest_fname)
+        return
+    # Links are not made over an existing file, so remove the old one first
+    if os.path.lexists(dest_fname):
+        os.remove(dest_fname)
     try:
-        orthofinder_ab_path = os.path.abspath(os.path.expanduser(orthofinder_results_dir))
-        filepaths = os.listdir(orthofinder_ab_path)
-    except (OSError, IOError):
+        if mode == 'hardlink':
+            os.link(src_fname, dest_fname)
+        elif mode == 'symlink':
+            os.symlink(src_fname, dest_fname)
+        elif mode == 'reflink':
+            reflink_file(src_fname, dest_fname)
+        else:
+            raise ValueError('Unknown transfer mode: ' + str(mode))
+    except OSError as err:
+        if mode == 'symlink' or err.errno not in NO_LINK_ERRNOS:
+            raise
+        if os.path.lexists(dest_fname):
+            os.remove(dest_fname)
+        shutil.copy2(src_fname, dest_fname)
+    return
+
+
+def find_og_fasta(orthofinder_ab_path, orthogroup_name):
+    """Return the file name of the FASTA file of an orthogroup in the
+    Orthofinder results directory: OGXXXXX.fa, or a compressed copy of it
+    (e.g., OGXXXXX.fa.gz) from an archived run. Returns None if there is
+    neither."""
+    # ORTHOGROUPS END IN .FA at present stage
+    for suffix in ('',) + COMPRESSED_SUFFIXES:
+        fname = orthogroup_name + '.fa' + suffix
+        if os.path.isfile(os.path.join(orthofinder_ab_path, fname)):
+            return fname
+    return None
+
+
+def get_og_fasta_files(orthofinder_results_dir, og_list, target_cyp_dir, mode='copy', n_threads=8):
+    """Copy (or link, see TRANSFER_MODES) the target orthogroup FASTA files from
+    the orthofinder results directory into a special destination directory, to
+    be copied to GCS. Compressed files keep their name (OGXXXXX.fa.gz), since
+    the step 01 scripts read them as they are."""
+    # 2026-10-16: The orthogroup sequence directory holds one file per
+    # orthogroup (tens of thousands), so rather than list the whole directory
+    # and test every file, build the set of target orthogroups once and open
+    # their files by name. The files are transferred by a pool of threads, so
+    # that the waits on the parallel file system overlap.
+    orthofinder_ab_path = os.path.abspath(os.path.expanduser(orthofinder_results_dir))
+    if not os.path.isdir(orthofinder_ab_path):
         print('The Orthofinder results directory supplied is not readable, or does not exist!')
         exit(1)
-    try:
-        target_ab_path = os.path.abspath(os.path.expanduser(target_cyp_dir))
-    except (OSError, IOError):
+    target_ab_path = os.path.abspath(os.path.expanduser(target_cyp_dir))
+    if not os.path.isdir(target_ab_path):
         print('The target CYP directory supplied is not readable, or does not exist!')
         exit(1)
-    for fasta_file in filepaths:
-        if fasta_file.endswith('.fa'): #ORTHOGROUPS END IN .FA at present stage
-            orthogroup_name = fasta_file.split('.')[0] #doesnt exactly matter, just taking the OG name not file extension or the period
-            # If the OG name is in the list of OGs of interest (orthogroups that have CYP genes)
-            if orthogroup_name in set(og_list.values()):
-                # Copy the orthogroup sequence file into the destination dir
-                # Use the shutil.copy2() function so that the file metadata, such as
-                # acess and modifictaion timestamps, are preserved. File timestamps
-                # are useful to distinguish when a given file was made and when a
-                # particular analysis was performed.
-                #   First: build the destination filename
-                dest_fname = os.path.join(target_ab_path, orthogroup_name + '.fa')
-                #   Second: build the source filename
-                src_fname = os.path.join(orthofinder_ab_path, orthogroup_name + '.fa')
-                #   Third: copy the file
-                shutil.copy2(src_fname, dest_fname)
+    transfers = []
+    # Orthogroup IDs of interest (orthogroups that have CYP genes)
+    for orthogroup_name in sorted(set(og_list.values())):
+        fasta_name = find_og_fasta(orthofinder_ab_path, orthogroup_name)
+        if fasta_name is None:
+            sys.stderr.write('There is no sequence file for orthogroup ' + orthogroup_name + ' in ' + orthofinder_ab_path + '\n')
+            continue
+        transfers.append((os.path.join(orthofinder_ab_path, fasta_name), os.path.join(target_ab_path, fasta_name)))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, n_threads)) as pool:
+        futures = [pool.submit(transfer_file, src_fname, dest_fname, mode) for src_fname, dest_fname in transfers]
+        # Raise the first error, if there was one
+        for future in futures:
+            future.result()
+    return
+
+
+def build_og_fasta_files(cds_source, og_table, og_list, target_cyp_dir):
+    """Write the target orthogroup FASTA files into the destination directory
+    from the members of each orthogroup in the Orthogroups.tsv index and their
+    sequences in the CDS FASTA files (or CDS store). This replaces the
+    Orthogroup_Sequences directory when Orthofinder is stopped after it infers
+    the orthogroups (-og), so it does not have to write a FASTA file for every
+    orthogroup. Like the Orthofinder files, the sequences are in the order of
+    Orthogroups.tsv and are written on one line."""
+    # Backtranslate_AA_aligned imports NumPy, so only import it in this mode
+    from Backtranslate_AA_aligned import list_files
+    target_ab_path = os.path.abspath(os.path.expanduser(target_cyp_dir))
+    if not os.path.isdir(target_ab_path):
+        print('The target CYP directory supplied is not readable, or does not exist!')
+        exit(1)
+    # list_files() has already decided whether each species is read from a CDS
+    # store or from its FASTA file, so nothing is checked per sequence
+    paths = list_files(cds_source)
+    og_index = open_og_index(og_table)
+    missing_species = set()
+    for orthogroup_name in sorted(set(og_list.values())):
+        records = []
+        for prot_id, sp_name in orthogroup_members(og_index, orthogroup_name):
+            cds_source_sp = paths.get(sp_name)
+            if cds_source_sp is None:
+                if sp_name not in missing_species:
+                    sys.stderr.write('There is no CDS file for species ' + sp_name + '; its orthogroup members are left out.\n')
+                    missing_species.add(sp_name)
+                continue
+            if cds_source_sp.is_store:
+                # A CDS store keeps the whole NCBI header, and gives it with
+                # the sequence from one lookup
+                cds_record = fetch_cds_record(cds_source_sp.path, prot_id)
+                if cds_record is None:
+                    sys.stderr.write('[fetch_cds] Could not find ' + prot_id + ' in ' + cds_source_sp.path + '\n')
+                    continue
+                cds, description = cds_record
+            else:
+                # A FASTA index does not keep the header
+                cds = fetch_sequence(cds_source_sp.path, prot_id)
+                description = prot_id
+            if not cds:
+                # The missing sequence has already been warned about
+                continue
+            records.append(FastaRecord(prot_id, description, cds))
+        with open(os.path.join(target_ab_path, orthogroup_name + '.fa'), 'wt') as out_handle:
+            write_fasta(records, out_handle, line_width=None)
+    og_index.close()
     return
 
 
 def scan_ogs_for_cyps(c_dict, og_table):
-    """Scan through the Orthogroups.tsv file to identify orthogroups that have
-    human CYP genes of interest. Return a dictionary keyed on CYP name that
-    has the orthogroup data as the value."""
-    try:
-        fh = open(og_table, 'rt')
-        fh.close()
-    except (FileNotFoundError, OSError):
+    """Look up the orthogroups that have human CYP genes of interest in the
+    index of the Orthogroups.tsv file (or HOG table, where the group of each
+    CYP is the HOG at the node of the table, which is smaller than its
+    orthogroup for big families). Return a dictionary keyed on the NCBI
+    protein ID of the CYP that has the orthogroup ID as the value."""
+    # 2026-10-16: Query the Orthogroups.tsv index (see Orthogroup_Index.py)
+    # instead of scanning the whole table. The index is built or refreshed
+    # here if it is missing or older than the TSV. The index stores the bare
+    # NCBI protein ID (e.g., "NP_001268900.1") of every protein, so each CYP
+    # is a single lookup.
+    og_index = open_og_index(og_table)
+    if 'Homo_sapiens' not in species_names(og_index):
         sys.stderr.write(
-            'The Orthogroups.tsv file does not exist, or is not readable.\n')
+            'The Orthogroups.tsv file does not have a "Homo_sapens" column.')
         sys.exit(1)
-    ogs_of_interest = dict()
-    with open(og_table, 'rt') as f:
-        for line_number, line in enumerate(f):
-            if line_number == 0:
-                # line is a string-type variable. string.strip() [strip is the
-                # method] returns a copy of 'string' with whitespace removed
-                # from the ends. string.split('\t') will "break" a string on
-                # tab characters, and return a list.
-                # Thus, line.strip().split('\t') returns a list of column
-                # names from the TSV file.
-                header = line.strip().split('\t')
-                # Find out which column is called 'Homo_sapiens'
-                try:
-                    hs_column = header.index('Homo_sapiens')
-                except ValueError:
-                    sys.stderr.write(
-                        'The Orthogroups.tsv file does not have a "Homo_sapens" column.')
-                    sys.exit(1)
-            else:
-                # Explicitly strip only newlines from the Orthogroups.tsv file because
-                # cases in which a species does not have proteins in a OG, it will
-                # have just an empty column. string.strip() will remove these,
-                # but they are meaningful, so we need to retain them.
-                og_row = line.strip('\n').split('\t')
-                # Orthogroup ID is the first column
-                og_id = og_row[0]
-                # Isolating the human protein IDs that are part of this orthogroup
-                hum_prots = og_row[hs_column]
-                # Split the comma+space separated string into a list
-                hum_prots_list = hum_prots.split(', ')
-                for hp in hum_prots_list:
-                    # Isolate just the NCBI protein ID from the complicated name
-                    # that the proteins have in the Orthogroups.tsv file:
-                    # Orthogroups.tsv has entries like lcl|NC_000019.10_cds_NP_001268900.1_117358
-                    # We need just the "NP_001268900.1" bit.
-                    p_id = '_'.join(hp.split('_')[-3:-1])
-                    # Now we can check if the protein ID is in the set of CYPs
-                    # of interest
-                    if p_id in c_dict:
-                        # 2024-02-18: Edit to report all human CYPs in an orthogroup if
-                        # there are multiple human CYPs in the orthogroup. This addresses
-                        # the issue of 'NA' appearing in the CYP->OG CSV table.
-                        cyp_of_interest = p_id
-                        ogs_of_interest[cyp_of_interest] = og_id
-                    else:
-                        continue
-    # Now we are done scanning the file. Return the dictionary
+    # 2024-02-18: Report all human CYPs in an orthogroup if there are
+    # multiple human CYPs in the orthogroup. This addresses the issue of 'NA'
+    # appearing in the CYP->OG CSV table.
+    ogs_of_interest = accession_orthogroups(og_index, c_dict, 'Homo_sapiens')
+    og_index.close()
     return ogs_of_interest
 
 
@@ -167,19 +275,29 @@ def print_cyp_ogs(c_dict, co_dict):
     return
 
 
-def main(c_table, o_table, o_dir, dest_dir):
+def main(c_table, o_table, o_dir, dest_dir, mode, n_threads):
     """Main function"""
     # Read the data from the CYP-Protein ID CSV into a dictionary
     cyp_dict = parse_cyp_table(c_table)
     # Scan through the orthogroups.tsv file and print the information for
     # those with CYPs of interest
     cyp_og_dict = scan_ogs_for_cyps(cyp_dict, o_table)
-    # Copy the orthogroup sequences into the destination directory
-    get_og_fasta_files(o_dir, cyp_og_dict, dest_dir)
+    # Copy the orthogroup sequences into the destination directory, or build
+    # them from the CDS sequences if Orthofinder did not write them
+    if mode == 'build':
+        build_og_fasta_files(o_dir, o_table, cyp_og_dict, dest_dir)
+    else:
+        get_og_fasta_files(o_dir, cyp_og_dict, dest_dir, mode, n_threads)
     # Next, print a CSV (with header) of CYP name, protein ID, and orthogroup ID
     print_cyp_ogs(cyp_dict, cyp_og_dict)
     return
 
 
 
-main(cyp_table, og_table, og_results_dir, cyp_dest_dir)
\ No newline at end of file
+if transfer_mode not in OG_FASTA_MODES:
+    sys.stderr.write('The transfer mode should be one of: ' + ', '.join(OG_FASTA_MODES) + '\n')
+    sys.exit(1)
+if transfer_mode != 'build' and is_hog_table(read_table_header(og_table)):
+    sys.stderr.write('The FASTA files of hierarchical orthogroups can only be made with the build mode.\n')
+    sys.exit(1)
+main(cyp_table, og_table, og_results_dir, cyp_dest_dir, transfer_mode, transfer_threads)
\ No newline at end of file
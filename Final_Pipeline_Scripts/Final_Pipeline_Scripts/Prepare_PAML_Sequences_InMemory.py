@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+"""
+Run the whole step 01 chain for one orthogroup in memory: translate, align
+with MAFFT-linsi, backtranslate, and select representative orthologues. If
+pre-alignment selection is on, the representative orthologues are picked
+before translation (see Preselect_Representative_Orthologs.py), so that only
+they are aligned and backtranslated. Pre-alignment selection only applies
+to the 'length' selection mode, since the 'identity' mode needs the whole
+alignment (see Choose_Representative_Orthologs.py). The
+amino acid sequences are piped to MAFFT-linsi over stdin/stdout, and only the
+final OGXXXXX_RepOrthologues.fa is written to disk. This avoids writing and
+re-reading three intermediate FASTA files per orthogroup on the scratch file
+system. The steps are the same functions that the individual scripts use
+(Translate_Orthogroup_Sequences.py, Backtranslate_AA_aligned.py, and
+Choose_Representative_Orthologs.py), so the output is the same.
+
+For debugging, the intermediate files (OGXXXXX_AA.fa, OGXXXXX_AA_Aligned.fa,
+and OGXXXXX_Backtranslated.fa) can still be written by giving the directories
+to put them in.
+
+Requires NumPy. This is called for each orthogroup by
+Prepare_PAML_Sequences_Parallel.py, but it can also be run on a single
+orthogroup. Takes five to twelve arguments:
+    1) Orthogroup FASTA file (OGXXXXX.fa)
+    2) CDS FASTA directory or CDS store prefix (see Backtranslate_AA_aligned.py)
+    3) Orthogroups.tsv path
+    4) CYP-ProteinID-Orthogroup CSV
+    5) Output directory for PAML sequence inputs (OGXXXXX_RepOrthologues.fa)
+    6) (Optional) Codon concordance check: 'off' (default), 'flag', or 'drop'.
+       The report is written to standard error.
+    7) (Optional) Select the representative orthologues before alignment:
+       'yes' or 'no' (default)
+    8) (Optional) Column trimming method (see Alignment_Trimming.py); default
+       'gap'
+    9) (Optional) Representative selection mode: 'length' (default) or
+       'identity' (see Choose_Representative_Orthologs.py)
+    10-12) (Optional) Directories to write the translated, aligned, and
+       backtranslated intermediate files into
+
+The reports of masked STOP codons (see Choose_Representative_Orthologs.py) and
+of trimmed columns are also written to standard error.
+
+Usage:
+
+python /path/to/Prepare_PAML_Sequences_InMemory.py /path/to/OGXXXXX.fa CDS_SOURCE Orthogroups.tsv CYP_CSV PAML_SEQ_DIR [VERIFY] [PRESELECT] [TRIM_METHOD] [SELECTION] [AA_DIR ALIGN_DIR BACKTRANSLATED_DIR]
+"""
+
+import sys
+import os
+import io
+import subprocess
+import functools
+
+from Fasta_IO import read_fasta, write_fasta
+from Translate_Orthogroup_Sequences import translate_records
+from Backtranslate_AA_aligned import list_files, backtranslate_records, write_backtranslated, REPORT_HEADER, VERIFY_MODES
+from Choose_Representative_Orthologs import generate_gene_lookup, choose_representatives, write_stop_report, SELECTION_MODES
+from Alignment_Trimming import TRIM_METHODS, write_trim_report
+from Orthogroup_Index import open_og_index
+from Preselect_Representative_Orthologs import preselect_fasta
+
+
+@functools.lru_cache(maxsize=None)
+def stage_resources(cds_source, og_tsv, cyp_csv):
+    """Set up the CDS file list, the Orthogroups.tsv index, and the human CYP
+    lookup. This is cached, so that a worker process that handles many
+    orthogroups only sets them up once."""
+    paths = list_files(cds_source)
+    og_index = open_og_index(og_tsv)
+    og_human_lookup = generate_gene_lookup(cyp_csv)
+    return paths, og_index, og_human_lookup
+
+
+def align_in_memory(aa_fasta_text, mafft_threads=1):
+    """Align amino acid FASTA text with MAFFT-linsi, passing the sequences on
+    stdin and reading the alignment from stdout. Returns the alignment as FASTA
+    text. Raises subprocess.CalledProcessError if MAFFT fails. More than one
+    MAFFT thread can give a different alignment than a single thread."""
+    mafft_cmd = ['mafft-linsi', '--maxiterate', '1000']
+    if mafft_threads > 1:
+        mafft_cmd += ['--thread', str(mafft_threads)]
+    # MAFFT reads the input from stdin when the file name is '-'
+    mafft_cmd.append('-')
+    proc = subprocess.run(mafft_cmd, input=aa_fasta_text.encode('ascii'), stdout=subprocess.PIPE, check=True)
+    return proc.stdout.decode('ascii')
+
+
+def spill(text, out_dir, fname):
+    """Write an intermediate file for debugging, if a directory was given."""
+    if out_dir is None:
+        return
+    with open(os.path.join(out_dir, fname), 'wt') as f:
+        f.write(text)
+    return
+
+
+def prepare_orthogroup(og_id, og_fasta, cds_source, og_tsv, cyp_csv, paml_seq_dir, verify='off', mafft_threads=1, spill_dirs=(None, None, None), preselect=False, trim_method='gap', selection='length'):
+    """Translate, align, backtranslate, and select representative orthologues
+    for one orthogroup, and write OGXXXXX_RepOrthologues.fa. If 'preselect' is
+    True and 'selection' is 'length', only the representative orthologues are
+    translated. Columns are trimmed with 'trim_method' (see
+    Alignment_Trimming.py). 'spill_dirs' are
+    the directories for the translated, aligned, and backtranslated
+    intermediate files; None means the file is not written. Returns the codon
+    concordance report rows, the STOP codon report rows, and the trim report
+    row for the orthogroup."""
+    paths, og_index, og_human_lookup = stage_resources(cds_source, og_tsv, cyp_csv)
+    aa_dir, align_dir, backtranslated_dir = spill_dirs
+    #	First, translate the orthogroup sequence to amino acid
+    if preselect and selection == 'length':
+        og_records = preselect_fasta(og_fasta, og_index, og_human_lookup)
+    else:
+        og_records = read_fasta(og_fasta)
+    aa_handle = io.StringIO()
+    write_fasta(translate_records(og_records), aa_handle)
+    aa_text = aa_handle.getvalue()
+    spill(aa_text, aa_dir, og_id + '_AA.fa')
+    # 	Second, align the amino acids with MAFFT-linsi
+    aligned_text = align_in_memory(aa_text, mafft_threads)
+    spill(aligned_text, align_dir, og_id + '_AA_Aligned.fa')
+    #	Third, backtranslate the aligned amino acids to nucleotide
+    aln = list(read_fasta(io.StringIO(aligned_text)))
+    bt_records, report_rows = backtranslate_records(aln, paths, og_index, verify, og_id + '_AA_Aligned.fa')
+    bt_handle = io.StringIO()
+    write_backtranslated(bt_records, bt_handle)
+    spill(bt_handle.getvalue(), backtranslated_dir, og_id + '_Backtranslated.fa')
+    #	Fourth, select one representative orthologue from each species, fix names for PAML, and replace gap (-) with question mark (?)
+    bt_handle.seek(0)
+    with open(os.path.join(paml_seq_dir, og_id + '_RepOrthologues.fa'), 'wt') as out_handle:
+        stop_rows, trim_row = choose_representatives(bt_handle, og_id, og_human_lookup, out_handle, trim_method, selection)
+    return report_rows, stop_rows, trim_row
+
+
+def main(og_fasta, cds_source, og_tsv, cyp_csv, paml_seq_dir, verify, preselect, trim_method, selection, spill_dirs):
+    """Main function."""
+    og_id = os.path.basename(og_fasta).split('.')[0]
+    for out_dir in (paml_seq_dir,) + spill_dirs:
+        if out_dir is not None:
+            os.makedirs(out_dir, exist_ok=True)
+    report_rows, stop_rows, trim_row = prepare_orthogroup(og_id, og_fasta, cds_source, og_tsv, cyp_csv, paml_seq_dir, verify, 1, spill_dirs, preselect, trim_method, selection)
+    if verify != 'off':
+        sys.stderr.write('\t'.join(REPORT_HEADER) + '\n')
+        for report_row in report_rows:
+            sys.stderr.write('\t'.join(report_row) + '\n')
+    write_stop_report(stop_rows, sys.stderr)
+    write_trim_report([trim_row], sys.stderr)
+    return
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 6:
+        sys.stderr.write(__doc__ + '\n')
+        sys.exit(1)
+    verify_mode = sys.argv[6] if len(sys.argv) > 6 else 'off'
+    if verify_mode not in VERIFY_MODES:
+        sys.stderr.write('The codon concordance check should be one of: ' + ', '.join(VERIFY_MODES) + '\n')
+        sys.exit(1)
+    preselect_mode = sys.argv[7] if len(sys.argv) > 7 else 'no'
+    if preselect_mode not in ('yes', 'no'):
+        sys.stderr.write('Pre-alignment selection should be yes or no.\n')
+        sys.exit(1)
+    trim_method_arg = sys.argv[8] if len(sys.argv) > 8 else 'gap'
+    if trim_method_arg not in TRIM_METHODS:
+        sys.stderr.write('The trimming method should be one of: ' + ', '.join(TRIM_METHODS) + '\n')
+        sys.exit(1)
+    selection_mode = sys.argv[9] if len(sys.argv) > 9 else 'length'
+    if selection_mode not in SELECTION_MODES:
+        sys.stderr.write('The representative selection mode should be one of: ' + ', '.join(SELECTION_MODES) + '\n')
+        sys.exit(1)
+    if len(sys.argv) > 10:
+        if len(sys.argv) < 13:
+            sys.stderr.write(__doc__ + '\n')
+            sys.exit(1)
+        intermediate_dirs = tuple(sys.argv[10:13])
+    else:
+        intermediate_dirs = (None, None, None)
+    main(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], verify_mode, preselect_mode == 'yes', trim_method_arg, selection_mode, intermediate_dirs)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+"""
+Run the step 01 translate -> align -> backtranslate -> select representative
+orthologues chain for every target orthogroup, with the orthogroups spread
+over a pool of worker processes. The orthogroups are independent of each
+other, so this gives the same files as running them one after another.
+
+Each worker runs the whole chain for one orthogroup in memory (see
+Prepare_PAML_Sequences_InMemory.py), and only writes OGXXXXX_RepOrthologues.fa.
+The translated, aligned, and backtranslated intermediate files are only
+written if they are asked for (for debugging). With pre-alignment selection,
+only the representative orthologues of each orthogroup are aligned (see
+Preselect_Representative_Orthologs.py); this is skipped with the 'identity'
+representative selection mode, which needs the whole alignment. The orthogroups are started
+largest-first (by the estimated MAFFT cost: number of sequences squared times
+length squared), so that the big ones do not hold up the end of the job.
+
+The number of CPUs is read from the SLURM_CPUS_PER_TASK environment variable
+(1 if it is not set). The number of workers defaults to one per CPU, but is
+never more than the number of orthogroups. Each MAFFT job runs with one
+thread, which gives the same alignments as the serial run. If spare MAFFT
+threads are turned on (argument 14), the CPUs that are left over when there are
+fewer orthogroups than CPUs are shared out to the MAFFT jobs as threads
+instead. This is faster, but multithreaded MAFFT-linsi does not always give
+the same alignment as a single thread, so the output is not reproducible.
+
+If the codon concordance check is on, the report for all orthogroups is
+written to Backtranslation_Concordance_Report.tsv in the backtranslated
+orthogroup directory. The STOP codons that were masked in every sequence (see
+Choose_Representative_Orthologs.py) are written to Stop_Codon_Report.tsv, and
+the columns trimmed from every orthogroup (see Alignment_Trimming.py) are
+written to Trim_Report.tsv, both in the PAML sequence input directory.
+
+Takes thirteen to fifteen arguments:
+    1) Directory of target orthogroup FASTA files (Step_00_Orthofinder_TargetOGs)
+    2) CDS FASTA directory or CDS store prefix (see Backtranslate_AA_aligned.py)
+    3) Orthogroups.tsv path
+    4) CYP-ProteinID-Orthogroup CSV
+    5) Output directory for translated orthogroups (OGXXXXX_AA.fa)
+    6) Output directory for aligned orthogroups (OGXXXXX_AA_Aligned.fa)
+    7) Output directory for backtranslated orthogroups (OGXXXXX_Backtranslated.fa)
+    8) Output directory for PAML sequence inputs (OGXXXXX_RepOrthologues.fa)
+    9) Codon concordance check: 'off', 'flag', or 'drop'
+    10) Write the intermediate files to directories 5-7: 'yes' or 'no'
+    11) Select the representative orthologues before alignment: 'yes' or 'no'
+    12) Column trimming method: gap, codon_gap, entropy, or gappyout
+    13) Representative selection mode: 'length' or 'identity' (see
+        Choose_Representative_Orthologs.py)
+    14) (Optional) Give the spare CPUs to MAFFT as threads: 'yes' or 'no'
+        (default 'no'; see above)
+    15) (Optional) Number of workers
+
+Usage:
+
+python /path/to/Prepare_PAML_Sequences_Parallel.py TARGET_OG_DIR CDS_SOURCE Orthogroups.tsv CYP_CSV AA_DIR ALIGN_DIR BACKTRANSLATED_DIR PAML_SEQ_DIR VERIFY KEEP_INTERMEDIATES PRESELECT TRIM_METHOD SELECTION [MAFFT_SPARE_THREADS] [N_WORKERS]
+"""
+
+import sys
+import os
+import subprocess
+import concurrent.futures
+
+from Prepare_PAML_Sequences_InMemory import prepare_orthogroup
+from Backtranslate_AA_aligned import REPORT_HEADER
+from Choose_Representative_Orthologs import write_stop_report, SELECTION_MODES
+from Alignment_Trimming import TRIM_METHODS, write_trim_report
+from Compressed_IO import open_compressed, strip_compression_suffix
+
+
+def available_cpus():
+    """Return the number of CPUs that Slurm gave the job, or 1 if we are not
+    running under Slurm."""
+    try:
+        return max(1, int(os.environ.get('SLURM_CPUS_PER_TASK', '1')))
+    except ValueError:
+        return 1
+
+
+def list_target_ogs(target_dir):
+    """Return a dictionary of orthogroup ID -> FASTA path for the target
+    orthogroup FASTA files, which may be compressed (OGXXXXX.fa.gz)."""
+    og_files = dict()
+    for fname in os.listdir(target_dir):
+        if strip_compression_suffix(fname).endswith('.fa'):
+            og_id = fname.split('.')[0]
+            og_files[og_id] = os.path.join(os.path.abspath(target_dir), fname)
+    return og_files
+
+
+def estimate_alignment_cost(og_fasta):
+    """Estimate the relative cost of aligning an orthogroup with MAFFT-linsi,
+    which grows with the square of the number of sequences and the square of
+    their length."""
+    n_seqs = 0
+    total_len = 0
+    with open_compressed(og_fasta, 'rt') as f:
+        for line in f:
+            if line.startswith('>'):
+                n_seqs += 1
+            else:
+                total_len += len(line.strip())
+    if n_seqs == 0:
+        return 0
+    mean_len = total_len / n_seqs
+    return (n_seqs ** 2) * (mean_len ** 2)
+
+
+def run_pool(n_workers, func, arg_lists):
+    """Run 'func' over the argument lists in a pool of worker processes, in the
+    order given. Stop with an error if any of them fails. Returns the results
+    in the same order as the argument lists."""
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as pool:
+        futures = [pool.submit(func, *args) for args in arg_lists]
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                future.result()
+            except subprocess.CalledProcessError as err:
+                sys.stderr.write('Step 01 command failed: ' + ' '.join(err.cmd) + '\n')
+                for pending in futures:
+                    pending.cancel()
+                sys.exit(1)
+    return [future.result() for future in futures]
+
+
+def main(target_dir, cds_source, og_tsv, cyp_csv, aa_dir, align_dir, backtranslated_dir, paml_seq_dir, verify, keep_intermediates, preselect, trim_method, selection, mafft_spare_threads, n_workers):
+    """Main function."""
+    og_files = list_target_ogs(target_dir)
+    if not og_files:
+        return
+    out_dirs = [paml_seq_dir]
+    if keep_intermediates == 'yes':
+        spill_dirs = (aa_dir, align_dir, backtranslated_dir)
+        out_dirs += spill_dirs
+    else:
+        spill_dirs = (None, None, None)
+    if verify != 'off':
+        out_dirs.append(backtranslated_dir)
+    for out_dir in out_dirs:
+        os.makedirs(out_dir, exist_ok=True)
+    n_cpus = available_cpus()
+    if n_workers is None:
+        n_workers = n_cpus
+    n_workers = max(1, min(n_workers, len(og_files)))
+    # Multithreaded MAFFT is not reproducible, so only use it if asked to
+    mafft_threads = max(1, n_cpus // n_workers) if mafft_spare_threads == 'yes' else 1
+    # Largest orthogroups first
+    og_order = sorted(og_files, key=lambda og: estimate_alignment_cost(og_files[og]), reverse=True)
+    results = run_pool(
+        n_workers, prepare_orthogroup,
+        [(og_id, og_files[og_id], cds_source, og_tsv, cyp_csv, paml_seq_dir, verify, mafft_threads, spill_dirs, preselect == 'yes', trim_method, selection) for og_id in og_order])
+    # Write the reports in orthogroup order, like the batch backtranslation does
+    og_results = dict(zip(og_order, results))
+    if verify != 'off':
+        with open(os.path.join(backtranslated_dir, 'Backtranslation_Concordance_Report.tsv'), 'wt') as report_handle:
+            report_handle.write('\t'.join(REPORT_HEADER) + '\n')
+            for og_id in sorted(og_results):
+                for report_row in og_results[og_id][0]:
+                    report_handle.write('\t'.join(report_row) + '\n')
+    with open(os.path.join(paml_seq_dir, 'Stop_Codon_Report.tsv'), 'wt') as stop_handle:
+        write_stop_report([stop_row for og_id in sorted(og_results) for stop_row in og_results[og_id][1]], stop_handle)
+    with open(os.path.join(paml_seq_dir, 'Trim_Report.tsv'), 'wt') as trim_handle:
+        write_trim_report([og_results[og_id][2] for og_id in sorted(og_results)], trim_handle)
+    return
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 14:
+        sys.stderr.write(__doc__ + '\n')
+        sys.exit(1)
+    step01_args = sys.argv[1:14]
+    if step01_args[11] not in TRIM_METHODS:
+        sys.stderr.write('The trimming method should be one of: ' + ', '.join(TRIM_METHODS) + '\n')
+        sys.exit(1)
+    if step01_args[12] not in SELECTION_MODES:
+        sys.stderr.write('The representative selection mode should be one of: ' + ', '.join(SELECTION_MODES) + '\n')
+        sys.exit(1)
+    spare_threads = sys.argv[14] if len(sys.argv) > 14 else 'no'
+    if spare_threads not in ('yes', 'no'):
+        sys.stderr.write('Giving the spare CPUs to MAFFT should be yes or no.\n')
+        sys.exit(1)
+    try:
+        workers = int(sys.argv[15]) if len(sys.argv) > 15 else None
+    except ValueError:
+        sys.stderr.write('The number of workers should be an integer.\n')
+        sys.exit(1)
+    main(*step01_args, mafft_spare_threads=spare_threads, n_workers=workers)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+Select the representative orthologues of an orthogroup *before* it is
+translated and aligned, so that only those sequences go through MAFFT-linsi
+and backtranslation. MAFFT-linsi takes roughly O(N^2 L^2) time, and most of
+the paralogues and isoforms of each species in an orthogroup are thrown away
+by Choose_Representative_Orthologs.py after alignment anyway.
+
+The rule is the same one that pick_representative_ortholog() in
+Choose_Representative_Orthologs.py applies after alignment:
+    - Keep every human sequence whose NCBI protein ID is in the
+      CYP-ProteinID-Orthogroup CSV.
+    - For every other species, keep the sequence with the fewest '?'
+      characters in the backtranslated alignment. Ties go to the first such
+      sequence in the orthogroup.
+Sequences are grouped into species by the first seven characters of their
+PAML name (Gen.spe), exactly like generate_fasta_dictionary() does.
+
+Why this is the same sequence: every row of the backtranslated alignment has
+the same length, 3 * A, where A is the number of aligned columns. A row gets a
+codon for each of its residues and '???' for each of its gaps, so a sequence
+with R residues has 3 * (A - R) '?' characters. Therefore, the fewest '?'
+characters is the most residues, and R is the length of the translated
+sequence, len(CDS) // 3, which is known before alignment. MAFFT-linsi keeps
+the input order of the sequences, so "first in the alignment" is "first in
+the orthogroup FASTA". This holds as long as the CDS that is fetched for
+backtranslation is the same sequence as the one in the orthogroup FASTA, which
+it is in this pipeline (both come from the same CDS files). The one case where
+the results can differ is the 'drop' codon concordance check: it runs after
+backtranslation, so if it drops a representative, the post-alignment rule
+would have fallen back to the next-best sequence of that species.
+
+The kept sequences are written in the order that Choose_Representative_Orthologs.py
+writes them: species in the order in which they first appear in the orthogroup,
+with the human sequences in their input order.
+
+Takes three or four arguments:
+    1) Orthogroup FASTA file (OGXXXXX.fa)
+    2) Orthogroups.tsv path
+    3) CYP-ProteinID-Orthogroup CSV
+    4) (Optional) Backtranslated alignment of the full orthogroup
+       (OGXXXXX_Backtranslated.fa). If given, nothing is written; instead, the
+       pre-alignment selection is checked against the selection that
+       Choose_Representative_Orthologs.py makes on the alignment, and the
+       script exits with an error if they differ.
+
+Usage:
+
+python /path/to/Preselect_Representative_Orthologs.py OGXXXXX.fa Orthogroups.tsv CYP_CSV > OGXXXXX_Preselected.fa
+python /path/to/Preselect_Representative_Orthologs.py OGXXXXX.fa Orthogroups.tsv CYP_CSV OGXXXXX_Backtranslated.fa
+"""
+
+import sys
+
+from Fasta_IO import read_fasta, write_fasta
+from Orthogroup_Index import open_og_index, species_lookup
+from Backtranslate_AA_aligned import generate_paml_name
+from Choose_Representative_Orthologs import generate_gene_lookup, generate_fasta_dictionary, pick_representative_ortholog
+
+
+def preselect_representatives(og_records, prot_species_key, og_human_lookup):
+    """Select the representative orthologues from a list of unaligned
+    orthogroup FASTA records (see Fasta_IO.py), with the rule described in the
+    module doc string. 'prot_species_key' is a dictionary of protein ID ->
+    species name for the records. Returns the list of records to keep."""
+    species_groups = dict()
+    for record in og_records:
+        paml_name = generate_paml_name(record.id, prot_species_key)
+        species_groups.setdefault(paml_name[0:7], []).append((paml_name, record))
+    kept = []
+    for species_group, members in species_groups.items():
+        if species_group == 'Hom.sap':
+            # The protein ID is the PAML name after the 'Hom.sap_' prefix.
+            kept.extend(record for paml_name, record in members if paml_name[8:] in og_human_lookup)
+        else:
+            # max() returns the first of the longest, which is the tie-break
+            # that the post-alignment sort gives.
+            best_name = max(members, key=lambda member: len(member[1].seq) // 3)[0]
+            # After alignment, the representative is looked up by its PAML
+            # name, and the last sequence with that name wins.
+            kept.append([record for paml_name, record in members if paml_name == best_name][-1])
+    return kept
+
+
+def preselect_fasta(og_fasta, og_index, og_human_lookup):
+    """Read an orthogroup FASTA (a path or an open handle) and return the
+    records of its representative orthologues."""
+    og_records = list(read_fasta(og_fasta))
+    prot_species_key = species_lookup(og_index, [record.id for record in og_records])
+    return preselect_representatives(og_records, prot_species_key, og_human_lookup)
+
+
+def check_preselection(og_fasta, backtranslated_fasta, og_index, og_human_lookup):
+    """Compare the pre-alignment selection for an orthogroup with the
+    selection that pick_representative_ortholog() makes on its full
+    backtranslated alignment. Returns the two lists of PAML names, in output
+    order."""
+    og_records = list(read_fasta(og_fasta))
+    prot_species_key = species_lookup(og_index, [record.id for record in og_records])
+    preselected = [
+        generate_paml_name(record.id, prot_species_key)
+        for record in preselect_representatives(og_records, prot_species_key, og_human_lookup)]
+    repr_dict = pick_representative_ortholog(generate_fasta_dictionary(backtranslated_fasta), None, og_human_lookup)
+    postselected = []
+    for sp in repr_dict:
+        if sp == 'Hom.sap':
+            postselected.extend(human_gene.id for human_gene in repr_dict[sp])
+        else:
+            postselected.append(repr_dict[sp].id)
+    return preselected, postselected
+
+
+def main(og_fasta, og_tsv, cyp_csv, backtranslated_fasta=None):
+    """Main function."""
+    og_index = open_og_index(og_tsv)
+    og_human_lookup = generate_gene_lookup(cyp_csv)
+    if backtranslated_fasta is None:
+        write_fasta(preselect_fasta(og_fasta, og_index, og_human_lookup), sys.stdout)
+        og_index.close()
+        return
+    preselected, postselected = check_preselection(og_fasta, backtranslated_fasta, og_index, og_human_lookup)
+    og_index.close()
+    if preselected != postselected:
+        sys.stderr.write('Pre-alignment selection: ' + ' '.join(preselected) + '\n')
+        sys.stderr.write('Post-alignment selection: ' + ' '.join(postselected) + '\n')
+        sys.exit(1)
+    sys.stderr.write('The pre-alignment and post-alignment selections agree (' + str(len(preselected)) + ' sequences).\n')
+    return
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 4:
+        sys.stderr.write(__doc__ + '\n')
+        sys.exit(1)
+    main(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4] if len(sys.argv) > 4 else None)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+Project the Orthogroups.tsv of a larger cohort onto a smaller cohort (e.g.,
+the 16-species run onto the 6- or 10-species cohort), so that the smaller
+cohort does not need its own Orthofinder run. Only the columns of the species
+of the smaller cohort are kept, in the order of the larger table, and
+orthogroups that have no members left are dropped. The orthogroup IDs are not
+changed, so the orthogroups can be traced back to the larger run. A HOG
+table (e.g., Phylogenetic_Hierarchical_Orthogroups/N0.tsv) can be projected
+the same way; its HOG, OG, and Gene Tree Parent Clade columns are kept.
+
+The projected orthogroups are those that Orthofinder inferred with every
+species of the larger cohort, which may split or join some genes differently
+from a run on the smaller cohort alone.
+
+Takes three or more arguments:
+    1) Orthogroups.tsv of the larger cohort (may be compressed, see Compressed_IO.py)
+    2) Path to write the projected Orthogroups.tsv to
+    3+) CDS FASTA files of the smaller cohort (e.g., from Species_list.txt),
+        or species names as in the Orthogroups.tsv header
+
+Usage:
+
+python /path/to/Project_Orthogroups.py /path/to/Orthogroups_16.tsv /path/to/Orthogroups_6.tsv /path/to/species1.fasta [/path/to/species2.fasta ...]
+"""
+
+import sys
+import os
+
+from Compressed_IO import open_compressed
+from CDS_Store import species_name
+from Orthogroup_Index import id_columns
+
+
+def project_orthogroups(in_handle, out_handle, cohort_species):
+    """Copy the rows of an Orthogroups.tsv from one open file to another,
+    keeping only the columns of the cohort species. Raises ValueError if a
+    cohort species is not in the table. Returns the number of orthogroups
+    that were kept and the number that were dropped for having no members."""
+    header = in_handle.readline().strip('\n').split('\t')
+    n_id_columns = id_columns(header)
+    missing = [sp_name for sp_name in cohort_species if sp_name not in header[n_id_columns:]]
+    if missing:
+        raise ValueError('Species not in the Orthogroups.tsv header: ' + ', '.join(missing))
+    # Column numbers of the orthogroup ID (and HOG columns) and the cohort
+    # species, in the order of the larger table
+    columns = list(range(n_id_columns)) + [
+        i for i, sp_name in enumerate(header) if i >= n_id_columns and sp_name in cohort_species]
+    out_handle.write('\t'.join(header[i] for i in columns) + '\n')
+    n_kept = 0
+    n_dropped = 0
+    for row in in_handle:
+        # Explicitly strip only newlines, because species with no proteins
+        # in an orthogroup have an empty column.
+        table_row = row.strip('\n').split('\t')
+        projected = [table_row[i] for i in columns]
+        if not any(projected[n_id_columns:]):
+            n_dropped += 1
+            continue
+        out_handle.write('\t'.join(projected) + '\n')
+        n_kept += 1
+    return n_kept, n_dropped
+
+
+def main(superset_tsv, out_tsv, cohort_members):
+    """Main function."""
+    # Take the species name of a FASTA file the same way as the CDS store
+    cohort_species = set(species_name(member) for member in cohort_members)
+    tmp_tsv = out_tsv + '.' + str(os.getpid()) + '.tmp'
+    with open_compressed(superset_tsv, 'rt') as in_handle, open(tmp_tsv, 'wt') as out_handle:
+        try:
+            n_kept, n_dropped = project_orthogroups(in_handle, out_handle, cohort_species)
+        except ValueError as err:
+            sys.stderr.write(str(err) + '\n')
+            os.remove(tmp_tsv)
+            sys.exit(1)
+    os.replace(tmp_tsv, out_tsv)
+    sys.stderr.write(
+        'Projected ' + str(n_kept) + ' orthogroups onto ' + str(len(cohort_species)) + ' species; dropped '
+        + str(n_dropped) + ' orthogroups with no members in the cohort.\n')
+    return
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 4:
+        sys.stderr.write(__doc__ + '\n')
+        sys.exit(1)
+    main(sys.argv[1], sys.argv[2], sys.argv[3:])
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""
+Reduce the NCBI CDS FASTA files of a cohort to the longest CDS of each gene,
+before they are given to Orthofinder. The NCBI CDS downloads hold every RefSeq
+isoform of every gene, and the all-versus-all search of Orthofinder grows with
+the square of the number of sequences, while step 01 only keeps one sequence
+per non-human species anyway.
+
+Sequences are grouped into genes by the [gene=...] tag of the NCBI header (or
+the [db_xref=GeneID:...] tag if there is no gene tag). For each gene, the
+longest CDS is kept; ties go to the first one in the file. Sequences without
+either tag are all kept. The human proteins in the CYP-protein ID CSV are
+always kept: if a gene has one of them, every listed protein of that gene is
+kept instead of the longest CDS, so that the CYP of interest is the isoform
+that Orthofinder sees.
+
+The reduced FASTA files are written to the output directory with the same
+file names as the inputs (less any compression suffix), so that Orthofinder
+gives the species the same names. The sequence IDs are not changed. A mapping
+of every input sequence to its gene and to the sequence that was kept for the
+gene is written as a TSV, so that Orthofinder results can be traced back to
+every isoform.
+
+Takes four or more arguments:
+    1) Output directory for the reduced CDS FASTA files
+    2) Path to write the isoform mapping TSV to
+    3) CSV of CYPs to keep (CYP name, NCBI protein ID; with a header)
+    4+) CDS FASTA files of the cohort members
+
+Usage:
+
+python /path/to/Reduce_Isoforms.py /path/to/Reduced_CDS Isoform_Map.tsv CYP_CSV /path/to/species1.fasta [/path/to/species2.fasta ...]
+"""
+
+import sys
+import os
+import re
+
+from Fasta_IO import read_fasta, write_fasta
+from Compressed_IO import strip_compression_suffix
+from CDS_Store import species_name
+from Orthogroup_Index import ncbi_accession
+
+# [key=value] tags of the NCBI CDS FASTA headers
+NCBI_TAG = re.compile(r'\[([A-Za-z_]+)=([^\]]*)\]')
+# Columns of the isoform mapping TSV
+ISOFORM_MAP_HEADER = ['Species', 'Gene', 'Sequence_ID', 'Protein_ID', 'CDS_Length', 'Kept_Sequence_ID', 'Action']
+
+
+def read_cyp_proteins(cyp_csv):
+    """Return the set of NCBI protein IDs in the CYP-protein ID CSV (second
+    column; the first line is a header)."""
+    proteins = set()
+    with open(cyp_csv, 'rt') as f:
+        for line_number, line in enumerate(f):
+            if line_number == 0 or not line.strip():
+                continue
+            proteins.add(line.strip().split(',')[1])
+    return proteins
+
+
+def ncbi_tags(description):
+    """Return a dictionary of the [key=value] tags of an NCBI FASTA header."""
+    return dict(NCBI_TAG.findall(description))
+
+
+def gene_and_protein(record):
+    """Return the gene and the NCBI protein ID of a CDS record. The gene is
+    None if the header has no gene tag."""
+    tags = ncbi_tags(record.description)
+    gene = tags.get('gene')
+    if gene is None and tags.get('db_xref', '').startswith('GeneID:'):
+        gene = tags['db_xref'].split(',')[0]
+    protein_id = tags.get('protein_id') or ncbi_accession(record.id)
+    return gene, protein_id
+
+
+def reduce_isoforms(records, keep_proteins):
+    """Pick the sequences to keep from a list of CDS FASTA records (see
+    Fasta_IO.py), with the rule described in the module doc string. Returns
+    the list of records to keep, in file order, and the mapping rows (without
+    the species column) for every record, in file order."""
+    genes = dict()
+    info = []
+    for record in records:
+        gene, protein_id = gene_and_protein(record)
+        info.append((gene, protein_id))
+        if gene is not None:
+            genes.setdefault(gene, []).append(len(info) - 1)
+    kept_for = dict()
+    for gene, members in genes.items():
+        listed = [i for i in members if info[i][1] in keep_proteins]
+        if listed:
+            for i in listed:
+                kept_for[i] = i
+            # The other isoforms are traced to the first listed protein
+            representative = listed[0]
+        else:
+            # max() returns the first of the longest
+            representative = max(members, key=lambda i: len(records[i].seq))
+            kept_for[representative] = representative
+        for i in members:
+            kept_for.setdefault(i, representative)
+    kept = []
+    map_rows = []
+    for i, record in enumerate(records):
+        gene, protein_id = info[i]
+        if gene is None:
+            action = 'kept_no_gene_tag'
+            representative = i
+        else:
+            representative = kept_for[i]
+            if representative != i:
+                action = 'dropped'
+            elif protein_id in keep_proteins:
+                action = 'kept_cyp_of_interest'
+            else:
+                action = 'kept_longest'
+        if representative == i:
+            kept.append(record)
+        map_rows.append([
+            gene if gene is not None else 'NA', record.id, protein_id,
+            str(len(record.seq)), records[representative].id, action])
+    return kept, map_rows
+
+
+def main(out_dir, map_tsv, cyp_csv, fasta_files):
+    """Main function."""
+    os.makedirs(out_dir, exist_ok=True)
+    keep_proteins = read_cyp_proteins(cyp_csv)
+    with open(map_tsv, 'wt') as map_handle:
+        map_handle.write('\t'.join(ISOFORM_MAP_HEADER) + '\n')
+        for fasta_file in fasta_files:
+            records = list(read_fasta(fasta_file))
+            kept, map_rows = reduce_isoforms(records, keep_proteins)
+            out_fasta = os.path.join(out_dir, strip_compression_suffix(os.path.basename(fasta_file)))
+            with open(out_fasta, 'wt') as out_handle:
+                write_fasta(kept, out_handle)
+            sp_name = species_name(fasta_file)
+            for map_row in map_rows:
+                map_handle.write('\t'.join([sp_name] + map_row) + '\n')
+            sys.stderr.write(sp_name + ': kept ' + str(len(kept)) + ' of ' + str(len(records)) + ' CDS sequences.\n')
+    return
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 5:
+        sys.stderr.write(__doc__ + '\n')
+        sys.exit(1)
+    main(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4:])
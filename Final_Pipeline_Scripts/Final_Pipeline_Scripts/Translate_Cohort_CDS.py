@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Translate the CDS FASTA files of a cohort to protein FASTA files, so that
+Orthofinder can be run with its protein DIAMOND search instead of the much
+slower nucleotide BLAST search (-S blast_nucl).
+
+Every protein keeps the sequence ID (and the rest of the NCBI header) of the
+CDS it was translated from, and the protein files keep the names of the CDS
+files (less any compression suffix). The Orthogroups.tsv that Orthofinder
+writes from the proteins therefore has the same species columns and the same
+sequence IDs as one from the CDS, and the later steps read it, and fetch the
+CDS of its members, without any changes. The terminal STOP codon is removed,
+and internal STOP codons (from pseudogenes or frame errors) are written as X,
+which DIAMOND treats as an unknown residue.
+
+A TSV with every sequence, its CDS and protein lengths, whether the CDS is a
+whole number of codons, and the number of internal STOP codons, is also
+written.
+
+Requires NumPy (through Codon_Tools.py). Takes three or more arguments:
+    1) Output directory for the protein FASTA files
+    2) Path to write the CDS -> protein TSV to
+    3+) CDS FASTA files of the cohort members
+
+Usage:
+
+python /path/to/Translate_Cohort_CDS.py /path/to/Protein_FASTA CDS_Protein_Map.tsv /path/to/species1.fasta [/path/to/species2.fasta ...]
+"""
+
+import sys
+import os
+
+from Fasta_IO import FastaRecord, read_fasta, write_fasta
+from Translate_Orthogroup_Sequences import translate_records, WRITE_BUFFER_SIZE
+from Compressed_IO import strip_compression_suffix
+from CDS_Store import species_name
+
+# Columns of the CDS -> protein TSV
+CDS_PROTEIN_MAP_HEADER = ['Species', 'Sequence_ID', 'CDS_Length', 'Protein_Length', 'Whole_Codons', 'Internal_Stops']
+
+
+def protein_for_search(aa_seq):
+    """Prepare a translated CDS for the DIAMOND search: remove the terminal
+    STOP codon(s), and replace internal STOP codons with X. Returns the
+    protein and the number of internal STOP codons."""
+    aa_seq = aa_seq.rstrip(b'*')
+    return aa_seq.replace(b'*', b'X'), aa_seq.count(b'*')
+
+
+def translate_cohort_fasta(cds_fasta):
+    """Translate one CDS FASTA file. Returns the list of protein records and
+    the TSV rows (without the species column) for its sequences."""
+    cds_records = list(read_fasta(cds_fasta))
+    proteins = []
+    map_rows = []
+    for cds_record, aa_record in zip(cds_records, translate_records(cds_records)):
+        protein, internal_stops = protein_for_search(aa_record.seq)
+        proteins.append(FastaRecord(aa_record.id, aa_record.description, protein))
+        map_rows.append([
+            cds_record.id, str(len(cds_record.seq)), str(len(protein)),
+            'yes' if len(cds_record.seq) % 3 == 0 else 'no', str(internal_stops)])
+    return proteins, map_rows
+
+
+def main(out_dir, map_tsv, fasta_files):
+    """Main function."""
+    os.makedirs(out_dir, exist_ok=True)
+    with open(map_tsv, 'wt') as map_handle:
+        map_handle.write('\t'.join(CDS_PROTEIN_MAP_HEADER) + '\n')
+        for fasta_file in fasta_files:
+            proteins, map_rows = translate_cohort_fasta(fasta_file)
+            out_fasta = os.path.join(out_dir, strip_compression_suffix(os.path.basename(fasta_file)))
+            with open(out_fasta, 'wt', buffering=WRITE_BUFFER_SIZE) as out_handle:
+                write_fasta(proteins, out_handle)
+            sp_name = species_name(fasta_file)
+            for map_row in map_rows:
+                map_handle.write('\t'.join([sp_name] + map_row) + '\n')
+    return
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 4:
+        sys.stderr.write(__doc__ + '\n')
+        sys.exit(1)
+    main(sys.argv[1], sys.argv[2], sys.argv[3:])
@@ -9,68 +9,102 @@ alignment with MAFFT. Alignment will happen with amino acid sequences so that
 the codon structure of the genes is preserved for codon-level analyses that
 will be done with PAML.
 
-Requires Biopython.
+The translation uses the codon lookup table in Codon_Tools.py, which gives the
+same amino acids as Biopython's translate(table=1), including for ambiguous
+bases. FASTA is read and written with Fasta_IO.py, in the same format as
+Biopython's SeqIO.write().
 
-Take one argument:
-	1) Nucleotide FASTA file to translate.
+Requires NumPy.
+
+Take one or two arguments:
+	1) Nucleotide FASTA file to translate, or a directory of nucleotide FASTA
+	   files (OGXXXXX.fa) to translate in one run.
+	2) (Optional for a single file; required for a directory) Output directory.
+	   Each input file is written to OGXXXXX_AA.fa in this directory. If not
+	   given, the translated sequences are printed to standard output.
 """
 
 # First: import "standard library" modules
 import sys
+import os
 
 # Second: import non-standard and third-party modules.
 #  Authors note: we will wrap the non-standard imports in a try/except block
 #                so that we can print informative messages if someone does not
 #                have the libraries available.
 try:
-	from Bio import SeqIO
-	from Bio import SeqRecord
+	from Codon_Tools import translate_nucleotides
 except ImportError:
-	sys.stderr.write('This script requires the Biopython library.\n')
+	sys.stderr.write('This script requires the NumPy library.\n')
 	sys.exit(1)
 
-# Third: define the arguments that the script will process.
-#  Authors note: we will wrap the argument definition into a try/except block
-#                as well so that if a user does not give any arguments, we can
-#                remind them how the script is supposed to be run.
-try:
-	nuc_fa = sys.argv[1]
-except IndexError:
-	sys.stderr.write(__doc__ + '\n')
-	sys.exit(1)
+from Fasta_IO import FastaRecord, read_fasta, write_fasta
+from Compressed_IO import strip_compression_suffix
 
 # Now the boilerplate section is over. We can actually write the code that the
 # script will need to do its work.
 
-# Initialize an empty list to hold our translated sequences.
-aa_seqs = []
-
-# Open a 'read' handle to the nucleotide FASTA. The 'rt' argument in the
-# open() function means "read" and "text" mode.
-nuc_fa_handle = open(nuc_fa, 'rt')
-
-# Then, actually read data out of the file handle. We will use the
-# SeqIO.parse() function from Biopython. We will use this function
-# because it is written specialized for reading FASTA files.
-for nuc_seq in SeqIO.parse(nuc_fa_handle, 'fasta'):
-	# Keep the sequence name and descriptions
-	seq_name = nuc_seq.id
-	seq_descr = nuc_seq.description
-	# Translate the nucleotides to amino acids. We will use NCBI translation
-	# table 1 (standard genetic code) to do the translation.
-	aa_seq = nuc_seq.seq.translate(table=1)
-	# Next, we will make a SeqRecord object that holds the translated sequence
-	# and the original name. SeqRecord is a "class" of object defined as part of
-	# the Biopython library.
-	aa_seq_record = SeqRecord.SeqRecord(
-		aa_seq,
-		id=seq_name,
-		description=seq_descr)
-	# Append this SeqRecord object to the list defined on line 46
-	aa_seqs.append(aa_seq_record)
-
-# Now, we have translated all of the sequences in the input file to amino
-# acids and are storing them in a list of SeqRecord objects. We will use the
-# SeqIO.write() function in Biopython to export them as a properly-formatted
-# FASTA file.
-SeqIO.write(aa_seqs, sys.stdout, 'fasta')
\ No newline at end of file
+# Size of the output buffer, so that we write in big chunks rather than one
+# line at a time
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+def translate_records(nuc_records):
+	"""Translate a list of nucleotide FASTA records (see Fasta_IO.py) to amino
+	acids. Returns a list of (id, description, amino acid sequence) records
+	that keep the original sequence names and descriptions."""
+	# Translate the nucleotides to amino acids with NCBI translation table 1
+	# (standard genetic code). Each sequence is translated with one table lookup.
+	return [
+		FastaRecord(nuc_seq.id, nuc_seq.description, translate_nucleotides(nuc_seq.seq))
+		for nuc_seq in nuc_records]
+
+
+def translate_fasta(nuc_fa):
+	"""Translate every sequence in a nucleotide FASTA file (a path or an open
+	handle) to amino acids. Returns a list of (id, description, amino acid
+	sequence) records."""
+	return translate_records(read_fasta(nuc_fa))
+
+
+def translate_directory(nuc_dir, out_dir):
+	"""Translate every orthogroup FASTA file (OGXXXXX.fa, or a compressed
+	OGXXXXX.fa.gz) in a directory, and write each one to OGXXXXX_AA.fa in the
+	output directory. Doing the whole directory in one run saves starting
+	Python once per orthogroup."""
+	os.makedirs(out_dir, exist_ok=True)
+	for fname in sorted(os.listdir(nuc_dir)):
+		if not strip_compression_suffix(fname).endswith('.fa'):
+			continue
+		og_id = fname.split('.')[0]
+		aa_seqs = translate_fasta(os.path.join(nuc_dir, fname))
+		with open(os.path.join(out_dir, og_id + '_AA.fa'), 'wt', buffering=WRITE_BUFFER_SIZE) as out_handle:
+			write_fasta(aa_seqs, out_handle)
+	return
+
+
+# Third: define the arguments that the script will process.
+#  Authors note: we will wrap the argument definition into a try/except block
+#                as well so that if a user does not give any arguments, we can
+#                remind them how the script is supposed to be run. This is only
+#                done when the file is run as a script, so that the functions
+#                above can be imported by the other pipeline scripts.
+if __name__ == '__main__':
+	try:
+		nuc_fa = sys.argv[1]
+	except IndexError:
+		sys.stderr.write(__doc__ + '\n')
+		sys.exit(1)
+	out_dir = sys.argv[2] if len(sys.argv) > 2 else None
+	if os.path.isdir(nuc_fa):
+		if out_dir is None:
+			sys.stderr.write('An output directory is needed to translate a directory of FASTA files.\n')
+			sys.exit(1)
+		translate_directory(nuc_fa, out_dir)
+	elif out_dir is not None:
+		os.makedirs(out_dir, exist_ok=True)
+		og_id = os.path.basename(nuc_fa).split('.')[0]
+		with open(os.path.join(out_dir, og_id + '_AA.fa'), 'wt', buffering=WRITE_BUFFER_SIZE) as out_handle:
+			write_fasta(translate_fasta(nuc_fa), out_handle)
+	else:
+		write_fasta(translate_fasta(nuc_fa), sys.stdout)